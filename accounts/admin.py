@@ -28,7 +28,7 @@ class CustomUserAdmin(ImportExportModelAdmin, UserAdmin):
     fieldsets = (
         (None, {'fields': ('email', 'password','first_name','last_name',)}),
         ('Kişisel Bilgiler', {'fields': ('full_name', 'phone_number', 'role')}),
-        ('Doğrulama Durumu', {'fields': ('is_verified', 'verification_code', 'verification_code_sent_at', 'password_reset_code', 'password_reset_code_sent_at')}),
+        ('Doğrulama Durumu', {'fields': ('is_verified',)}),
         ('İzinler', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Tarih Bilgileri', {'fields': ('last_login', 'date_joined')}),
     )
@@ -60,8 +60,8 @@ class InvoiceAdmin(ImportExportModelAdmin):
 
 @admin.register(PushToken)
 class PushTokenAdmin(ImportExportModelAdmin):
-    list_display = ('user', 'platform', 'short_token', 'created_at')
-    list_filter = ('platform', 'created_at')
+    list_display = ('user', 'platform', 'short_token', 'failure_count', 'last_error', 'created_at')
+    list_filter = ('platform', 'last_error', 'created_at')
     search_fields = ('user__email', 'token')
 
     def short_token(self, obj):
@@ -70,8 +70,8 @@ class PushTokenAdmin(ImportExportModelAdmin):
 
 @admin.register(ExpoPushToken)
 class ExpoPushTokenAdmin(ImportExportModelAdmin):
-    list_display = ('user', 'short_token', 'created_at')
-    list_filter = ('created_at',)
+    list_display = ('user', 'short_token', 'failure_count', 'last_error', 'created_at')
+    list_filter = ('last_error', 'created_at')
     search_fields = ('user__email', 'token')
 
     def short_token(self, obj):
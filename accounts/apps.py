@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        import accounts.signals
+        from django.db.models.signals import post_migrate
+
+        post_migrate.connect(accounts.signals.create_search_index, sender=self)
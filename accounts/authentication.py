@@ -0,0 +1,174 @@
+"""
+Önbellekli token kimlik doğrulaması.
+
+DRF `TokenAuthentication` her istekte Token⇄User join sorgusu çalıştırır.
+`CachedTokenAuthentication` token anahtarı -> kullanıcı anlık görüntüsünü
+(alan değerleri) süreç içi, boyutu sınırlı bir LRU'da TOKEN_AUTH_CACHE_SECONDS
+boyunca tutar; isabette sorgu atılmaz. Her istek görüntüden yeni bir User
+nesnesi alır, böylece bir view'ın request.user üzerinde yaptığı değişiklik
+diğer isteklere sızmaz.
+
+Geçersiz kılma süreçler arası çalışır: her kullanıcının paylaşılan önbellekte
+(CACHES) bir sürüm anahtarı vardır ve görüntü bu sürümle birlikte saklanır.
+Token silindiğinde (çıkış, hesap kapatma) veya kullanıcı kaydedildiğinde
+`accounts.signals` sürüm anahtarını siler; diğer worker'lardaki görüntüler bir
+sonraki istekte sürüm tutmadığı için kullanılmaz ve veritabanından tekrar okunur.
+İsabet bu yüzden bir veritabanı sorgusu yerine tek bir önbellek okumasıdır.
+
+Süreç içi bir önbellek arka ucunda (LocMemCache) sürüm diğer worker'lara
+ulaşmaz; token iptali gecikmesin diye bu durumda önbellek kullanılmaz.
+Tek süreçli kurulumlar TOKEN_AUTH_CACHE_ALLOW_LOCAL ile açabilir.
+TOKEN_AUTH_CACHE_SECONDS 0 ise önbellek kapalıdır.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as shared_cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.authentication import TokenAuthentication
+
+from backend import metrics
+
+VERSION_KEY_PREFIX = 'auth-token-version'
+
+_hits = metrics.counter('auth.token_cache.hit')
+_misses = metrics.counter('auth.token_cache.miss')
+_stale = metrics.counter('auth.token_cache.stale')
+
+
+class TokenCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (son geçerlilik, user_id, görüntü)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, user_id, snapshot):
+        if not self.ttl or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user_id, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenCache(
+                    getattr(settings, 'TOKEN_AUTH_CACHE_SIZE', 10000),
+                    getattr(settings, 'TOKEN_AUTH_CACHE_SECONDS', 60),
+                )
+                metrics.gauge('auth.token_cache.size', lambda: len(_cache))
+    return _cache
+
+
+def cache_enabled():
+    """Paylaşılan bir önbellek yoksa token iptali diğer worker'lara ulaşmaz; önbellek kapalı."""
+    if isinstance(shared_cache, DummyCache):
+        return False
+    if isinstance(shared_cache, LocMemCache):
+        return getattr(settings, 'TOKEN_AUTH_CACHE_ALLOW_LOCAL', False)
+    return True
+
+
+def _version_key(user_id):
+    return f'{VERSION_KEY_PREFIX}:{user_id}'
+
+
+def _current_version(user_id):
+    """Kullanıcının paylaşılan sürümü; (sürüm, bu çağrıda mı oluşturuldu)."""
+    key = _version_key(user_id)
+    version = shared_cache.get(key)
+    if version is not None:
+        return version, False
+    shared_cache.add(key, uuid.uuid4().hex, None)
+    return shared_cache.get(key), True
+
+
+def invalidate_token(key):
+    get_token_cache().discard(key)
+
+
+def invalidate_user(user_id):
+    """Kullanıcının tüm token görüntülerini bu ve diğer süreçlerde geçersiz kılar."""
+    shared_cache.delete(_version_key(user_id))
+    get_token_cache().discard_user(user_id)
+
+
+def _snapshot(user, token, version):
+    fields = [field.attname for field in user._meta.concrete_fields]
+    return fields, [getattr(user, name) for name in fields], token.created, version
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not cache_enabled():
+            return super().authenticate_credentials(key)
+
+        cache = get_token_cache()
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            user_id = snapshot[1][snapshot[0].index('id')]
+            if shared_cache.get(_version_key(user_id)) == snapshot[3]:
+                _hits.inc()
+                return self._restore(key, snapshot)
+            # Başka bir süreçte kullanıcı değişti veya token silindi
+            _stale.inc()
+            cache.discard(key)
+
+        _misses.inc()
+        user, token = super().authenticate_credentials(key)
+        # Sürüm kullanıcı okunduktan sonra alınır. Sürüm yoksa (ilk istek ya da
+        # okuma ile bu satır arasında bir değişiklik sürümü sildiyse) görüntü
+        # saklanmaz; bir sonraki istek yeni sürümle önbelleğe alır
+        version, created = _current_version(user.pk)
+        if not created:
+            cache.set(key, user.pk, _snapshot(user, token, version))
+        return user, token
+
+    def _restore(self, key, snapshot):
+        fields, values, created, _ = snapshot
+        user = get_user_model().from_db(None, fields, values)
+        token = self.get_model().from_db(None, ['key', 'user_id', 'created'], [key, user.pk, created])
+        token.user = user
+        return user, token
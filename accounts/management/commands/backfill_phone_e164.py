@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import User
+from accounts.utils import normalize_phone
+
+
+class Command(BaseCommand):
+    help = (
+        "Mevcut kullanıcıların phone_e164 alanını phone_number'dan küçük batch'ler halinde doldurur. "
+        "Aynı numara birden fazla kullanıcıdaysa numara en eski hesaba verilir; diğerleri boş kalır ve raporlanır."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0, help='Batch\'ler arası bekleme (sn)')
+        parser.add_argument('--dry-run', action='store_true', help='Yazmadan sadece say')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        updated = skipped = reassigned = 0
+        last = None
+        while True:
+            # En eski hesaplar önce işlenir; (date_joined, id) üzerinde keyset sayfalama
+            users = User.objects.filter(phone_e164__isnull=True).exclude(phone_number='').order_by('date_joined', 'id')
+            if last is not None:
+                users = users.filter(Q(date_joined__gt=last[0]) | Q(date_joined=last[0], id__gt=last[1]))
+            batch = list(users.only('id', 'phone_number', 'date_joined')[:batch_size])
+            if not batch:
+                break
+            last = (batch[-1].date_joined, batch[-1].id)
+
+            normalized = {user.id: normalize_phone(user.phone_number) for user in batch}
+            owners = {
+                phone: (pk, joined) for pk, phone, joined in
+                User.objects.filter(phone_e164__in=[value for value in normalized.values() if value])
+                .values_list('id', 'phone_e164', 'date_joined')
+            }
+            changed, displaced = [], []
+            for user in batch:
+                value = normalized[user.id]
+                if not value:
+                    continue
+                owner = owners.get(value)
+                if owner and (owner[1], str(owner[0])) <= (user.date_joined, str(user.id)):
+                    skipped += 1
+                    self.stdout.write(f"  Atlandı (numara daha eski bir hesapta): {user.id} {user.phone_number}")
+                    continue
+                if owner:
+                    # Numara daha yeni bir hesaba geçmiş; en eski hesaba geri verilir
+                    reassigned += 1
+                    displaced.append(User(id=owner[0], phone_e164=None))
+                    self.stdout.write(f"  Numara {owner[0]} hesabından daha eski {user.id} hesabına taşındı: {value}")
+                owners[value] = (user.id, user.date_joined)
+                user.phone_e164 = value
+                changed.append(user)
+
+            if changed and not options['dry_run']:
+                with transaction.atomic():
+                    # Benzersiz index çakışmasın diye önce eski sahipler boşaltılır
+                    if displaced:
+                        User.objects.bulk_update(displaced, ['phone_e164'])
+                    User.objects.bulk_update(changed, ['phone_e164'])
+            updated += len(changed)
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        verb = 'güncellenecek' if options['dry_run'] else 'güncellendi'
+        self.stdout.write(
+            f"{updated} kullanıcı {verb}, {reassigned} numara en eski hesaba taşındı, "
+            f"{skipped} çakışma atlandı ({elapsed:.2f} sn)."
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.otp import purge
+
+
+class Command(BaseCommand):
+    help = "Süresi dolmuş OTP kodlarını ve gönderim penceresi dışına çıkmış SMS kayıtlarını siler."
+
+    def handle(self, *args, **options):
+        codes, logs = purge()
+        self.stdout.write(f"{codes} kod ve {logs} gönderim kaydı silindi.")
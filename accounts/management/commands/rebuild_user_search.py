@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Kullanıcı arama indeksini (accounts.search) tüm kullanıcılardan baştan oluşturur."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def _progress(self, total):
+        self.stdout.write(f"  {total} kullanıcı indekslendi")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # Tek transaction: yeniden oluşturma sırasında aramalar eski indeksi görür
+        with transaction.atomic():
+            total = get_backend().rebuild(batch_size=options['batch_size'], progress=self._progress)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Toplam {total} kullanıcı {elapsed:.2f} sn'de indekslendi.")
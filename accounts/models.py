@@ -1,13 +1,21 @@
 import uuid
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Replace
 from django.utils import timezone
 
+import logging
 import os
 from datetime import datetime, timedelta
 import secrets
 from django.conf import settings
 
+from .utils import normalize_phone, phone_variants
+
+logger = logging.getLogger(__name__)
+
 
 class CustomUserManager(BaseUserManager):
     """
@@ -34,21 +42,48 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def by_phone(self, phone_number):
+        """
+        Telefon numarasıyla eşleşen kullanıcılar, en eski hesap önce.
+
+        Girdi E.164'e çevrilip benzersiz `phone_e164` index'inde aranır. `phone_e164`'ü
+        henüz doldurulmamış (backfill_phone_e164 çalışmamış) kullanıcılar da
+        `phone_number`'ın rakamları üzerinden bulunur; bu tarama sadece NULL satırları kapsar.
+        """
+        normalized = normalize_phone(phone_number)
+        if normalized is None:
+            return self.none()
+        digits = Replace(Replace(Replace(Replace(F('phone_number'), Value(' '), Value('')),
+                                         Value('-'), Value('')), Value('+'), Value('')), Value('.'), Value(''))
+        legacy = self.filter(phone_e164__isnull=True).annotate(phone_digits=digits).filter(
+            phone_digits__in=phone_variants(normalized)
+        ).values('pk')
+        return self.filter(Q(phone_e164=normalized) | Q(pk__in=legacy)).order_by('date_joined', 'pk')
+
+    def get_by_phone(self, phone_number):
+        """`by_phone`'un ilk (en eski) kullanıcısı; yoksa User.DoesNotExist."""
+        user = self.by_phone(phone_number).first()
+        if user is None:
+            raise self.model.DoesNotExist
+        return user
+
+
+class PhoneNumberTaken(ValidationError):
+    def __init__(self):
+        super().__init__({'phone_number': 'Bu telefon numarası ile kayıtlı bir kullanıcı zaten mevcut.'})
+
 
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     email = models.EmailField(unique=True)
     full_name = models.CharField(max_length=255, blank=True)
     phone_number = models.CharField(max_length=15, blank=True)
-    
-    # Password reset
-    password_reset_code = models.CharField(max_length=4, null=True, blank=True)
-    password_reset_code_sent_at = models.DateTimeField(null=True, blank=True)
-    
-    # Account verification
+    # phone_number'ın E.164 hali (+905XXXXXXXXX); kayıtta otomatik doldurulur,
+    # telefonla yapılan tüm aramalar bu benzersiz index üzerinden gider
+    phone_e164 = models.CharField(max_length=16, unique=True, null=True, blank=True, editable=False)
+
+    # Account verification (kodlar accounts.otp / OneTimeCode tablosunda tutulur)
     is_verified = models.BooleanField(default=False)
-    verification_code = models.CharField(max_length=4, null=True, blank=True)
-    verification_code_sent_at = models.DateTimeField(null=True, blank=True)
 
     role = models.CharField(max_length=20, choices=[('Kullanıcı', 'Kullanıcı'), ('Şoför', 'Şoför'),('Yönetici','Yönetici')], default='Kullanıcı')
     
@@ -65,45 +100,60 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
-    @property
-    def password_reset_code_expired(self):
-        if not self.password_reset_code_sent_at:
-            return False
-        expiration_time = self.password_reset_code_sent_at + timedelta(
-            hours=getattr(settings, 'VERIFICATION_CODE_EXPIRY_HOURS', 24)
-        )
-        return timezone.now() > expiration_time
-
-    def generate_password_reset_code(self):
-        """4 haneli kriptografik olarak güvenli rastgele kod oluştur ve kaydet"""
-        code = f"{secrets.randbelow(10000):04d}"
-        self.password_reset_code = code
-        self.password_reset_code_sent_at = timezone.now()
-        self.save(update_fields=['password_reset_code', 'password_reset_code_sent_at'])
-        return code
-
-    @property
-    def verification_code_expired(self):
-        if not self.verification_code_sent_at:
-            return False
-        expiration_time = self.verification_code_sent_at + timedelta(
-            hours=getattr(settings, 'VERIFICATION_CODE_EXPIRY_HOURS', 24)
-        )
-        return timezone.now() > expiration_time
-
-    def generate_verification_code(self):
-        """4 haneli hesap doğrulama kodu oluştur"""
-        code = f"{secrets.randbelow(10000):04d}"
-        self.verification_code = code
-        self.verification_code_sent_at = timezone.now()
-        self.save(update_fields=['verification_code', 'verification_code_sent_at'])
-        return code
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'phone_number' in update_fields:
+            self.sync_phone_e164()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'phone_e164'}
+        super().save(*args, **kwargs)
+        self._loaded_phone_number = self.__dict__.get('phone_number')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Numara değişikliğini ayırt etmek için yüklenen değer (ertelenmişse None)
+        instance._loaded_phone_number = instance.__dict__.get('phone_number')
+        return instance
+
+    def phone_number_changed(self):
+        if self._state.adding:
+            return True
+        loaded = getattr(self, '_loaded_phone_number', None)
+        return loaded is not None and loaded != self.phone_number
+
+    def sync_phone_e164(self):
+        """
+        phone_e164'ü phone_number'dan günceller.
+
+        Yeni kullanıcıda veya numara değiştiğinde numara başka bir kullanıcıda
+        kayıtlıysa PhoneNumberTaken fırlatılır. Değişmemiş eski, tekilleştirilmemiş
+        numaralarda kayıt engellenmez; numara daha eski bir hesapta ya da başka bir
+        kullanıcının phone_e164'ünde ise alan boş bırakılır (en eski hesap kazanır,
+        bkz. backfill_phone_e164).
+        """
+        normalized = normalize_phone(self.phone_number)
+        if normalized == self.phone_e164:
+            return
+        if normalized:
+            others = User.objects.by_phone(normalized).exclude(pk=self.pk)
+            if self.phone_number_changed():
+                if others.exists():
+                    raise PhoneNumberTaken()
+            elif others.filter(Q(phone_e164__isnull=False) | Q(date_joined__lt=self.date_joined)).exists():
+                logger.warning(f"{normalized} numarası başka bir kullanıcıda kayıtlı; phone_e164 boş bırakıldı ({self.pk})")
+                normalized = None
+        self.phone_e164 = normalized
 
 
 class PushToken(models.Model):
     token = models.CharField(max_length=512, unique=True)
     platform = models.CharField(max_length=20, blank=True, null=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="push_tokens")
+    # Art arda teslim edilemeyen gönderim sayısı (DeviceNotRegistered vb.)
+    failure_count = models.PositiveIntegerField(default=0)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=100, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     def __str__(self):
@@ -112,6 +162,10 @@ class PushToken(models.Model):
 class ExpoPushToken(models.Model):
     token = models.CharField(max_length=512, unique=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="expo_push_tokens")
+    # Art arda teslim edilemeyen gönderim sayısı (DeviceNotRegistered vb.)
+    failure_count = models.PositiveIntegerField(default=0)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=100, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -119,6 +173,53 @@ class ExpoPushToken(models.Model):
         return f"{self.user.email} - {self.token[:15]}..."
 
 
+class OneTimeCode(models.Model):
+    """
+    Kullanıcının amaç başına tek geçerli tek kullanımlık kodu (OTP).
+    Kodun kendisi değil HMAC'i saklanır; süresi dolan satırlar `purge_otp` ile silinir.
+    """
+    PURPOSE_CHOICES = [
+        ('verification', 'Hesap doğrulama'),
+        ('password_reset', 'Parola sıfırlama'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='one_time_codes')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    code_hash = models.CharField(max_length=64)
+    # Deneme sayısı (doğru deneme dahil); OTP_MAX_ATTEMPTS'a ulaşınca kod kullanılamaz
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'purpose'], name='otp_user_purpose_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.purpose}"
+
+
+class OTPSendLog(models.Model):
+    """Gönderilen her OTP SMS'i; telefon ve IP başına kayan pencere sınırı bu tablodan sayılır."""
+    phone_e164 = models.CharField(max_length=16)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone_e164', 'created_at'], name='otp_send_phone_idx'),
+            models.Index(fields=['ip_address', 'created_at'], name='otp_send_ip_idx'),
+            models.Index(fields=['created_at'], name='otp_send_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.phone_e164} - {self.created_at}"
+
+
 class Address(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="addresses")
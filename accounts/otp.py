@@ -0,0 +1,155 @@
+"""
+Tek kullanımlık kodlar (OTP): üretim, doğrulama ve gönderim sınırı.
+
+Kodlar User satırında değil `OneTimeCode` tablosunda (kullanıcı, amaç) başına tek
+satır olarak tutulur; böylece kod üretme/doğrulama sıcak kullanıcı tablosuna
+yazmaz. Saklanan değer kodun HMAC'idir ve karşılaştırma sabit zamanlıdır.
+Her deneme karşılaştırmadan önce atomik olarak sayılır; OTP_MAX_ATTEMPTS'a
+ulaşan kod yeni kod istenene kadar kullanılamaz (4 haneli kodun denemeyle bulunmasını engeller).
+
+Ücretli SMS'in kötüye kullanımına karşı her gönderim `OTPSendLog`'a yazılır ve
+son OTP_SEND_WINDOW_SECONDS içinde telefon başına OTP_SEND_MAX_PER_PHONE, IP
+başına OTP_SEND_MAX_PER_IP gönderimden fazlası `OTPThrottled` (HTTP 429,
+Retry-After) ile reddedilir. IP sınırı yalnızca OTP_IP_HEADER ayarlıysa uygulanır. Sayım ile kayıt arasında kilit yoktur; eşzamanlı
+isteklerde sınır en fazla eşzamanlı istek sayısı kadar aşılabilir.
+
+Süresi dolmuş kodlar ve pencere dışına çıkmış gönderim kayıtları
+`manage.py purge_otp` ile silinir.
+"""
+import hmac
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework.exceptions import Throttled
+
+from backend import metrics
+
+from .models import OneTimeCode, OTPSendLog
+from .utils import normalize_phone
+
+VERIFICATION = 'verification'
+PASSWORD_RESET = 'password_reset'
+
+# check() sonuçları
+VALID = 'valid'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+_issued = metrics.counter('otp.issued')
+_throttled = metrics.counter('otp.throttled')
+_failed = metrics.counter('otp.failed_attempts')
+
+
+class OTPThrottled(Throttled):
+    default_detail = 'Çok fazla kod istendi. Lütfen daha sonra tekrar deneyiniz.'
+
+
+def ttl_seconds():
+    return getattr(settings, 'OTP_TTL_SECONDS', 24 * 3600)
+
+
+def max_attempts():
+    return getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+
+def client_ip(request):
+    """
+    OTP_IP_HEADER'dan okunan istemci IP'si; ayar boşsa None (IP sınırı uygulanmaz).
+    Liste başlıklarında (X-Forwarded-For) istemcinin yazabildiği baştaki değerler
+    değil, güvenilen proxy'nin eklediği son değer kullanılır.
+    """
+    header = getattr(settings, 'OTP_IP_HEADER', '')
+    if not header:
+        return None
+    return request.META.get(header, '').split(',')[-1].strip() or None
+
+
+def _hash(user_id, purpose, code):
+    return salted_hmac('accounts.otp', f'{user_id}:{purpose}:{code}').hexdigest()
+
+
+def _wait_seconds(queryset, limit, window_start):
+    """Pencere doluysa en eski kaydın pencereden çıkmasına kalan süre, değilse 0."""
+    if not limit:
+        return 0
+    times = list(queryset.filter(created_at__gt=window_start).order_by('-created_at')
+                 .values_list('created_at', flat=True)[:limit])
+    if len(times) < limit:
+        return 0
+    return max(1, int((times[-1] - window_start).total_seconds()) + 1)
+
+
+def ensure_can_send(phone_number, ip_address=None):
+    """Telefon veya IP sınırı dolmuşsa OTPThrottled fırlatır."""
+    window = getattr(settings, 'OTP_SEND_WINDOW_SECONDS', 3600)
+    window_start = timezone.now() - timedelta(seconds=window)
+    phone = normalize_phone(phone_number)
+
+    wait = 0
+    if phone:
+        wait = _wait_seconds(OTPSendLog.objects.filter(phone_e164=phone),
+                             getattr(settings, 'OTP_SEND_MAX_PER_PHONE', 5), window_start)
+    if ip_address:
+        wait = max(wait, _wait_seconds(OTPSendLog.objects.filter(ip_address=ip_address),
+                                       getattr(settings, 'OTP_SEND_MAX_PER_IP', 20), window_start))
+    if wait:
+        _throttled.inc()
+        raise OTPThrottled(wait=wait)
+
+
+def issue(user, purpose, ip_address=None):
+    """
+    Gönderim sınırını kontrol eder, kullanıcının bu amaçtaki eski kodunu yenisiyle
+    değiştirir ve düz kodu (SMS'e yazılmak üzere) döner.
+    """
+    ensure_can_send(user.phone_number, ip_address)
+    code = f"{secrets.randbelow(10000):04d}"
+    OneTimeCode.objects.update_or_create(
+        user_id=user.pk, purpose=purpose,
+        defaults={
+            'code_hash': _hash(user.pk, purpose, code),
+            'attempts': 0,
+            'expires_at': timezone.now() + timedelta(seconds=ttl_seconds()),
+        },
+    )
+    OTPSendLog.objects.create(phone_e164=normalize_phone(user.phone_number) or '', ip_address=ip_address)
+    _issued.inc()
+    return code
+
+
+def check(user, purpose, code, consume=False):
+    """
+    Kodu doğrular; VALID / INVALID / EXPIRED / LOCKED döner.
+    consume=True ise geçerli kod silinir ve tekrar kullanılamaz.
+    """
+    otp = OneTimeCode.objects.filter(user_id=user.pk, purpose=purpose).first()
+    if otp is None:
+        return INVALID
+    # Deneme hakkı karşılaştırmadan önce atomik olarak alınır; paralel tahminler
+    # aynı eski satırı okusa da en fazla OTP_MAX_ATTEMPTS tanesi karşılaştırılır
+    limit = max_attempts()
+    if not OneTimeCode.objects.filter(pk=otp.pk, attempts__lt=limit).update(attempts=F('attempts') + 1):
+        return LOCKED
+    if not hmac.compare_digest(otp.code_hash, _hash(user.pk, purpose, code or '')):
+        _failed.inc()
+        return LOCKED if otp.attempts + 1 >= limit else INVALID
+    if otp.expires_at <= timezone.now():
+        return EXPIRED
+    if consume and not OneTimeCode.objects.filter(pk=otp.pk, code_hash=otp.code_hash).delete()[0]:
+        # Aynı kod eşzamanlı başka bir istekte kullanıldı
+        return INVALID
+    return VALID
+
+
+def purge(now=None):
+    """Süresi dolmuş kodları ve pencere dışındaki gönderim kayıtlarını siler; (kod, kayıt) sayısını döner."""
+    now = now or timezone.now()
+    window = getattr(settings, 'OTP_SEND_WINDOW_SECONDS', 3600)
+    codes, _ = OneTimeCode.objects.filter(expires_at__lte=now).delete()
+    logs, _ = OTPSendLog.objects.filter(created_at__lte=now - timedelta(seconds=window)).delete()
+    return codes, logs
@@ -0,0 +1,214 @@
+"""
+Panel kullanıcı araması için tam metin arama indeksi.
+
+`icontains` araması her tuşta tüm kullanıcı tablosunu tarar. Bu modül e-posta,
+telefon ve ad alanlarını ayrı bir indekste tutar ve sorguya uyan kullanıcı
+id'lerini alaka sırasıyla döner. Arka uç USER_SEARCH_BACKEND ile seçilir:
+
+    - SQLiteFTSBackend (varsayılan): SQLite FTS5 sanal tablosu, bm25 sıralaması.
+    - QueryBackend: indekssiz, eski `icontains` araması (FTS5 olmayan veritabanları için).
+
+Metin indekslenmeden ve sorgulanmadan önce `fold` ile katlanır: Türkçe
+büyük/küçük harf (İ/ı) ve aksanlar (ç, ğ, ö, ş, ü) kaldırılır, böylece
+"sukru" araması "Şükrü"yü bulur. Her kelime önek olarak aranır ("ahm" → "Ahmet").
+
+İndeks `accounts.signals` üzerinden User kaydedilince/silinince güncellenir.
+Tablo migrate sırasında oluşturulur; mevcut veriler ve signal'ı atlayan toplu
+güncellemeler (queryset.update, bulk_update) için `manage.py rebuild_user_search`.
+"""
+import re
+import time
+import unicodedata
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from backend import metrics
+
+from .utils import normalize_phone
+
+# İndekslenen User alanları; update_fields bunlardan birini içermiyorsa indeks güncellenmez
+INDEXED_FIELDS = {'email', 'phone_number', 'first_name', 'last_name', 'full_name'}
+
+_TURKISH_FOLD = str.maketrans({'İ': 'i', 'I': 'i', 'ı': 'i'})
+_TOKEN_RE = re.compile(r'\w+')
+# "0532 123 45" gibi boşluk/tire ile yazılmış telefonlar tek kelime olarak aranır
+_PHONE_SEPARATOR_RE = re.compile(r'(?<=\d)[\s().-]+(?=\d)')
+
+_latency = metrics.histogram('accounts.user_search.latency')
+
+
+def fold(text):
+    """Küçük harfe çevirir, Türkçe noktalı/noktasız i'yi ve aksanları kaldırır."""
+    text = unicodedata.normalize('NFKD', str(text or '').translate(_TURKISH_FOLD).lower())
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def phone_terms(phone_number):
+    """Telefonun aranabilir biçimleri: girildiği hali, ulusal (5XX...) ve E.164 rakamları."""
+    digits = ''.join(ch for ch in str(phone_number or '') if ch.isdigit())
+    terms = {digits}
+    e164 = normalize_phone(phone_number)
+    if e164:
+        terms.add(e164[1:])
+        if e164.startswith('+90'):
+            terms.add(e164[3:])
+    return ' '.join(sorted(term for term in terms if term))
+
+
+def match_expression(query):
+    """Kullanıcı girdisini FTS5 sorgusuna çevirir: her kelime önek olarak, hepsi birlikte (AND)."""
+    terms = []
+    for token in _TOKEN_RE.findall(_PHONE_SEPARATOR_RE.sub('', fold(query))):
+        if token.isdigit():
+            token = token.lstrip('0') or token
+        terms.append(f'"{token}"*')
+    return ' '.join(terms)
+
+
+class SearchBackend:
+    def setup(self):
+        """İndeks deposunu oluşturur (migrate sırasında çağrılır)."""
+
+    def index(self, users):
+        raise NotImplementedError
+
+    def remove(self, user_ids):
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000, progress=None):
+        raise NotImplementedError
+
+    def search(self, query, limit, queryset=None):
+        """
+        Sorguya uyan kullanıcı id'lerini en alakalıdan başlayarak döner. queryset
+        verilirse yalnızca o kümedeki kullanıcılar aranır; sınır filtreden sonra uygulanır.
+        """
+        raise NotImplementedError
+
+
+class QueryBackend(SearchBackend):
+    """İndeks tutmaz; doğrudan User tablosunda `icontains` ile arar."""
+
+    def index(self, users):
+        pass
+
+    def remove(self, user_ids):
+        pass
+
+    def rebuild(self, batch_size=1000, progress=None):
+        return 0
+
+    def search(self, query, limit, queryset=None):
+        users = get_user_model().objects.all() if queryset is None else queryset
+        return list(users.filter(
+            Q(email__icontains=query) |
+            Q(phone_number__icontains=query) |
+            Q(first_name__icontains=query) |
+            Q(last_name__icontains=query) |
+            Q(full_name__icontains=query)
+        ).order_by('-date_joined').values_list('pk', flat=True)[:limit])
+
+
+def _rowid(pk):
+    """
+    UUID'den türetilen 63 bitlik FTS rowid'si. Güncelleme/silme rowid ile yapılır;
+    UNINDEXED user_id sütununa göre silmek tüm indeksi tarardı.
+    """
+    return uuid.UUID(str(pk)).int >> 65
+
+
+class SQLiteFTSBackend(SearchBackend):
+    table = 'accounts_user_search'
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                "user_id UNINDEXED, name, email, phone, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+
+    def _row(self, user):
+        name = ' '.join(filter(None, [user.full_name, user.first_name, user.last_name]))
+        return _rowid(user.pk), user.pk.hex, fold(name), fold(user.email), phone_terms(user.phone_number)
+
+    def _insert(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, user_id, name, email, phone) VALUES (%s, %s, %s, %s, %s)", rows
+        )
+
+    def index(self, users):
+        rows = [self._row(user) for user in users]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            self._insert(cursor, rows)
+
+    def remove(self, user_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(_rowid(pk),) for pk in user_ids])
+
+    def rebuild(self, batch_size=1000, progress=None):
+        """İndeksi baştan oluşturur; indekslenen kullanıcı sayısını döner."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+        self.setup()
+        users = get_user_model().objects.only('pk', *INDEXED_FIELDS).order_by('pk')
+        total = 0
+        last_pk = None
+        while True:
+            batch = list((users.filter(pk__gt=last_pk) if last_pk else users)[:batch_size])
+            if not batch:
+                break
+            with connection.cursor() as cursor:
+                self._insert(cursor, [self._row(user) for user in batch])
+            total += len(batch)
+            last_pk = batch[-1].pk
+            if progress:
+                progress(total)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        return total
+
+    def search(self, query, limit, queryset=None):
+        expression = match_expression(query)
+        if not expression:
+            return []
+        sql = f"SELECT user_id FROM {self.table} WHERE {self.table} MATCH %s"
+        params = [expression]
+        if queryset is not None:
+            # Filtre (aktiflik, rol) sıralama ve sınırdan önce uygulanır
+            subquery, subquery_params = queryset.order_by().values('pk').query.sql_with_params()
+            sql += f" AND user_id IN ({subquery})"
+            params.extend(subquery_params)
+        with connection.cursor() as cursor:
+            cursor.execute(f"{sql} ORDER BY rank LIMIT %s", [*params, limit])
+            return [uuid.UUID(row[0]) for row in cursor.fetchall()]
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(getattr(settings, 'USER_SEARCH_BACKEND', 'accounts.search.SQLiteFTSBackend'))()
+    return _backend
+
+
+def search_users(query, limit=None, queryset=None):
+    """
+    Sorguya uyan en fazla USER_SEARCH_LIMIT kullanıcı id'si, alaka sırasıyla.
+    queryset verilirse sonuçlar o kümeyle sınırlanır (sınırdan önce).
+    """
+    limit = limit or getattr(settings, 'USER_SEARCH_LIMIT', 200)
+    started = time.monotonic()
+    ids = get_backend().search(query, limit, queryset=queryset)
+    _latency.observe((time.monotonic() - started) * 1000)
+    return ids
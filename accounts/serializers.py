@@ -1,6 +1,44 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, PushToken, ExpoPushToken, Address, Invoice, EmergencyContact
+from django.db import IntegrityError, transaction
+from . import otp
+from .models import PhoneNumberTaken, User, PushToken, ExpoPushToken, Address, Invoice, EmergencyContact
+
+OTP_LOCKED_MESSAGE = 'Çok fazla hatalı deneme yapıldı. Lütfen yeni bir kod isteyiniz.'
+
+
+def validate_otp(user, purpose, code, invalid, expired, field=None, consume=False):
+    """accounts.otp ile kodu doğrular; geçersizse ilgili mesajla ValidationError fırlatır."""
+    result = otp.check(user, purpose, code, consume=consume)
+    if result == otp.VALID:
+        return
+    message = {otp.INVALID: invalid, otp.EXPIRED: expired, otp.LOCKED: OTP_LOCKED_MESSAGE}[result]
+    raise serializers.ValidationError({field: message} if field else message)
+
+PHONE_TAKEN_MESSAGE = 'Bu telefon numarası ile kayıtlı bir kullanıcı zaten mevcut.'
+
+
+def validate_unique_phone(value, instance=None):
+    """Numara (hangi biçimde yazılırsa yazılsın) başka bir kullanıcıda kayıtlı olmamalı."""
+    others = User.objects.by_phone(value)
+    if instance is not None:
+        others = others.exclude(pk=instance.pk)
+    if others.exists():
+        raise serializers.ValidationError(PHONE_TAKEN_MESSAGE)
+    return value
+
+
+def save_user(save):
+    """
+    Kullanıcı kaydını çalıştırır; eşzamanlı iki istek aynı numarayı alırsa benzersiz
+    index'in IntegrityError'ı 500 yerine doğrulama hatası olarak döner.
+    """
+    try:
+        with transaction.atomic():
+            return save()
+    except (IntegrityError, PhoneNumberTaken):
+        raise serializers.ValidationError({'phone_number': [PHONE_TAKEN_MESSAGE]})
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
@@ -25,17 +63,15 @@ class UserCreateSerializer(serializers.ModelSerializer):
             clean_phone = phone_number.replace(" ", "").replace("+", "")
             validated_data['email'] = f"{clean_phone}@noemail.vipvale.com"
             
-        user = super().create(validated_data)
+        user = save_user(lambda: super(UserCreateSerializer, self).create(validated_data))
         if password:
             user.set_password(password)
-            user.save()
+            user.save(update_fields=['password'])
         return user
 
     def validate_phone_number(self, value):
         """Telefon numarası benzersiz olmalı"""
-        if User.objects.filter(phone_number=value).exists():
-            raise serializers.ValidationError("Bu telefon numarası ile kayıtlı bir kullanıcı zaten mevcut.")
-        return value
+        return validate_unique_phone(value, self.instance)
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -43,6 +79,11 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id','email', 'full_name',  'phone_number', 'role','is_verified', 'vehicle_plate', 'vehicle_model')
         read_only_fields = ('id', 'email', 'is_staff', 'is_superuser')
 
+    def validate_phone_number(self, value):
+        return validate_unique_phone(value, self.instance)
+
+    def update(self, instance, validated_data):
+        return save_user(lambda: super(UserSerializer, self).update(instance, validated_data))
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
@@ -82,22 +123,9 @@ class LoginSerializer(serializers.Serializer):
                 user = authenticate(email=email_or_phone, password=password)
             else:
                 # 2. Telefon numarası olarak dene
-                # Frontend'den gelen format temiz olmayabilir, ancak DB'de nasıl tutulduğu önemli.
-                # Genelde +90 veya 90 ile başlar.
-                # Biz esnek arama yapalım.
-                
-                clean_input = email_or_phone.replace(" ", "").replace("+", "")
-                user_obj = None
-                
-                # Olası formatlar: 5xxxxxxxxx, 905xxxxxxxxx
-                # DB'de "905..." formatında tutuluyorsa:
-                
-                if len(clean_input) == 10: # 532... -> 90532...
-                     user_obj = User.objects.filter(phone_number__endswith=clean_input).first()
-                elif len(clean_input) > 10: # 90532... -> Direkt eşleşme
-                     user_obj = User.objects.filter(phone_number__icontains=clean_input).first()
-                else:
-                     user_obj = User.objects.filter(phone_number=email_or_phone).first()
+                # Girdi hangi formatta gelirse gelsin (5xx, 05xx, 905xx, +90 5xx)
+                # E.164'e çevrilip phone_e164 index'inde tek eşitlik sorgusuyla aranır.
+                user_obj = User.objects.by_phone(email_or_phone).first()
                 
                 if user_obj:
                     # authenticate fonksiyonu username/password veya email/password bekler.
@@ -131,15 +159,13 @@ class PasswordResetVerifySerializer(serializers.Serializer):
         phone_number = attrs.get('phone_number')
         code = attrs.get('code')
         try:
-            user = User.objects.get(phone_number=phone_number)
+            user = User.objects.get_by_phone(phone_number)
         except User.DoesNotExist:
             raise serializers.ValidationError('Bu telefon numarası ile kayıtlı bir kullanıcı bulunamadı.')
 
-        if user.password_reset_code != code:
-            raise serializers.ValidationError('Girdiğiniz kod hatalı. Lütfen tekrar deneyiniz.')
-
-        if user.password_reset_code_expired:
-            raise serializers.ValidationError('Bu kodun süresi dolmuş. Lütfen yeni bir kod isteyiniz.')
+        validate_otp(user, otp.PASSWORD_RESET, code,
+                     invalid='Girdiğiniz kod hatalı. Lütfen tekrar deneyiniz.',
+                     expired='Bu kodun süresi dolmuş. Lütfen yeni bir kod isteyiniz.')
 
         return attrs
 
@@ -153,15 +179,14 @@ class SetNewPasswordSerializer(serializers.Serializer):
         code = attrs.get('code')
         
         try:
-            user = User.objects.get(phone_number=phone_number)
+            user = User.objects.get_by_phone(phone_number)
         except User.DoesNotExist:
             raise serializers.ValidationError('Bu telefon numarası ile kayıtlı bir kullanıcı bulunamadı.')
         
-        if user.password_reset_code != code:
-            raise serializers.ValidationError('Girdiğiniz kod hatalı veya süresi dolmuş.')
-            
-        if user.password_reset_code_expired:
-            raise serializers.ValidationError('Bu kodun süresi dolmuş. Lütfen yeni bir kod isteyiniz.')
+        validate_otp(user, otp.PASSWORD_RESET, code,
+                     invalid='Girdiğiniz kod hatalı veya süresi dolmuş.',
+                     expired='Bu kodun süresi dolmuş. Lütfen yeni bir kod isteyiniz.',
+                     consume=True)
         
         attrs['user'] = user
         return attrs
@@ -268,18 +293,17 @@ class AccountVerificationSerializer(serializers.Serializer):
         code = attrs.get('code')
         
         try:
-            user = User.objects.get(phone_number=phone_number)
+            user = User.objects.get_by_phone(phone_number)
         except User.DoesNotExist:
             raise serializers.ValidationError('Kullanıcı bulunamadı.')
 
         if user.is_verified:
             raise serializers.ValidationError('Hesap zaten doğrulanmış.')
 
-        if user.verification_code != code:
-            raise serializers.ValidationError('Doğrulama kodu hatalı.')
-
-        if user.verification_code_expired:
-            raise serializers.ValidationError('Kodun süresi dolmuş. Lütfen yeni kod isteyiniz.')
+        validate_otp(user, otp.VERIFICATION, code,
+                     invalid='Doğrulama kodu hatalı.',
+                     expired='Kodun süresi dolmuş. Lütfen yeni kod isteyiniz.',
+                     consume=True)
             
         attrs['user'] = user
         return attrs
@@ -315,10 +339,9 @@ class PasswordChangeConfirmSerializer(serializers.Serializer):
         user = self.context['request'].user
         code = attrs.get('code')
 
-        if user.password_reset_code != code:
-            raise serializers.ValidationError({'code': 'Doğrulama kodu hatalı.'})
-
-        if user.password_reset_code_expired:
-            raise serializers.ValidationError({'code': 'Kodun süresi dolmuş. Lütfen yeni kod isteyiniz.'})
+        validate_otp(user, otp.PASSWORD_RESET, code,
+                     invalid='Doğrulama kodu hatalı.',
+                     expired='Kodun süresi dolmuş. Lütfen yeni kod isteyiniz.',
+                     field='code', consume=True)
 
         return attrs
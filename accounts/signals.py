@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+from .search import INDEXED_FIELDS, get_backend
+
+
+def _invalidate_user(user_id):
+    # Commit'ten sonra tekrar: transaction sürerken eski satırı okuyup önbelleğe
+    # alan başka bir istek de geçersiz kalır
+    invalidate_user(user_id)
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Kullanıcı güncellendiğinde/silindiğinde tüm süreçlerdeki token görüntüleri düşer."""
+    _invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    """Çıkış ve hesap kapatmada silinen token hiçbir süreçte önbellekten doğrulanmaz."""
+    invalidate_token(instance.key)
+    _invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Arama indeksini günceller; aranan alanlara dokunmayan kayıtlar (örn. last_login) atlanır."""
+    if raw or (update_fields is not None and not INDEXED_FIELDS & set(update_fields)):
+        return
+    get_backend().index([instance])
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def unindex_user(sender, instance, **kwargs):
+    get_backend().remove([instance.pk])
+
+
+def create_search_index(sender, **kwargs):
+    get_backend().setup()
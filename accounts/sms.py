@@ -0,0 +1,164 @@
+"""
+SMS API istemcisi: rota seçimi ve kalıcı oturumlar.
+
+SMS API'sine üç rotadan ulaşılabilir:
+    - proxy: PythonAnywhere proxy'si üzerinden (ücretsiz hesaplarda zorunlu)
+    - direct: proxy'siz doğrudan
+    - no_verify: proxy üzerinden, SSL doğrulaması kapalı (sertifika sorunu olan ortamlar)
+
+Her rotanın keep-alive bağlantı havuzu olan kendi `requests.Session`'ı vardır.
+İstemci her rotanın art arda hata sayısını ve gecikme ortalamasını (EWMA) tutar;
+rotalar bu bilgiye göre sıralanır, böylece proxy'nin bozuk olduğu bir sunucuda
+her SMS önce başarısız bir denemeye ödeme yapmaz. Son başarılı rota öne geçer.
+
+Sadece bağlantı kurulamayan hatalarda (proxy/bağlantı/SSL) sıradaki rota denenir;
+yanıt okunurken zaman aşımı olursa SMS gitmiş olabileceğinden tekrar gönderilmez.
+Rota gecikmeleri backend.metrics'e `sms.route.<rota>.latency` adıyla yazılır.
+"""
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+# Gecikme ortalamasında son ölçümün ağırlığı
+EWMA_ALPHA = 0.3
+
+# Başka rotaya geçilebilecek (istek sunucuya ulaşmamış) hatalar
+ROUTE_ERRORS = (requests.exceptions.ConnectionError,)  # ProxyError, SSLError ve ConnectTimeout dahil
+
+
+class SMSRoute:
+    def __init__(self, name, proxies=None, verify=True, pool_size=4):
+        self.name = name
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        if proxies:
+            self.session.proxies.update(proxies)
+        self.session.verify = verify
+
+        # SSL doğrulaması kapalı rota sadece bu çağrıda SSL hatası alındıysa
+        # veya daha önce çalıştığı biliniyorsa denenir
+        self.insecure = not verify
+        self.failures = 0
+        self.latency_ms = None
+
+        self.latency = metrics.histogram(f'sms.route.{name}.latency')
+        self.successes = metrics.counter(f'sms.route.{name}.success')
+        self.errors = metrics.counter(f'sms.route.{name}.failure')
+
+    def record_success(self, elapsed_ms):
+        self.failures = 0
+        if self.latency_ms is None:
+            self.latency_ms = elapsed_ms
+        else:
+            self.latency_ms = EWMA_ALPHA * elapsed_ms + (1 - EWMA_ALPHA) * self.latency_ms
+        self.latency.observe(elapsed_ms)
+        self.successes.inc()
+
+    def record_failure(self, elapsed_ms):
+        self.failures += 1
+        self.latency.observe(elapsed_ms)
+        self.errors.inc()
+
+    @property
+    def proven(self):
+        return self.failures == 0 and self.latency_ms is not None
+
+    def snapshot(self):
+        return {
+            'failures': self.failures,
+            'latency_ms': None if self.latency_ms is None else round(self.latency_ms, 2),
+        }
+
+
+class SMSClient:
+    def __init__(self, url, routes, timeout=None):
+        self.url = url
+        self.routes = list(routes)
+        self.timeout = timeout or (
+            getattr(settings, 'SMS_CONNECT_TIMEOUT', 5),
+            getattr(settings, 'SMS_READ_TIMEOUT', 30),
+        )
+        metrics.gauge('sms.routes', lambda: {route.name: route.snapshot() for route in self.ordered_routes()})
+
+    def ordered_routes(self):
+        """
+        Önce hata vermeyen rotalar, kendi aralarında daha hızlı olan önde; son başarılı
+        rota böylece hep öndedir. Hiç denenmemiş rotalar tanımlı sıralarını korur.
+        """
+        indexed = list(enumerate(self.routes))
+        indexed.sort(key=lambda item: (
+            item[1].failures,
+            item[1].latency_ms if item[1].latency_ms is not None else float('inf'),
+            item[0],
+        ))
+        return [route for _, route in indexed]
+
+    def post(self, payload):
+        """
+        payload'ı sırayla rotalar üzerinden gönderir; (rota, yanıt) döner.
+        Hiçbir rota bağlantı kuramazsa son hata fırlatılır.
+        """
+        last_error = None
+        ssl_failed = False
+        deferred = []
+        for route in self.ordered_routes():
+            if route.insecure and not route.proven:
+                deferred.append(route)
+                continue
+            response = self._attempt(route, payload)
+            if not isinstance(response, Exception):
+                return route, response
+            last_error = response
+            ssl_failed = ssl_failed or isinstance(response, requests.exceptions.SSLError)
+
+        for route in deferred if ssl_failed else ():
+            response = self._attempt(route, payload)
+            if not isinstance(response, Exception):
+                return route, response
+            last_error = response
+        raise last_error or requests.exceptions.ConnectionError('SMS rotası tanımlı değil')
+
+    def _attempt(self, route, payload):
+        """Yanıtı, ya da sıradaki rotanın denenebileceği bağlantı hatasını döner."""
+        started = time.monotonic()
+        try:
+            response = route.session.post(self.url, json=payload, timeout=self.timeout)
+        except ROUTE_ERRORS as e:
+            route.record_failure((time.monotonic() - started) * 1000)
+            logger.warning(f"SMS rotası '{route.name}' başarısız: {e}")
+            return e
+        except requests.exceptions.RequestException:
+            route.record_failure((time.monotonic() - started) * 1000)
+            raise
+        route.record_success((time.monotonic() - started) * 1000)
+        return response
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_sms_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from .utils import PROXIES, SMS_API_URL
+                _client = SMSClient(SMS_API_URL, [
+                    SMSRoute('proxy', proxies=PROXIES),
+                    SMSRoute('direct'),
+                    SMSRoute('no_verify', proxies=PROXIES, verify=False),
+                ])
+    return _client
@@ -1,8 +1,29 @@
+from io import StringIO
+from unittest import mock
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, SimpleTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import uuid
+from datetime import timedelta
+from backend import metrics
+from backend.outbound import CLOSED, OPEN, OutboundGuard
+from notifications.models import OutboxMessage
+from notifications.outbox import process_outbox
+from backend.middleware import APISessionMiddleware
+from . import otp
+from .authentication import VERSION_KEY_PREFIX, get_token_cache
+from .search import search_users
+from .sms import SMSClient, SMSRoute
+from .utils import send_sms
 
 User = get_user_model()
 
@@ -95,3 +116,372 @@ class AccountsAPITests(APITestCase):
         # Get list
         response = self.client.get(url)
         self.assertEqual(len(response.data), 1)
+
+
+class QueuedOTPDeliveryTests(APITestCase):
+    def _status(self, delivery_id):
+        return self.client.get(reverse('sms_delivery_status', args=[delivery_id])).data['status']
+
+    def test_register_queues_sms_and_reports_delivery_status(self):
+        with mock.patch('accounts.utils.send_sms') as mock_send:
+            response = self.client.post(reverse('register'), {
+                'email': 'otp@example.com',
+                'password': 'password123',
+                'full_name': 'OTP User',
+                'phone_number': '05551112233',
+            })
+            mock_send.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        delivery_id = response.data['sms_delivery_id']
+        self.assertEqual(self._status(delivery_id), 'queued')
+        sms = OutboxMessage.objects.get(channel='sms')
+        self.assertEqual(sms.payload['phone_number'], '905551112233')
+
+        with mock.patch('accounts.utils.send_sms', return_value=False):
+            process_outbox()
+        self.assertEqual(self._status(delivery_id), 'retrying')
+
+        OutboxMessage.objects.filter(pk=sms.pk).update(available_at=timezone.now())
+        with mock.patch('accounts.utils.send_sms', return_value=True) as mock_send:
+            process_outbox()
+        mock_send.assert_called_once_with('905551112233', sms.payload['message'])
+        self.assertEqual(self._status(delivery_id), 'sent')
+
+    def test_resend_supersedes_pending_code_and_expired_sms_is_not_sent(self):
+        user = User.objects.create_user(email='resend@example.com', password='password123', phone_number='5550000000')
+        url = reverse('resend_verification')
+        first = self.client.post(url, {'phone_number': '5550000000'}).data['sms_delivery_id']
+        second = self.client.post(url, {'phone_number': '5550000000'}).data['sms_delivery_id']
+        self.assertEqual(self._status(first), 'failed')
+        self.assertEqual(self._status(second), 'queued')
+        code = OutboxMessage.objects.get(status='pending').payload['message'][-4:]
+        self.assertEqual(otp.check(user, otp.VERIFICATION, code), otp.VALID)
+
+        OutboxMessage.objects.filter(status='pending').update(
+            payload={'phone_number': '905550000000', 'message': 'x', 'expires_at': timezone.now().isoformat()}
+        )
+        with mock.patch('accounts.utils.send_sms') as mock_send:
+            process_outbox()
+        mock_send.assert_not_called()
+        self.assertEqual(self._status(second), 'failed')
+
+    def test_unknown_delivery_id(self):
+        response = self.client.get(reverse('sms_delivery_status', args=['bozuk']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SMSBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.guard = OutboundGuard('test-sms', rate=1000, burst=1000, failure_threshold=2, reset_timeout=60)
+        patcher = mock.patch('accounts.utils.get_guard', return_value=self.guard)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reply(self, status_code):
+        response = mock.Mock(status_code=status_code, text='')
+        return mock.patch('accounts.utils.get_sms_client', return_value=mock.Mock(
+            post=mock.Mock(return_value=(SMSRoute('test-breaker-route'), response))))
+
+    def test_rejected_messages_do_not_open_the_breaker(self):
+        with self._reply(400):
+            self.assertEqual([send_sms('5551234567', 'x') for _ in range(3)], [False, False, False])
+        self.assertEqual(self.guard.breaker.state, CLOSED)
+
+    def test_provider_errors_open_the_breaker(self):
+        with self._reply(503):
+            send_sms('5551234567', 'x')
+            send_sms('5551234567', 'x')
+        self.assertEqual(self.guard.breaker.state, OPEN)
+
+
+class SMSRouteSelectionTests(SimpleTestCase):
+    def setUp(self):
+        self.proxy = SMSRoute('test-proxy', proxies={'http': 'http://proxy.test:3128'})
+        self.direct = SMSRoute('test-direct')
+        self.insecure = SMSRoute('test-no-verify', proxies={'http': 'http://proxy.test:3128'}, verify=False)
+        self.client_ = SMSClient('http://sms.test/', [self.proxy, self.direct, self.insecure])
+        self.ok = mock.Mock(status_code=200, text='OK')
+
+    def test_broken_proxy_is_skipped_after_first_failure(self):
+        with mock.patch.object(self.proxy.session, 'post', side_effect=requests.exceptions.ProxyError('403')) as proxy_post, \
+                mock.patch.object(self.direct.session, 'post', return_value=self.ok) as direct_post:
+            route, _ = self.client_.post({'Message': 'a'})
+            self.assertEqual(route, self.direct)
+            route, _ = self.client_.post({'Message': 'b'})
+            self.assertEqual(route, self.direct)
+        self.assertEqual(proxy_post.call_count, 1)
+        self.assertEqual(direct_post.call_count, 2)
+        self.assertEqual([r.name for r in self.client_.ordered_routes()][0], 'test-direct')
+        self.assertEqual(metrics.snapshot()['sms.route.test-direct.latency']['count'], 2)
+
+    def test_insecure_route_only_after_ssl_error(self):
+        refused = requests.exceptions.ConnectionError('refused')
+        with mock.patch.object(self.proxy.session, 'post', side_effect=refused), \
+                mock.patch.object(self.direct.session, 'post', side_effect=refused), \
+                mock.patch.object(self.insecure.session, 'post', return_value=self.ok) as insecure_post:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client_.post({})
+            insecure_post.assert_not_called()
+
+        with mock.patch.object(self.proxy.session, 'post', side_effect=requests.exceptions.SSLError('cert')), \
+                mock.patch.object(self.direct.session, 'post', side_effect=refused), \
+                mock.patch.object(self.insecure.session, 'post', return_value=self.ok):
+            route, _ = self.client_.post({})
+        self.assertEqual(route, self.insecure)
+
+    def test_read_timeout_is_not_retried_on_another_route(self):
+        with mock.patch.object(self.proxy.session, 'post', side_effect=requests.exceptions.ReadTimeout('slow')), \
+                mock.patch.object(self.direct.session, 'post', return_value=self.ok) as direct_post:
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                self.client_.post({})
+        direct_post.assert_not_called()
+
+
+class PhoneLookupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='phone@example.com', password='password123', phone_number='0532 123 45 67')
+
+    def test_phone_is_normalized_on_save_and_login_accepts_any_format(self):
+        self.assertEqual(self.user.phone_e164, '+905321234567')
+        for login in ('5321234567', '+90 532 123 45 67', '905321234567'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(reverse('login'), {'email': login, 'password': 'password123'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK, login)
+            user_selects = [q['sql'] for q in ctx.captured_queries if 'FROM "accounts_user"' in q['sql']]
+            self.assertIn('"accounts_user"."phone_e164" =', user_selects[0])
+            self.assertNotIn('LIKE', user_selects[0])
+
+        self.user.phone_number = '5320000000'
+        self.user.save(update_fields=['phone_number'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.phone_e164, '+905320000000')
+
+    def test_duplicate_phone_is_rejected_on_register(self):
+        response = self.client.post(reverse('register'), {
+            'email': 'other@example.com', 'password': 'password123', 'phone_number': '+905321234567',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backfill_fills_missing_values_and_skips_duplicates(self):
+        User.objects.filter(pk=self.user.pk).update(phone_e164=None)
+        duplicate = User.objects.create_user(email='dup@example.com', password='password123', phone_number='5551112233')
+        User.objects.filter(pk=duplicate.pk).update(phone_number='05321234567', phone_e164=None)
+
+        out = StringIO()
+        call_command('backfill_phone_e164', batch_size=1, stdout=out)
+        values = set(User.objects.filter(pk__in=[self.user.pk, duplicate.pk]).values_list('phone_e164', flat=True))
+        self.assertEqual(values, {'+905321234567', None})
+        self.assertIn('1 kullanıcı güncellendi, 0 numara en eski hesaba taşındı, 1 çakışma atlandı', out.getvalue())
+
+    def test_unbackfilled_users_are_found_and_their_numbers_are_protected(self):
+        User.objects.filter(pk=self.user.pk).update(phone_e164=None)
+        self.assertEqual(User.objects.get_by_phone('+90 532 123 45 67'), self.user)
+        response = self.client.post(reverse('login'), {'email': '05321234567', 'password': 'password123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('register'), {
+            'email': 'thief@example.com', 'password': 'password123', 'phone_number': '5321234567',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backfill_gives_number_to_earliest_account(self):
+        User.objects.filter(pk=self.user.pk).update(phone_e164=None)
+        newer = User.objects.create_user(email='newer@example.com', password='password123', phone_number='5551112233')
+        User.objects.filter(pk=newer.pk).update(phone_number='5321234567', phone_e164='+905321234567')
+
+        out = StringIO()
+        call_command('backfill_phone_e164', stdout=out)
+        self.user.refresh_from_db()
+        newer.refresh_from_db()
+        self.assertEqual(self.user.phone_e164, '+905321234567')
+        self.assertIsNone(newer.phone_e164)
+        self.assertIn('1 numara en eski hesaba taşındı', out.getvalue())
+
+    def test_profile_edit_to_taken_number_is_rejected(self):
+        other = User.objects.create_user(email='other-phone@example.com', password='password123', phone_number='5557778899')
+        self.client.force_authenticate(user=other)
+        response = self.client.patch(reverse('profile'), {'phone_number': '0532 123 45 67'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        other.refresh_from_db()
+        self.assertEqual(other.phone_e164, '+905557778899')
+
+    def test_concurrent_registration_with_same_number_returns_400(self):
+        data = {'email': 'race@example.com', 'password': 'password123', 'phone_number': '5550001122'}
+        # Doğrulama ikinci isteği geçirmiş, kayıt sırasında numara alınmış gibi
+        with mock.patch('accounts.serializers.validate_unique_phone', side_effect=lambda value, instance=None: value):
+            User.objects.create_user(email='first@example.com', password='password123', phone_number='5550001122')
+            response = self.client.post(reverse('register'), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('phone_number', response.data)
+
+
+@override_settings(TOKEN_AUTH_CACHE_ALLOW_LOCAL=True)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        get_token_cache().clear()
+        cache.clear()
+        self.user = User.objects.create_user(email='cached@example.com', password='password123',
+                                             full_name='Önbellek', phone_number='5559998877')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_request_skips_token_query(self):
+        # İlk istek kullanıcının paylaşılan sürümünü oluşturur, ikincisi görüntüyü saklar
+        for _ in range(2):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in ctx.captured_queries if 'authtoken_token' in q['sql']])
+
+    def test_user_update_invalidates_snapshot(self):
+        self.client.get(reverse('profile'))
+        self.user.full_name = 'Güncel'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('profile')).data['full_name'], 'Güncel')
+
+    def test_logout_and_account_deletion_invalidate_token(self):
+        self.client.get(reverse('profile'))
+        self.client.post(reverse('logout'))
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.client.get(reverse('profile'))
+        self.client.post(reverse('delete_account'))
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalidation_from_another_worker_drops_local_snapshot(self):
+        self.client.get(reverse('profile'))
+        self.client.get(reverse('profile'))
+        # Başka bir worker kullanıcıyı pasife aldı: bu süreçte sinyal çalışmaz,
+        # yalnızca paylaşılan sürüm anahtarı silinir
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.delete(f'{VERSION_KEY_PREFIX}:{self.user.pk}')
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALLOW_LOCAL=False)
+    def test_process_local_cache_backend_disables_snapshot_cache(self):
+        self.client.get(reverse('profile'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('profile'))
+        self.assertTrue([q for q in ctx.captured_queries if 'authtoken_token' in q['sql']])
+
+    def test_profile_update_does_not_write_back_cached_values(self):
+        self.client.get(reverse('profile'))
+        self.client.get(reverse('profile'))
+        User.objects.filter(pk=self.user.pk).update(role='Yönetici')
+        self.client.patch(reverse('profile'), {'full_name': 'Yeni Ad'})
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.full_name, self.user.role), ('Yeni Ad', 'Yönetici'))
+
+    def test_api_session_middleware_skips_session_for_api_paths(self):
+        middleware = APISessionMiddleware(lambda request: None)
+        factory = RequestFactory()
+        session_key = 'a' * 32
+
+        request = factory.get('/api/auth/me/', HTTP_COOKIE=f'sessionid={session_key}')
+        with CaptureQueriesContext(connection) as ctx:
+            middleware.process_request(request)
+            self.assertEqual(dict(request.session), {})
+        self.assertIsNone(request.session.session_key)
+        self.assertEqual(ctx.captured_queries, [])
+
+        request = factory.get('/admin/', HTTP_COOKIE=f'sessionid={session_key}')
+        middleware.process_request(request)
+        self.assertEqual(request.session.session_key, session_key)
+
+
+class OTPStoreTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='otp-store@example.com', password='password123', phone_number='5553332211')
+
+    def _last_code(self):
+        return OutboxMessage.objects.filter(channel='sms').latest('id').payload['message'][-4:]
+
+    def test_codes_stay_off_user_table_and_are_single_use(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('password_reset_request'), {'phone_number': '5553332211'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "accounts_user"')])
+
+        data = {'phone_number': '5553332211', 'code': self._last_code(), 'new_password': 'yeniParola123'}
+        self.assertEqual(self.client.post(reverse('password_reset_verify'), data).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(reverse('password_reset_confirm'), data).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(reverse('password_reset_confirm'), data).status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(OTP_MAX_ATTEMPTS=3)
+    def test_code_locks_after_max_failed_attempts(self):
+        code = otp.issue(self.user, otp.VERIFICATION)
+        wrong = f'{(int(code) + 1) % 10000:04d}'
+        self.assertEqual(otp.check(self.user, otp.VERIFICATION, wrong), otp.INVALID)
+        self.assertEqual(otp.check(self.user, otp.VERIFICATION, wrong), otp.INVALID)
+        self.assertEqual(otp.check(self.user, otp.VERIFICATION, wrong), otp.LOCKED)
+        self.assertEqual(otp.check(self.user, otp.VERIFICATION, code), otp.LOCKED)
+
+        code = otp.issue(self.user, otp.VERIFICATION)
+        self.assertEqual(otp.check(self.user, otp.VERIFICATION, code, consume=True), otp.VALID)
+
+    @override_settings(OTP_MAX_ATTEMPTS=3)
+    def test_parallel_guesses_on_a_stale_row_cannot_exceed_the_limit(self):
+        code = otp.issue(self.user, otp.VERIFICATION)
+        stale = otp.OneTimeCode.objects.get(user=self.user)
+        wrong = f'{(int(code) + 1) % 10000:04d}'
+        # Her istek satırı attempts=0 iken okumuş gibi davranır
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=stale):
+            results = [otp.check(self.user, otp.VERIFICATION, wrong) for _ in range(5)]
+            self.assertEqual(otp.check(self.user, otp.VERIFICATION, code), otp.LOCKED)
+        self.assertEqual(results.count(otp.INVALID), 3)
+        self.assertEqual(results[3:], [otp.LOCKED, otp.LOCKED])
+        self.assertEqual(otp.OneTimeCode.objects.get(pk=stale.pk).attempts, 3)
+
+    def test_expired_code_is_rejected(self):
+        code = otp.issue(self.user, otp.VERIFICATION)
+        otp.OneTimeCode.objects.update(expires_at=timezone.now())
+        self.assertEqual(otp.check(self.user, otp.VERIFICATION, code), otp.EXPIRED)
+        self.assertEqual(otp.purge(), (1, 0))
+
+    @override_settings(OTP_SEND_MAX_PER_PHONE=2, OTP_SEND_MAX_PER_IP=3, OTP_IP_HEADER='REMOTE_ADDR')
+    def test_sends_are_throttled_per_phone_and_per_ip(self):
+        url = reverse('resend_verification')
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, {'phone_number': '5553332211'}).status_code, status.HTTP_200_OK)
+        response = self.client.post(url, {'phone_number': '05553332211'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(OutboxMessage.objects.filter(channel='sms').count(), 2)
+
+        User.objects.create_user(email='other-otp@example.com', password='password123', phone_number='5554445566')
+        self.assertEqual(self.client.post(url, {'phone_number': '5554445566'}).status_code, status.HTTP_200_OK)
+        response = self.client.post(url, {'phone_number': '5554445566'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        otp.OTPSendLog.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(self.client.post(url, {'phone_number': '5554445566'}).status_code, status.HTTP_200_OK)
+
+    def test_ip_limit_needs_a_configured_header(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.7')
+        self.assertIsNone(otp.client_ip(request))
+        with override_settings(OTP_IP_HEADER='HTTP_X_FORWARDED_FOR'):
+            # İstemcinin yazdığı baştaki değer değil, proxy'nin eklediği son değer
+            self.assertEqual(otp.client_ip(request), '203.0.113.7')
+
+
+class UserSearchIndexTests(APITestCase):
+    def test_rebuild_picks_up_rows_changed_without_signals(self):
+        user = User.objects.create_user(email='index@example.com', password='password123', full_name='Eski Ad')
+        User.objects.filter(pk=user.pk).update(full_name='Gülşen Öztürk')
+        self.assertEqual(search_users('gulsen'), [])
+
+        out = StringIO()
+        call_command('rebuild_user_search', batch_size=1, stdout=out)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(search_users('gulsen ozt'), [user.pk])
+        self.assertFalse([q for q in ctx.captured_queries if 'LIKE' in q['sql']])
+        self.assertIn('Toplam 1 kullanıcı', out.getvalue())
+
+    def test_saves_that_do_not_touch_indexed_fields_skip_the_index(self):
+        user = User.objects.create_user(email='skip@example.com', password='password123')
+        with CaptureQueriesContext(connection) as ctx:
+            user.save(update_fields=['last_login'])
+        self.assertFalse([q for q in ctx.captured_queries if 'accounts_user_search' in q['sql']])
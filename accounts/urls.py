@@ -11,6 +11,7 @@ from .views import (
     ExpoPushTokenView,
     VerifyAccountView,
     ResendVerificationView,
+    SMSDeliveryStatusView,
     DeleteAccountView,
     MembershipCancelView,
     AddressListCreateView,
@@ -43,6 +44,7 @@ urlpatterns = [
     # Hesap doğrulama işlemleri
     path('verify-account/', VerifyAccountView.as_view(), name='verify_account'),
     path('resend-verification/', ResendVerificationView.as_view(), name='resend_verification'),
+    path('sms-status/<str:delivery_id>/', SMSDeliveryStatusView.as_view(), name='sms_delivery_status'),
     
     # Push notification token
     path('push-token/', PushTokenView.as_view(), name='push_token'),
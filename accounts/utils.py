@@ -1,6 +1,12 @@
-import requests
 import logging
+import time
+from datetime import timedelta
 from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from backend import metrics
+from backend.outbound import CallRejected, get_guard
+from .sms import get_sms_client
 
 # Logger konfigürasyonu
 logger = logging.getLogger(__name__)
@@ -27,6 +33,8 @@ PROXIES = {
     "https": PROXY_URL,
 }
 
+sms_batch_latency = metrics.histogram('sms.batch_latency')
+
 def format_phone_number(phone_number):
     """Telefon numarasını API formatına çevir (90XXXXXXXXXX)"""
     phone = str(phone_number).strip().replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
@@ -46,12 +54,105 @@ def format_phone_number(phone_number):
     return phone
 
 
+def normalize_phone(phone_number):
+    """
+    Telefon numarasını E.164 biçimine çevirir (+905XXXXXXXXX).
+    '+' veya '00' ile başlayan numaraların ülke kodu korunur; diğerleri
+    format_phone_number gibi Türkiye numarası kabul edilir. Numara değilse None.
+    """
+    raw = str(phone_number or '').strip()
+    if raw.startswith('+') or raw.startswith('00'):
+        digits = ''.join(ch for ch in raw if ch.isdigit())
+        digits = digits[2:] if raw.startswith('00') else digits
+    else:
+        digits = ''.join(ch for ch in raw if ch.isdigit())
+        if not digits:
+            return None
+        digits = format_phone_number(digits)
+    if not 8 <= len(digits) <= 15:
+        return None
+    return f'+{digits}'
+
+
+def phone_variants(e164):
+    """E.164 numaranın eski kayıtlarda görülen rakam biçimleri (905.., 05.., 5..)."""
+    digits = e164.lstrip('+')
+    variants = {digits, f'00{digits}'}
+    if digits.startswith('90'):
+        variants.update({digits[2:], f'0{digits[2:]}'})
+    return sorted(variants)
+
+
 def send_sms(phone_number, message):
-    """SMS gönderim fonksiyonu - NAC Telekom / Netgsm"""
-    phone = format_phone_number(phone_number)
-    
-    headers = {"Content-Type": "application/json"}
-    
+    """
+    SMS gönderim fonksiyonu - NAC Telekom / Netgsm
+    Gönderim backend.outbound 'sms' korumasından geçer: sağlayıcı art arda hata
+    verdiğinde devre açılır ve çağrılar zaman aşımlarını beklemeden False döner.
+    """
+    return _guarded_submit([format_phone_number(phone_number)], message)
+
+
+class SMSBatchFailed(Exception):
+    """Toplu SMS partisi gönderilemedi (devre açık, hız sınırı, sağlayıcı hatası veya red)."""
+
+
+def send_bulk_sms(phone_numbers, message, batch_size=None, fail_silently=True):
+    """
+    Aynı mesajı birden çok numaraya gönderir. Numaralar bir kez normalize edilip
+    tekilleştirilir ve SMS_BATCH_SIZE'lık `To` listeleriyle parti başına tek
+    istek atılır. Partiler OTP'lerden ayrı 'sms_bulk' korumasından geçer.
+    Başarılı partilerdeki numara sayısını döner; fail_silently=False ise
+    gönderilemeyen ilk partide SMSBatchFailed fırlatılır.
+    """
+    batch_size = batch_size or getattr(settings, 'SMS_BATCH_SIZE', 500)
+    phones = list(dict.fromkeys(format_phone_number(number) for number in phone_numbers if number))
+    sent = 0
+    for start in range(0, len(phones), batch_size):
+        batch = phones[start:start + batch_size]
+        started = time.monotonic()
+        ok = _guarded_submit(batch, message, guard_name='sms_bulk')
+        elapsed_ms = (time.monotonic() - started) * 1000
+        sms_batch_latency.observe(elapsed_ms)
+        logger.info(f"SMS partisi ({len(batch)} numara) {elapsed_ms:.0f} ms'de {'gönderildi' if ok else 'gönderilemedi'}")
+        if ok:
+            sent += len(batch)
+        elif not fail_silently:
+            raise SMSBatchFailed(f"SMS partisi gönderilemedi ({len(batch)} numara, {sent} numaraya gönderildi)")
+    return sent
+
+
+class SMSProviderError(Exception):
+    """SMS sağlayıcısına ulaşılamadı veya sağlayıcı 5xx döndü."""
+
+
+def _guarded_submit(phones, message, guard_name='sms'):
+    """
+    Devre kesiciye yalnızca sağlayıcı hataları (bağlantı, 5xx) işlenir. 4xx yanıtlar
+    (geçersiz numara, bakiye vb.) mesaja özgüdür; sağlayıcı sağlıklı sayılır.
+    """
+    guard = get_guard(guard_name)
+    try:
+        guard.acquire()
+    except CallRejected as e:
+        logger.warning(f"SMS gönderilmedi: {e}")
+        return False
+
+    try:
+        sent = _submit(phones, message)
+    except SMSProviderError as e:
+        logger.error(str(e))
+        guard.record_failure()
+        return False
+    guard.record_success()
+    return sent
+
+
+def _submit(phones, message):
+    """
+    SMS'i accounts.sms istemcisiyle en iyi rotadan gönderir (proxy / doğrudan / SSL doğrulamasız).
+    Gönderildiyse True, sağlayıcı mesajı reddettiyse (4xx) False döner; bağlantı
+    hatası ve 5xx'te SMSProviderError fırlatır.
+    """
     # Yeni API JSON yapısı (smsapi.nac.com.tr)
     payload = {
         "Credential": {
@@ -63,65 +164,27 @@ def send_sms(phone_number, message):
             "ValidityPeriod": 0
         },
         "Message": message,
-        "To": [phone],
+        "To": phones,
         "DataCoding": "Default"
     }
     
-    logger.info(f"Sending SMS to {phone} with content: {message}")
+    recipients = phones[0] if len(phones) == 1 else f"{len(phones)} numara"
+    logger.info(f"Sending SMS to {recipients} with content: {message}")
     
     try:
-        # PythonAnywhere Free Tier için Proxy Ayarları
-        try:
-            response = requests.post(
-                SMS_API_URL, 
-                json=payload, 
-                headers=headers, 
-                timeout=30,
-                proxies=PROXIES
-            )
-        except (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError) as proxy_err:
-             # Proxy hatası (Örn: Local ortamda proxy yoksa veya proxy 403 veriyorsa)
-             # Eğer 403 Forbidden varsa bu whitelist sorunudur, ancak yine de proxysiz denemekte fayda var (belki localdir)
-             logger.warning(f"Proxy bağlantı hatası veya erişim engeli: {proxy_err}. Proxysiz deneniyor...")
-             response = requests.post(
-                SMS_API_URL, 
-                json=payload, 
-                headers=headers, 
-                timeout=30
-            )
-
-        if response.status_code == 200:
-            logger.info(f"SMS başarıyla gönderildi: {phone} - Response: {response.text}")
-            return True
-        else:
-            logger.error(f"SMS gönderim hatası: Status={response.status_code}, Body={response.text}")
-            return False
-            
-    except requests.exceptions.SSLError as e:
-        logger.warning(f"SSL Error for {SMS_API_URL}. Retrying without verify: {e}")
-        try:
-            # SSL hatası durumunda verify=False ile tekrar dene
-            response = requests.post(
-                SMS_API_URL, 
-                json=payload, 
-                headers=headers, 
-                timeout=30, 
-                verify=False,
-                proxies=PROXIES
-            )
-            if response.status_code == 200:
-                logger.info(f"SMS başarıyla gönderildi (No Verify): {phone} - Response: {response.text}")
-                return True
-            else:
-                logger.error(f"SMS gönderim hatası (No Verify): Status={response.status_code}, Body={response.text}")
-                return False
-        except Exception as e2:
-            logger.error(f"SMS retry failed: {e2}")
-            return False
-            
+        route, response = get_sms_client().post(payload)
     except Exception as e:
-        logger.error(f"SMS gönderim genel hatası: {e}")
-        return False
+        raise SMSProviderError(f"SMS gönderim genel hatası: {e}") from e
+
+    if response.status_code == 200:
+        logger.info(f"SMS başarıyla gönderildi ({route.name}): {recipients} - Response: {response.text}")
+        return True
+    if response.status_code >= 500:
+        raise SMSProviderError(
+            f"SMS sağlayıcı hatası ({route.name}): Status={response.status_code}, Body={response.text}"
+        )
+    logger.warning(f"SMS reddedildi ({route.name}): {recipients} - Status={response.status_code}, Body={response.text}")
+    return False
 
 
 def send_verification_sms(phone_number, code):
@@ -134,3 +197,61 @@ def send_password_reset_sms(phone_number, code):
     """Parola sıfırlama SMS'i gönder"""
     message = f"Premium Vale parola sıfırlama kodunuz: {code}"
     return send_sms(phone_number, message)
+
+
+# --- Kuyruklu OTP gönderimi ---
+# OTP SMS'leri istek içinde gönderilmez; notifications outbox'ına yazılır ve
+# `process_outbox` worker'ı tarafından tekrar deneme/bekleme ile iletilir.
+# İstemci dönen `sms_delivery_id` ile gönderim durumunu sorgulayabilir.
+
+SMS_DELIVERY_SALT = 'accounts.sms-delivery'
+
+def queue_sms(phone_number, message, replace_key=''):
+    """SMS'i outbox'a yazar; OTP_SMS_TTL_SECONDS içinde gönderilemezse vazgeçilir."""
+    from notifications.outbox import enqueue_sms
+
+    ttl = getattr(settings, 'OTP_SMS_TTL_SECONDS', 900)
+    return enqueue_sms(
+        format_phone_number(phone_number),
+        message,
+        replace_key=replace_key,
+        expires_at=timezone.now() + timedelta(seconds=ttl) if ttl else None,
+    )
+
+
+def queue_verification_sms(user, code):
+    """Hesap doğrulama SMS'ini kuyruğa alır; kullanıcının bekleyen eski kodu iptal edilir."""
+    message = f"Premium Vale hesap doğrulama kodunuz: {code}"
+    return queue_sms(user.phone_number, message, replace_key=f'otp:verification:{user.pk}')
+
+
+def queue_password_reset_sms(user, code):
+    """Parola sıfırlama SMS'ini kuyruğa alır; kullanıcının bekleyen eski kodu iptal edilir."""
+    message = f"Premium Vale parola sıfırlama kodunuz: {code}"
+    return queue_sms(user.phone_number, message, replace_key=f'otp:password_reset:{user.pk}')
+
+
+def sms_delivery_id(outbox_message):
+    """Outbox mesajı için tahmin edilemeyen, imzalı durum sorgu anahtarı."""
+    if outbox_message is None:
+        return None
+    return signing.dumps(outbox_message.pk, salt=SMS_DELIVERY_SALT)
+
+
+def sms_delivery_status(delivery_id):
+    """
+    İmzalı anahtarın gösterdiği SMS'in durumu: queued / retrying / sent / failed.
+    Anahtar geçersizse None döner.
+    """
+    from notifications.models import OutboxMessage
+
+    try:
+        pk = signing.loads(delivery_id, salt=SMS_DELIVERY_SALT)
+    except signing.BadSignature:
+        return None
+    message = OutboxMessage.objects.filter(pk=pk, channel='sms').only('status', 'attempts').first()
+    if message is None:
+        return None
+    if message.status != 'pending':
+        return message.status
+    return 'retrying' if message.attempts else 'queued'
@@ -6,10 +6,12 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+from . import otp
 from .models import User, PushToken, Address, Invoice, EmergencyContact
-from .utils import send_password_reset_sms, send_verification_sms
+from .utils import queue_password_reset_sms, queue_verification_sms, sms_delivery_id, sms_delivery_status
 
 from .serializers import (
+    save_user,
     UserCreateSerializer, 
     UserSerializer, 
     LoginSerializer,
@@ -33,6 +35,8 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
 
     def create(self, request, *args, **kwargs):
+        # Kullanıcı oluşturulmadan önce SMS gönderim sınırı kontrol edilir
+        otp.ensure_can_send(request.data.get('phone_number'), otp.client_ip(request))
         email = request.data.get('email')
         if email:
             try:
@@ -54,25 +58,27 @@ class RegisterView(generics.CreateAPIView):
                     user.is_active = True
                     user.is_verified = False # Tekrar doğrulama gereksin
                     
-                    # Doğrulama kodu oluştur ve kaydet
-                    code = user.generate_verification_code()
-                    user.save()
+                    save_user(user.save)
+                    code = otp.issue(user, otp.VERIFICATION, otp.client_ip(request))
                     
-                    send_verification_sms(user.phone_number, code)
+                    delivery = queue_verification_sms(user, code)
                     
                     headers = self.get_success_headers(serializer.data)
-                    return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+                    data = dict(serializer.data, sms_delivery_id=sms_delivery_id(delivery))
+                    return Response(data, status=status.HTTP_201_CREATED, headers=headers)
             except User.DoesNotExist:
                 pass
         
-        return super().create(request, *args, **kwargs)
+        response = super().create(request, *args, **kwargs)
+        response.data['sms_delivery_id'] = sms_delivery_id(self.sms_delivery)
+        return response
 
     def perform_create(self, serializer):
         user = serializer.save()
-        # Kayıt sonrası doğrulama kodu gönder
-        code = user.generate_verification_code()
-        logger.info(f"User created: {user.email}, Phone: {user.phone_number}. Sending SMS...")
-        send_verification_sms(user.phone_number, code)
+        # Kayıt sonrası doğrulama kodu gönder (outbox üzerinden, istek beklemeden)
+        code = otp.issue(user, otp.VERIFICATION, otp.client_ip(self.request))
+        logger.info(f"User created: {user.email}, Phone: {user.phone_number}. Queueing SMS...")
+        self.sms_delivery = queue_verification_sms(user, code)
 
 class LoginView(views.APIView):
     permission_classes = [permissions.AllowAny]
@@ -114,6 +120,10 @@ class ProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
+        if self.request.method in ('PUT', 'PATCH'):
+            # request.user önbellekteki görüntüden gelebilir; tam satır kaydı
+            # eski değerleri geri yazmasın diye güncelleme güncel satır üzerinde yapılır
+            return User.objects.get(pk=self.request.user.pk)
         return self.request.user
 
 class PasswordResetRequestView(views.APIView):
@@ -124,10 +134,13 @@ class PasswordResetRequestView(views.APIView):
         if serializer.is_valid():
             phone_number = serializer.validated_data['phone_number']
             try:
-                user = User.objects.get(phone_number=phone_number)
-                code = user.generate_password_reset_code()
-                send_password_reset_sms(user.phone_number, code)
-                return Response({"message": "Sıfırlama kodu gönderildi"}, status=status.HTTP_200_OK)
+                user = User.objects.get_by_phone(phone_number)
+                code = otp.issue(user, otp.PASSWORD_RESET, otp.client_ip(request))
+                delivery = queue_password_reset_sms(user, code)
+                return Response({
+                    "message": "Sıfırlama kodu gönderildi",
+                    "sms_delivery_id": sms_delivery_id(delivery),
+                }, status=status.HTTP_200_OK)
             except User.DoesNotExist:
                 # Güvenlik için kullanıcı bulunamadı demeyebiliriz, ama UX için şimdilik diyelim
                 return Response({"error": "Bu numara ile kayıtlı bir hesap bulunamadı"}, status=status.HTTP_404_NOT_FOUND)
@@ -151,8 +164,7 @@ class SetNewPasswordView(views.APIView):
             user = serializer.validated_data['user']
             new_password = serializer.validated_data['new_password']
             user.set_password(new_password)
-            user.password_reset_code = None # Kodu geçersiz kıl
-            user.save()
+            user.save(update_fields=['password'])
             return Response({"message": "Parola başarıyla güncellendi"}, status=status.HTTP_200_OK)
         print(serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -173,8 +185,7 @@ class VerifyAccountView(views.APIView):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             user.is_verified = True
-            user.verification_code = None
-            user.save()
+            user.save(update_fields=['is_verified'])
             
             # Otomatik giriş için token oluşturabiliriz
             token, _ = Token.objects.get_or_create(user=user)
@@ -194,17 +205,33 @@ class ResendVerificationView(views.APIView):
         if serializer.is_valid():
             phone_number = serializer.validated_data['phone_number']
             try:
-                user = User.objects.get(phone_number=phone_number)
+                user = User.objects.get_by_phone(phone_number)
                 if user.is_verified:
                     return Response({"message": "Hesap zaten doğrulanmış"}, status=status.HTTP_200_OK)
                 
-                code = user.generate_verification_code()
-                send_verification_sms(user.phone_number, code)
-                return Response({"message": "Doğrulama kodu tekrar gönderildi"}, status=status.HTTP_200_OK)
+                code = otp.issue(user, otp.VERIFICATION, otp.client_ip(request))
+                delivery = queue_verification_sms(user, code)
+                return Response({
+                    "message": "Doğrulama kodu tekrar gönderildi",
+                    "sms_delivery_id": sms_delivery_id(delivery),
+                }, status=status.HTTP_200_OK)
             except User.DoesNotExist:
                 return Response({"error": "Kullanıcı bulunamadı"}, status=status.HTTP_404_NOT_FOUND)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class SMSDeliveryStatusView(views.APIView):
+    """
+    Kuyruğa alınan OTP SMS'inin durumu (queued / retrying / sent / failed).
+    Uygulama 'kod gönderildi' veya 'tekrar dene' göstermek için sorgular.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, delivery_id):
+        delivery_status = sms_delivery_status(delivery_id)
+        if delivery_status is None:
+            return Response({"error": "Gönderim bulunamadı"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"status": delivery_status}, status=status.HTTP_200_OK)
+
 class DeleteAccountView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -212,7 +239,7 @@ class DeleteAccountView(views.APIView):
         user = request.user
         # Hesabı tamamen silmek yerine pasife alıyoruz (Soft Delete)
         user.is_active = False
-        user.save()
+        user.save(update_fields=['is_active'])
         
         # Token'ı silerek oturumu sonlandır
         try:
@@ -229,7 +256,7 @@ class MembershipCancelView(views.APIView):
         user = request.user
         # Üyelik iptali mantığı (örneğin hesabı pasife alma)
         user.is_active = False
-        user.save()
+        user.save(update_fields=['is_active'])
         # Token'ı silerek oturumu sonlandır
         try:
             user.auth_token.delete()
@@ -310,9 +337,12 @@ class PasswordChangeRequestView(views.APIView):
         if serializer.is_valid():
             user = request.user
             # Şifre sıfırlama kodunu kullanarak SMS gönder
-            code = user.generate_password_reset_code()
-            send_password_reset_sms(user.phone_number, code)
-            return Response({"message": "Doğrulama kodu telefonunuza gönderildi."}, status=status.HTTP_200_OK)
+            code = otp.issue(user, otp.PASSWORD_RESET, otp.client_ip(request))
+            delivery = queue_password_reset_sms(user, code)
+            return Response({
+                "message": "Doğrulama kodu telefonunuza gönderildi.",
+                "sms_delivery_id": sms_delivery_id(delivery),
+            }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -326,7 +356,6 @@ class PasswordChangeConfirmView(views.APIView):
             user = request.user
             new_password = serializer.validated_data['new_password']
             user.set_password(new_password)
-            user.password_reset_code = None  # Kodu geçersiz kıl
-            user.save()
+            user.save(update_fields=['password'])
             return Response({"message": "Şifreniz başarıyla değiştirildi."}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,167 @@
+"""
+Süreç genelinde paylaşılan, sınırlı arka plan iş havuzu.
+
+İstek başına `threading.Thread` açmak yerine işler sabit sayıda worker'a sahip
+bir havuza verilir. Kuyruk dolduğunda BACKGROUND_REJECTION_POLICY uygulanır:
+    - 'caller_runs': iş çağıran thread'de (istek içinde) çalıştırılır
+    - 'abort': TaskRejected fırlatılır
+    - 'discard': iş loglanıp atılır
+Her işten sonra worker thread'in veritabanı bağlantıları kapatılır.
+Süreç kapanırken kuyruktaki işler bitirilir (drain).
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class TaskRejected(Exception):
+    pass
+
+
+class BoundedExecutor:
+    def __init__(self, name, max_workers, max_queue, rejection_policy='caller_runs'):
+        if rejection_policy not in ('caller_runs', 'abort', 'discard'):
+            raise ValueError(f"Bilinmeyen rejection policy: {rejection_policy}")
+        self.name = name
+        self.max_workers = max_workers
+        self.rejection_policy = rejection_policy
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._active = 0
+
+        self.submitted = metrics.counter(f'{name}.submitted')
+        self.completed = metrics.counter(f'{name}.completed')
+        self.failed = metrics.counter(f'{name}.failed')
+        self.rejected = metrics.counter(f'{name}.rejected')
+        self.wait_latency = metrics.histogram(f'{name}.queue_wait')
+        self.run_latency = metrics.histogram(f'{name}.task_latency')
+        metrics.gauge(f'{name}.queue_depth', self._queue.qsize)
+        metrics.gauge(f'{name}.active_workers', lambda: self._active)
+
+    def submit(self, fn, *args, **kwargs):
+        """İşi kuyruğa ekler. Kuyruğa alındıysa True, reddedilip atıldıysa False döner."""
+        if self._shutdown:
+            raise TaskRejected(f"{self.name} kapatıldı.")
+        self._ensure_workers()
+        self.submitted.inc()
+        try:
+            self._queue.put_nowait((fn, args, kwargs, time.monotonic()))
+            return True
+        except queue.Full:
+            self.rejected.inc()
+
+        if self.rejection_policy == 'abort':
+            raise TaskRejected(f"{self.name} kuyruğu dolu.")
+        if self.rejection_policy == 'discard':
+            logger.warning(f"{self.name} kuyruğu dolu, iş atıldı: {getattr(fn, '__name__', fn)}")
+            return False
+        # caller_runs: geri basınç; iş isteği yapan thread'de çalışır
+        self._run(fn, args, kwargs, close_connections=False)
+        return True
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.max_workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._worker, name=f'{self.name}-{len(self._threads)}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                fn, args, kwargs, enqueued_at = item
+                self.wait_latency.observe((time.monotonic() - enqueued_at) * 1000)
+                self._run(fn, args, kwargs, close_connections=True)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, fn, args, kwargs, close_connections):
+        started = time.monotonic()
+        with self._lock:
+            self._active += 1
+        try:
+            if close_connections:
+                close_old_connections()
+            fn(*args, **kwargs)
+            self.completed.inc()
+        except Exception:
+            self.failed.inc()
+            logger.exception(f"{self.name} işi başarısız: {getattr(fn, '__name__', fn)}")
+        finally:
+            with self._lock:
+                self._active -= 1
+            self.run_latency.observe((time.monotonic() - started) * 1000)
+            if close_connections:
+                connections.close_all()
+
+    def shutdown(self, wait=True, timeout=None):
+        """Yeni iş almayı durdurur; wait=True ise kuyruktaki işlerin bitmesini bekler."""
+        if self._shutdown:
+            return
+        self._shutdown = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self._threads:
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                thread.join(remaining)
+
+    def metrics(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'active_workers': self._active,
+            'submitted': self.submitted.value,
+            'completed': self.completed.value,
+            'failed': self.failed.value,
+            'rejected': self.rejected.value,
+            'queue_wait': self.wait_latency.snapshot(),
+            'task_latency': self.run_latency.snapshot(),
+        }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BoundedExecutor(
+                    'background',
+                    max_workers=getattr(settings, 'BACKGROUND_MAX_WORKERS', 4),
+                    max_queue=getattr(settings, 'BACKGROUND_MAX_QUEUE', 100),
+                    rejection_policy=getattr(settings, 'BACKGROUND_REJECTION_POLICY', 'caller_runs'),
+                )
+                atexit.register(
+                    _executor.shutdown,
+                    wait=True,
+                    timeout=getattr(settings, 'BACKGROUND_SHUTDOWN_TIMEOUT', 30),
+                )
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    return get_executor().submit(fn, *args, **kwargs)
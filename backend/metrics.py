@@ -0,0 +1,98 @@
+"""
+Süreç içi basit metrik kaydı (sayaç, gösterge, gecikme dağılımı).
+
+Metrikler süreç belleğinde tutulur; `snapshot()` tüm kayıtlı metrikleri
+sözlük olarak döner ve yönetim panelindeki metrik endpoint'i tarafından sunulur.
+"""
+import threading
+from collections import deque
+
+_lock = threading.Lock()
+_registry = {}
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge:
+    """Değeri okunma anında bir fonksiyondan alınan gösterge (örn. kuyruk derinliği)."""
+
+    def __init__(self, func):
+        self._func = func
+
+    def snapshot(self):
+        return self._func()
+
+
+class Histogram:
+    """Son `window` ölçümü tutan gecikme dağılımı (milisaniye)."""
+
+    def __init__(self, window=1000):
+        self._values = deque(maxlen=window)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms):
+        with self._lock:
+            self._values.append(value_ms)
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            values = sorted(self._values)
+            count = self._count
+        if not values:
+            return {'count': count, 'avg_ms': None, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+
+        def percentile(p):
+            return round(values[min(len(values) - 1, int(len(values) * p))], 2)
+
+        return {
+            'count': count,
+            'avg_ms': round(sum(values) / len(values), 2),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(values[-1], 2),
+        }
+
+
+def _get_or_create(name, factory):
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = factory()
+        return metric
+
+
+def counter(name):
+    return _get_or_create(name, Counter)
+
+
+def histogram(name, window=1000):
+    return _get_or_create(name, lambda: Histogram(window))
+
+
+def gauge(name, func):
+    with _lock:
+        _registry[name] = Gauge(func)
+        return _registry[name]
+
+
+def snapshot():
+    with _lock:
+        items = list(_registry.items())
+    return {name: metric.snapshot() for name, metric in sorted(items)}
@@ -0,0 +1,27 @@
+"""
+API_ONLY modunda API isteklerinde oturum (session) işini atlayan middleware.
+
+API istemcileri token ile doğrulanır; çerezdeki oturum hiç kullanılmadığı hâlde
+SessionMiddleware/AuthenticationMiddleware yüzünden oturum satırı okunabilir ve
+yanıtta tekrar yazılabilir. Bu middleware API_PATH_PREFIX altındaki isteklere
+anahtarsız, boş bir oturum verir (yükleme sorgusu yoktur) ve yanıtta oturumu
+kaydetmez. Admin paneli gibi diğer yollar normal oturumla çalışmaya devam eder.
+"""
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+
+
+class APISessionMiddleware(SessionMiddleware):
+    def is_api_request(self, request):
+        return request.path_info.startswith(getattr(settings, 'API_PATH_PREFIX', '/api/'))
+
+    def process_request(self, request):
+        if self.is_api_request(request):
+            request.session = self.SessionStore()
+            return
+        super().process_request(request)
+
+    def process_response(self, request, response):
+        if self.is_api_request(request):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,187 @@
+"""
+Dış servis çağrıları (Expo, SMTP, SMS) için sağlayıcı başına koruma.
+
+Her sağlayıcının bir `OutboundGuard`'ı vardır:
+    - Token bucket hız sınırı: saniyede `rate` çağrı, `burst` kadar ani yük.
+      Jeton yoksa en fazla `max_wait` saniye beklenir, sonra çağrı reddedilir.
+    - Devre kesici (circuit breaker): art arda `failure_threshold` hatadan sonra
+      devre açılır ve çağrılar zaman aşımını beklemeden hemen reddedilir.
+      `reset_timeout` saniye sonra yarı açık duruma geçilir; tek bir deneme
+      çağrısına izin verilir, başarılıysa devre kapanır, değilse tekrar açılır.
+
+Reddedilen çağrılar `CallRejected` fırlatır. Durum ve red sayıları
+backend.metrics'e `outbound.<sağlayıcı>.*` adlarıyla yazılır.
+
+Sağlayıcı ayarları OUTBOUND_GUARDS ile (sağlayıcı adı -> parametreler) değiştirilebilir.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_GUARDS = {
+    # Expo: istek başına 100 mesaj, proje başına saniyede ~600 bildirim
+    'expo': {'rate': 6, 'burst': 6, 'max_wait': 2, 'failure_threshold': 5, 'reset_timeout': 30},
+    'smtp': {'rate': 10, 'burst': 20, 'max_wait': 2, 'failure_threshold': 5, 'reset_timeout': 60},
+    'sms': {'rate': 5, 'burst': 10, 'max_wait': 1, 'failure_threshold': 3, 'reset_timeout': 60},
+    # Kampanya SMS partileri (parti başına yüzlerce numara) ayrı kovadan harcar;
+    # toplu gönderim OTP SMS'lerinin hız sınırını tüketmez, arka planda beklemeyi göze alır
+    'sms_bulk': {'rate': 1, 'burst': 2, 'max_wait': 5, 'failure_threshold': 3, 'reset_timeout': 60},
+}
+
+
+class CallRejected(Exception):
+    def __init__(self, provider, reason):
+        super().__init__(f"{provider} çağrısı reddedildi: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait=0):
+        """Jeton alınabildiyse True; en fazla max_wait saniye bekler."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate if self.rate > 0 else max_wait
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Çağrıya izin verilip verilmediği. Yarı açıkta aynı anda tek deneme geçer."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Hata kaydeder; devre bu hatayla açıldıysa True döner."""
+        with self._lock:
+            self._failures += 1
+            was_probe = self._state == HALF_OPEN
+            self._probing = False
+            if was_probe or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+class OutboundGuard:
+    def __init__(self, name, rate, burst, max_wait=0, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.calls = metrics.counter(f'outbound.{name}.calls')
+        self.failures = metrics.counter(f'outbound.{name}.failures')
+        self.rejected_open = metrics.counter(f'outbound.{name}.rejected_circuit_open')
+        self.rejected_rate = metrics.counter(f'outbound.{name}.rejected_rate_limited')
+        self.trips = metrics.counter(f'outbound.{name}.circuit_opened')
+        metrics.gauge(f'outbound.{name}.state', lambda: self.breaker.state)
+
+    def acquire(self):
+        """Çağrıdan önce çağrılır; izin yoksa CallRejected fırlatır."""
+        if not self.breaker.allow():
+            self.rejected_open.inc()
+            raise CallRejected(self.name, 'devre açık')
+        if not self.bucket.acquire(self.max_wait):
+            # Yarı açık deneme hakkı kullanılmadı; sonraki çağrı deneyebilsin
+            self.breaker.release_probe()
+            self.rejected_rate.inc()
+            raise CallRejected(self.name, 'hız sınırı')
+        self.calls.inc()
+
+    def record_success(self):
+        self.breaker.record_success()
+
+    def record_failure(self):
+        self.failures.inc()
+        if self.breaker.record_failure():
+            self.trips.inc()
+
+    def call(self, func, *args, **kwargs):
+        """func'u koruma altında çalıştırır; fırlatılan her hata başarısızlık sayılır."""
+        self.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name):
+    guard = _guards.get(name)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.get(name)
+            if guard is None:
+                options = dict(DEFAULT_GUARDS.get(name, {'rate': 10, 'burst': 10}))
+                options.update(getattr(settings, 'OUTBOUND_GUARDS', {}).get(name, {}))
+                guard = _guards[name] = OutboundGuard(name, **options)
+    return guard
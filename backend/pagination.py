@@ -0,0 +1,128 @@
+"""
+(created_at, id) üzerinde keyset (cursor) sayfalama.
+
+OFFSET kullanılmadığı için derin sayfalar da ilk sayfa kadar ucuzdur: her sayfa,
+bir önceki sayfanın son satırından sonrasını composite index üzerinden okur.
+
+Eski mobil sürümler düz liste (array) bekler. PAGINATION_LEGACY_ARRAY açıkken
+`cursor` veya `page_size` göndermeyen istekler eskisi gibi düz liste alır.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    # (zaman alanı, benzersiz eşitlik bozucu alan)
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Geçersiz sayfa imleci (cursor).'
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, 'keyset_ordering', None) or self.ordering)
+
+    def is_legacy_request(self, request):
+        if not getattr(settings, 'PAGINATION_LEGACY_ARRAY', True):
+            return False
+        params = request.query_params
+        return self.cursor_query_param not in params and self.page_size_query_param not in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_legacy_request(request):
+            return None
+
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.ordering_fields = self.get_ordering(view)
+        cursor = request.query_params.get(self.cursor_query_param)
+        after = self._after(self.decode_cursor(cursor)) if cursor else None
+
+        if hasattr(view, 'get_keyset_queryset'):
+            # Birleşik (UNION) sorgular filtrelenemez; view imleç koşulunu her parçaya kendisi uygular
+            queryset = view.get_keyset_queryset(after).order_by(*self.ordering_fields)
+        else:
+            queryset = queryset.order_by(*self.ordering_fields)
+            if after is not None:
+                queryset = queryset.filter(after)
+
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+        return self.page
+
+    def _after(self, position):
+        (time_field, id_field) = self.ordering_fields
+        time_value, id_value = position
+        time_name, time_lookup = self._field_lookup(time_field)
+        id_name, id_lookup = self._field_lookup(id_field)
+        return Q(**{f'{time_name}__{time_lookup}': time_value}) | Q(
+            **{time_name: time_value, f'{id_name}__{id_lookup}': id_value}
+        )
+
+    @staticmethod
+    def _field_lookup(field):
+        if field.startswith('-'):
+            return field[1:], 'lt'
+        return field, 'gt'
+
+    def encode_cursor(self, obj):
+        time_name = self.ordering_fields[0].lstrip('-')
+        id_name = self.ordering_fields[1].lstrip('-')
+        if isinstance(obj, dict):
+            position = [obj[time_name].isoformat(), str(obj[id_name])]
+        else:
+            position = [getattr(obj, time_name).isoformat(), str(getattr(obj, id_name))]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            time_value, id_value = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            time_value = parse_datetime(time_value)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if time_value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return time_value, id_value
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size_value)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
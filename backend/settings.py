@@ -56,6 +56,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Sadece token ile çalışan API: /api/ isteklerinde oturum okunmaz/yazılmaz ve
+# DRF SessionAuthentication denenmez. Admin paneli oturumla çalışmaya devam eder.
+API_ONLY = config('API_ONLY', default=False, cast=bool)
+API_PATH_PREFIX = '/api/'
+if API_ONLY:
+    MIDDLEWARE[MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware')] = (
+        'backend.middleware.APISessionMiddleware'
+    )
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -107,10 +116,8 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
-
-    ],
+        'accounts.authentication.CachedTokenAuthentication',
+    ] + ([] if API_ONLY else ['rest_framework.authentication.SessionAuthentication']),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',        
     ],
@@ -120,13 +127,87 @@ REST_FRAMEWORK = {
  
 }
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Eski mobil sürümler liste endpoint'lerinden düz array bekler.
+# True iken sadece `cursor`/`page_size` gönderen istekler sayfalanır.
+PAGINATION_LEGACY_ARRAY = config('PAGINATION_LEGACY_ARRAY', default=True, cast=bool)
+
+# SMTP backend'i backend.outbound hız sınırı ve devre kesicisinden geçer
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='notifications.email.GuardedSMTPBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=EMAIL_HOST_USER)
+# Toplu gönderimde tek SMTP bağlantısı üzerinden send_messages ile gönderilen parça boyutu
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=100, cast=int)
+
+# Outbox (e-posta/push) tekrar deneme politikası
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_RETRY_BASE_SECONDS = config('OUTBOX_RETRY_BASE_SECONDS', default=30, cast=int)
+OUTBOX_RETRY_MAX_SECONDS = config('OUTBOX_RETRY_MAX_SECONDS', default=3600, cast=int)
+
+# Expo push istemcisi (notifications.push)
+EXPO_PUSH_BASE_URL = config('EXPO_PUSH_BASE_URL', default='https://exp.host/--/api/v2/push')
+EXPO_PUSH_MAX_WORKERS = config('EXPO_PUSH_MAX_WORKERS', default=4, cast=int)
+EXPO_PUSH_TIMEOUT = config('EXPO_PUSH_TIMEOUT', default=10, cast=int)
+EXPO_PUSH_GZIP_THRESHOLD = config('EXPO_PUSH_GZIP_THRESHOLD', default=1024, cast=int)
+# Dış servis korumaları (backend.outbound): sağlayıcı -> {'rate', 'burst', 'max_wait',
+# 'failure_threshold', 'reset_timeout'}; verilmeyen değerler DEFAULT_GUARDS'tan gelir
+OUTBOUND_GUARDS = {}
+# SMS API zaman aşımları (accounts.sms): bağlantı kısa tutulur ki bozuk rota hızlı atlansın
+SMS_CONNECT_TIMEOUT = config('SMS_CONNECT_TIMEOUT', default=5, cast=int)
+SMS_READ_TIMEOUT = config('SMS_READ_TIMEOUT', default=30, cast=int)
+# Toplu SMS'te tek istekteki `To` numara sayısı (accounts.utils.send_bulk_sms)
+SMS_BATCH_SIZE = config('SMS_BATCH_SIZE', default=500, cast=int)
+# Kuyruktaki OTP SMS'i bu süre içinde gönderilemezse vazgeçilir (accounts.utils.queue_sms)
+OTP_SMS_TTL_SECONDS = config('OTP_SMS_TTL_SECONDS', default=900, cast=int)
+# OTP kodları (accounts.otp): geçerlilik süresi ve kodu kilitleyen hatalı deneme sayısı
+OTP_TTL_SECONDS = config('OTP_TTL_SECONDS', default=24 * 3600, cast=int)
+OTP_MAX_ATTEMPTS = config('OTP_MAX_ATTEMPTS', default=5, cast=int)
+# OTP SMS gönderim sınırı: kayan pencerede telefon ve IP başına en fazla gönderim; 0 sınırı kapatır
+OTP_SEND_WINDOW_SECONDS = config('OTP_SEND_WINDOW_SECONDS', default=3600, cast=int)
+OTP_SEND_MAX_PER_PHONE = config('OTP_SEND_MAX_PER_PHONE', default=5, cast=int)
+OTP_SEND_MAX_PER_IP = config('OTP_SEND_MAX_PER_IP', default=20, cast=int)
+# İstemci IP'sinin okunacağı META anahtarı (doğrudan yayında REMOTE_ADDR, proxy arkasında
+# örn. HTTP_X_REAL_IP). Boşsa IP sınırı kapalıdır: proxy arkasında REMOTE_ADDR proxy'nin
+# adresidir ve tüm kullanıcılar tek IP sınırını paylaşırdı
+OTP_IP_HEADER = config('OTP_IP_HEADER', default='')
+# Art arda bu kadar DeviceNotRegistered/geçersiz token hatası alan token silinir
+PUSH_TOKEN_MAX_FAILURES = config('PUSH_TOKEN_MAX_FAILURES', default=2, cast=int)
+# Bildirim alıcı/token çözümleme önbelleği (notifications.recipients); 0 kapatır
+RECIPIENT_CACHE_SECONDS = config('RECIPIENT_CACHE_SECONDS', default=30, cast=int)
+# Aynı (olay, sipariş, alıcı, kanal) teslimatının tekrarını düşürme penceresi; 0 kapatır (notifications.dedup)
+NOTIFICATION_DEDUP_SECONDS = config('NOTIFICATION_DEDUP_SECONDS', default=300, cast=int)
+# Aynı siparişin ardışık durum bildirimlerini birleştirme penceresi; 0 kapatır (notifications.coalesce)
+NOTIFICATION_COALESCE_SECONDS = config('NOTIFICATION_COALESCE_SECONDS', default=10, cast=int)
+# Toplu bildirim kampanyaları (notifications.campaigns)
+CAMPAIGN_CHUNK_SIZE = config('CAMPAIGN_CHUNK_SIZE', default=500, cast=int)
+CAMPAIGN_STALE_SECONDS = config('CAMPAIGN_STALE_SECONDS', default=300, cast=int)
+# Okunmuş bildirimlerin saklama süresi (manage.py purge_notifications)
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+NOTIFICATION_PURGE_BATCH_SIZE = config('NOTIFICATION_PURGE_BATCH_SIZE', default=1000, cast=int)
+
+# Paylaşılan arka plan iş havuzu (backend.executor)
+BACKGROUND_MAX_WORKERS = config('BACKGROUND_MAX_WORKERS', default=4, cast=int)
+BACKGROUND_MAX_QUEUE = config('BACKGROUND_MAX_QUEUE', default=100, cast=int)
+BACKGROUND_REJECTION_POLICY = config('BACKGROUND_REJECTION_POLICY', default='caller_runs')
+BACKGROUND_SHUTDOWN_TIMEOUT = config('BACKGROUND_SHUTDOWN_TIMEOUT', default=30, cast=int)
+
+# Token -> kullanıcı önbelleği (accounts.authentication); süreç içidir, 0 saniye kapatır.
+# Geçersiz kılma paylaşılan CACHES üzerinden yayılır; LocMemCache ile yalnızca
+# tek süreçli kurulumlarda TOKEN_AUTH_CACHE_ALLOW_LOCAL açılmalıdır
+TOKEN_AUTH_CACHE_SIZE = config('TOKEN_AUTH_CACHE_SIZE', default=10000, cast=int)
+TOKEN_AUTH_CACHE_SECONDS = config('TOKEN_AUTH_CACHE_SECONDS', default=60, cast=int)
+TOKEN_AUTH_CACHE_ALLOW_LOCAL = config('TOKEN_AUTH_CACHE_ALLOW_LOCAL', default=False, cast=bool)
+
+# Panel kullanıcı araması (accounts.search): indeks arka ucu ve dönen en fazla sonuç.
+# FTS5 olmayan veritabanlarında 'accounts.search.QueryBackend' (icontains) kullanılır
+USER_SEARCH_BACKEND = config('USER_SEARCH_BACKEND', default='accounts.search.SQLiteFTSBackend')
+USER_SEARCH_LIMIT = config('USER_SEARCH_LIMIT', default=200, cast=int)
+
+# Sipariş numarası ayırıcı: her süreç sayaçtan bu kadarlık blok ayırır
+ORDER_ID_BLOCK_SIZE = config('ORDER_ID_BLOCK_SIZE', default=10, cast=int)
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
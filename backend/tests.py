@@ -0,0 +1,117 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from . import metrics
+from .executor import BoundedExecutor, TaskRejected
+from .outbound import CLOSED, HALF_OPEN, OPEN, CallRejected, OutboundGuard
+
+
+class BoundedExecutorTests(SimpleTestCase):
+    def _blocked_executor(self, name, policy):
+        """Tek worker'ı meşgul, kuyruğu dolu bir havuz döner."""
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        pool = BoundedExecutor(name, max_workers=1, max_queue=1, rejection_policy=policy)
+        self.addCleanup(pool.shutdown, wait=True, timeout=5)
+        self.addCleanup(release.set)
+        pool.submit(block)
+        started.wait(5)
+        pool.submit(lambda: None)
+        return pool, release
+
+    def test_runs_tasks_and_records_metrics(self):
+        pool = BoundedExecutor('test-run', max_workers=2, max_queue=10)
+        done = []
+        for i in range(5):
+            pool.submit(done.append, i)
+        pool.shutdown(wait=True, timeout=5)
+
+        self.assertEqual(sorted(done), [0, 1, 2, 3, 4])
+        stats = pool.metrics()
+        self.assertEqual(stats['completed'], 5)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['task_latency']['count'], 5)
+
+    def test_abort_policy_rejects_when_queue_is_full(self):
+        pool, _ = self._blocked_executor('test-abort', 'abort')
+        with self.assertRaises(TaskRejected):
+            pool.submit(lambda: None)
+        self.assertEqual(pool.metrics()['rejected'], 1)
+
+    def test_caller_runs_policy_runs_in_calling_thread(self):
+        pool, _ = self._blocked_executor('test-caller', 'caller_runs')
+        ran_in = []
+        pool.submit(lambda: ran_in.append(threading.current_thread()))
+        self.assertEqual(ran_in, [threading.current_thread()])
+
+    def test_shutdown_drains_queue(self):
+        release = threading.Event()
+        pool = BoundedExecutor('test-drain', max_workers=1, max_queue=5, rejection_policy='abort')
+        done = []
+        pool.submit(release.wait, 5)
+        for i in range(3):
+            pool.submit(done.append, i)
+        release.set()
+        pool.shutdown(wait=True, timeout=5)
+
+        self.assertEqual(done, [0, 1, 2])
+        with self.assertRaises(TaskRejected):
+            pool.submit(lambda: None)
+
+
+class OutboundGuardTests(SimpleTestCase):
+    def _failing_call(self, guard):
+        def fail():
+            raise ConnectionError('sağlayıcı kapalı')
+        with self.assertRaises(ConnectionError):
+            guard.call(fail)
+
+    def test_breaker_opens_after_consecutive_failures_and_probes_half_open(self):
+        guard = OutboundGuard('test-breaker', rate=1000, burst=1000, failure_threshold=3, reset_timeout=60)
+        for _ in range(3):
+            self._failing_call(guard)
+        self.assertEqual(guard.breaker.state, OPEN)
+
+        called = []
+        with self.assertRaises(CallRejected):
+            guard.call(called.append, 1)
+        self.assertEqual(called, [])
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['outbound.test-breaker.state'], OPEN)
+        self.assertEqual(snapshot['outbound.test-breaker.rejected_circuit_open'], 1)
+        self.assertEqual(snapshot['outbound.test-breaker.circuit_opened'], 1)
+
+        # Süre dolunca tek deneme geçer; başarısızsa devre tekrar açılır
+        guard.breaker._opened_at -= 60
+        self.assertEqual(guard.breaker.state, HALF_OPEN)
+        self._failing_call(guard)
+        self.assertEqual(guard.breaker.state, OPEN)
+
+        guard.breaker._opened_at -= 60
+        self.assertTrue(guard.breaker.allow())
+        self.assertFalse(guard.breaker.allow())
+        guard.record_success()
+        self.assertEqual(guard.breaker.state, CLOSED)
+        self.assertEqual(guard.call(lambda: 'ok'), 'ok')
+
+    def test_success_resets_consecutive_failures(self):
+        guard = OutboundGuard('test-reset', rate=1000, burst=1000, failure_threshold=2, reset_timeout=60)
+        self._failing_call(guard)
+        guard.call(lambda: None)
+        self._failing_call(guard)
+        self.assertEqual(guard.breaker.state, CLOSED)
+
+    def test_token_bucket_rejects_when_burst_is_spent(self):
+        guard = OutboundGuard('test-rate', rate=0.001, burst=2, max_wait=0)
+        guard.call(lambda: None)
+        guard.call(lambda: None)
+        with self.assertRaises(CallRejected) as ctx:
+            guard.call(lambda: None)
+        self.assertEqual(ctx.exception.reason, 'hız sınırı')
+        self.assertEqual(metrics.snapshot()['outbound.test-rate.rejected_rate_limited'], 1)
@@ -0,0 +1,126 @@
+"""
+E-posta gönderimi için throughput benchmark'ı.
+
+Yerel bir SMTP alıcısı (sink) başlatır ve N kişiye kişiselleştirilmiş e-postayı
+eski yöntemle (her mesaj için send_mail, yani her mesajda yeni SMTP bağlantısı)
+ve EmailDispatcher ile (tek bağlantı, send_messages) karşılaştırır. HTML her iki
+yolda da aynı şekilde üretilir; fark bağlantı kullanımından gelir.
+--connect-latency-ms gerçek bir sunucudaki TLS/AUTH el sıkışma maliyetini taklit eder.
+
+Kullanım:
+    python bench_email.py --emails 2000 --connect-latency-ms 30
+"""
+import argparse
+import os
+import socketserver
+import threading
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from notifications.email import EmailDispatcher, build_message, render_shell
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    connect_latency = 0.0
+    connections = 0
+    messages = 0
+    lock = threading.Lock()
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        with SMTPSinkHandler.lock:
+            SMTPSinkHandler.connections += 1
+        time.sleep(self.connect_latency)
+        self.reply('220 sink ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.wfile.write(b'250-sink\r\n250 8BITMIME\r\n')
+                self.wfile.flush()
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with SMTPSinkHandler.lock:
+                    SMTPSinkHandler.messages += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # HELO, MAIL FROM, RCPT TO, RSET, NOOP
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def send_legacy(recipients):
+    for name, address in recipients:
+        message = f"Merhaba {name},\nKampanya mesajı."
+        send_mail('Kampanya', message, settings.DEFAULT_FROM_EMAIL, [address],
+                  html_message=render_shell('Kampanya', message))
+
+
+def send_dispatcher(recipients, batch_size):
+    with EmailDispatcher(batch_size=batch_size) as dispatcher:
+        for name, address in recipients:
+            message = f"Merhaba {name},\nKampanya mesajı."
+            dispatcher.add(build_message('Kampanya', message, [address], html=render_shell('Kampanya', message)))
+
+
+def measure(label, func, count):
+    SMTPSinkHandler.connections = SMTPSinkHandler.messages = 0
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed:7.2f} sn  {count / elapsed:8.0f} mail/sn  "
+          f"{SMTPSinkHandler.connections:5d} bağlantı  {SMTPSinkHandler.messages:5d} mesaj")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--emails', type=int, default=2000)
+    parser.add_argument('--connect-latency-ms', type=float, default=30)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    SMTPSinkHandler.connect_latency = args.connect_latency_ms / 1000
+    server = SMTPSink(('127.0.0.1', 0), SMTPSinkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST = '127.0.0.1'
+    settings.EMAIL_PORT = server.server_address[1]
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ''
+    settings.DEFAULT_FROM_EMAIL = 'bench@example.com'
+
+    recipients = [(f'Kullanıcı {i}', f'user{i}@example.com') for i in range(args.emails)]
+    print(f"{args.emails} kişiselleştirilmiş e-posta, bağlantı gecikmesi {args.connect_latency_ms:.0f} ms\n")
+
+    measure('Eski (send_mail, mesaj başına bağlantı)', lambda: send_legacy(recipients), args.emails)
+    measure(f'EmailDispatcher (parça {args.batch_size})',
+            lambda: send_dispatcher(recipients, args.batch_size), args.emails)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
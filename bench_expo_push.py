@@ -0,0 +1,104 @@
+"""
+Expo push istemcisi için throughput benchmark'ı.
+
+Yerel bir Expo taklidi (stand-in) HTTP sunucusu başlatır ve N token'a gönderimi
+eski yöntemle (parçalar sırayla, oturumsuz requests.post) ve havuzlu/eşzamanlı
+ExpoPushClient ile karşılaştırır.
+
+Kullanım:
+    python bench_expo_push.py --tokens 10000 --latency-ms 80 --workers 8
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+
+django.setup()
+
+from notifications.push import ExpoPushClient, build_messages
+
+
+class FakeExpoHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    bytes_received = 0
+    lock = threading.Lock()
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with FakeExpoHandler.lock:
+            FakeExpoHandler.bytes_received += len(body)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        messages = json.loads(body)
+        time.sleep(self.latency)
+        payload = json.dumps({'data': [
+            {'status': 'ok', 'id': f'ticket-{i}'} for i, _ in enumerate(messages)
+        ]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy_send(url, messages):
+    headers = {
+        'Accept': 'application/json',
+        'Content-Type': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+    }
+    for i in range(0, len(messages), 100):
+        requests.post(url, headers=headers, data=json.dumps(messages[i:i + 100]))
+
+
+def measure(label, func, count):
+    FakeExpoHandler.bytes_received = 0
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed:7.2f} sn  {count / elapsed:9.0f} token/sn  "
+          f"{FakeExpoHandler.bytes_received / 1024:9.0f} KB gönderildi")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=80, help='Taklit sunucunun parça başına gecikmesi')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    FakeExpoHandler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeExpoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    tokens = [f'ExponentPushToken[{i:022d}]' for i in range(args.tokens)]
+    messages = build_messages(tokens, 'Premium Vale', 'Benchmark bildirimi', data={'type': 'bench'})
+    print(f"{args.tokens} token, {len(messages) // 100 + bool(len(messages) % 100)} parça, "
+          f"sunucu gecikmesi {args.latency_ms:.0f} ms\n")
+
+    measure('Eski (sıralı, oturumsuz)', lambda: legacy_send(f'{base_url}/send', messages), args.tokens)
+    client = ExpoPushClient(base_url=base_url, max_workers=1, timeout=30)
+    measure('Havuzlu, 1 worker + gzip', lambda: client.send(messages), args.tokens)
+    client = ExpoPushClient(base_url=base_url, max_workers=args.workers, timeout=30)
+    measure(f'Havuzlu, {args.workers} worker + gzip', lambda: client.send(messages), args.tokens)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Sipariş numarası ayırıcı için eşzamanlılık benchmark'ı.
+
+Geçici bir SQLite veritabanı üzerinde yüzlerce paralel sipariş oluşturur ve
+çakışan (aynı ORD-n) ya da IntegrityError ile düşen kayıt olup olmadığını
+raporlar. `--legacy` eski "son sipariş + 1" yöntemini aynı yük altında ölçer.
+
+Kullanım:
+    python bench_order_ids.py --orders 500 --workers 100
+    python bench_order_ids.py --orders 500 --workers 100 --legacy
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django
+from django.conf import settings
+
+db_dir = tempfile.mkdtemp(prefix='bench_order_ids_')
+django.setup()
+settings.DATABASES['default'].update({
+    'NAME': os.path.join(db_dir, 'bench.sqlite3'),
+    'OPTIONS': {'timeout': 60},
+})
+settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+from accounts.models import User
+from orders.models import Order
+from orders.sequences import order_id_allocator
+
+
+def legacy_save(order):
+    last_order = Order.objects.order_by('-created_at').first()
+    if last_order and last_order.id.startswith('ORD-'):
+        new_id_num = int(last_order.id.split('-')[1]) + 1
+    else:
+        new_id_num = 1000
+    order.id = f"ORD-{new_id_num}"
+    order.save(force_insert=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=100)
+    parser.add_argument('--block-size', type=int, default=None)
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    if args.block_size is not None:
+        settings.ORDER_ID_BLOCK_SIZE = args.block_size
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    user = User.objects.create_user(email='bench@example.com', password='bench')
+    order_id_allocator.reset()
+
+    created_ids = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(min(args.workers, args.orders))
+
+    def create(index):
+        if index < barrier.parties:
+            barrier.wait()
+        order = Order(
+            user=user,
+            pickup_address='Pickup',
+            dropoff_address='Dropoff',
+            pickup_time=timezone.now(),
+            price=Decimal('100.00'),
+            distance_km=1.0,
+            pickup_lat=41.0,
+            pickup_lng=29.0,
+            dropoff_lat=41.1,
+            dropoff_lng=29.1,
+        )
+        try:
+            if args.legacy:
+                legacy_save(order)
+            else:
+                order.save()
+            with lock:
+                created_ids.append(order.id)
+        except IntegrityError as e:
+            with lock:
+                errors.append(str(e))
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(create, range(args.orders)))
+    elapsed = time.perf_counter() - started
+
+    stored = Order.objects.count()
+    duplicates = len(created_ids) - len(set(created_ids))
+    mode = 'legacy (son sipariş + 1)' if args.legacy else f'sayaç (blok={settings.ORDER_ID_BLOCK_SIZE})'
+    print(f"Yöntem          : {mode}")
+    print(f"İstenen sipariş : {args.orders} ({args.workers} paralel iş parçacığı)")
+    print(f"Kaydedilen      : {stored}")
+    print(f"IntegrityError  : {len(errors)}")
+    print(f"Çakışan ID      : {duplicates}")
+    print(f"Süre            : {elapsed:.2f} sn ({args.orders / elapsed:.0f} sipariş/sn)")
+
+
+if __name__ == '__main__':
+    main()
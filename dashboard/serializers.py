@@ -3,7 +3,7 @@ from orders.models import Order, OrderStop, EmergencyAlert, VehicleHandoverPhoto
 from services.models import Service, Vehicle
 from orders.serializers import OrderSerializer, OrderStopSerializer, VehicleHandoverPhotoSerializer
 from accounts.models import User
-from accounts.serializers import UserSerializer
+from accounts.serializers import UserSerializer, save_user, validate_unique_phone
 
 
 class DashboardEmergencyAlertSerializer(serializers.ModelSerializer):
@@ -98,6 +98,9 @@ class DashboardUserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'date_joined', 'last_login']
 
+    def validate_phone_number(self, value):
+        return validate_unique_phone(value, self.instance) if value else value
+
     def create(self, validated_data):
         password = validated_data.pop('password', None)
         
@@ -109,7 +112,7 @@ class DashboardUserSerializer(serializers.ModelSerializer):
             clean_phone = phone_number.replace(" ", "").replace("+", "")
             validated_data['email'] = f"{clean_phone}@noemail.vipvale.com"
         
-        user = User.objects.create(**validated_data)
+        user = save_user(lambda: User.objects.create(**validated_data))
         if password:
             user.set_password(password)
             user.save()
@@ -124,7 +127,7 @@ class DashboardUserSerializer(serializers.ModelSerializer):
         if password:
             instance.set_password(password)
         
-        instance.save()
+        save_user(instance.save)
         return instance
 
     def to_representation(self, instance):
@@ -1,8 +1,13 @@
+from unittest import mock
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
+from backend import executor
 from orders.models import Order
+from accounts.models import ExpoPushToken
+from notifications.models import BroadcastMessage, Notification, OutboxMessage
 from services.models import Service
 from decimal import Decimal
 from django.utils import timezone
@@ -68,3 +73,110 @@ class DashboardAPITests(APITestCase):
         }
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('campaign_id', response.data)
+
+    def test_bulk_in_app_notification_is_one_broadcast(self):
+        response = self.client.post(reverse('bulk_notification_send'), {
+            'title': 'Duyuru', 'message': 'Merhaba şoförler', 'channels': ['in_app'], 'group': 'driver'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('campaign_id', response.data)
+        broadcast = BroadcastMessage.objects.get(pk=response.data['broadcast_id'])
+        self.assertEqual(broadcast.audience, 'driver')
+        self.assertFalse(Notification.objects.filter(title='Duyuru').exists())
+
+    def test_bulk_in_app_form_post_notifies_every_selected_user(self):
+        first = User.objects.create_user(email='first@example.com', password='password123', role='Kullanıcı')
+        second = User.objects.create_user(email='second@example.com', password='password123', role='Kullanıcı')
+        response = self.client.post(reverse('bulk_notification_send'), {
+            'title': 'Kişisel', 'message': 'Merhaba', 'channels': ['in_app'],
+            'user_ids': [str(first.pk), str(second.pk)]
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(Notification.objects.filter(title='Kişisel').values_list('user_id', flat=True)),
+            {first.pk, second.pk}
+        )
+
+    def test_bulk_notification_campaign_progress(self):
+        with mock.patch('dashboard.views.executor.submit') as submit:
+            response = self.client.post(reverse('bulk_notification_send'), {
+                'title': 'Kampanya', 'message': 'Merhaba', 'channels': ['email'], 'group': 'all'
+            })
+        campaign_id = response.data['campaign_id']
+        submit.assert_called_once()
+
+        url = reverse('bulk_notification_campaign', args=[campaign_id])
+        self.assertEqual(self.client.get(url).data['status'], 'pending')
+        run_campaign, args = submit.call_args[0][0], submit.call_args[0][1:]
+        run_campaign(*args)
+        response = self.client.get(url)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['processed'], 1)
+        self.assertEqual(response.data['progress'], 100.0)
+
+    @mock.patch('dashboard.views.send_html_email')
+    @mock.patch('dashboard.views.send_expo_push_notification')
+    @mock.patch('dashboard.views.executor.submit', side_effect=lambda fn, *args: fn(*args))
+    def test_assign_driver_notifies_driver_once_per_channel(self, _submit, mock_push, mock_email):
+        driver = User.objects.create_user(email='driver@example.com', password='password123', role='Şoför')
+        ExpoPushToken.objects.create(user=driver, token='ExponentPushToken[driver]')
+
+        url = reverse('dashboard_orders-assign-driver', args=[self.order.id])
+        response = self.client.post(url, {'driver_id': str(driver.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Sinyal uygulama içi bildirim + push'u gönderdi; panel yalnızca e-postayı ekler
+        self.assertEqual(Notification.objects.filter(user=driver).count(), 1)
+        self.assertEqual(OutboxMessage.objects.filter(channel='push').count(), 1)
+        mock_push.assert_not_called()
+        mock_email.assert_called_once()
+
+    @mock.patch('dashboard.views.executor.submit', side_effect=executor.TaskRejected('kuyruk dolu'))
+    def test_assign_driver_succeeds_when_background_pool_rejects(self, _submit):
+        driver = User.objects.create_user(email='busy-driver@example.com', password='password123', role='Şoför')
+        url = reverse('dashboard_orders-assign-driver', args=[self.order.id])
+        response = self.client.post(url, {'driver_id': str(driver.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.driver_id, driver.id)
+
+    def test_metrics_endpoint(self):
+        response = self.client.get(reverse('dashboard_metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('background.queue_depth', response.data)
+        self.assertIn('background.task_latency', response.data)
+
+    def test_user_search_uses_index_with_prefix_and_accent_folding(self):
+        sukru = User.objects.create_user(email='sukru@example.com', password='password123',
+                                         full_name='Şükrü Yılmaz', phone_number='05321234567')
+        ahmet = User.objects.create_user(email='ahmet@example.com', password='password123',
+                                         full_name='Ahmet Işık', phone_number='5559876543')
+        url = reverse('dashboard_users-list')
+
+        def search(query):
+            return [row['id'] for row in self.client.get(url, {'q': query}).data]
+
+        self.assertEqual(search('sukru'), [str(sukru.pk)])
+        self.assertEqual(search('YILM'), [str(sukru.pk)])
+        self.assertEqual(search('ışı'), [str(ahmet.pk)])
+        self.assertEqual(search('0532 123'), [str(sukru.pk)])
+        self.assertEqual(search('+90555'), [str(ahmet.pk)])
+        self.assertEqual(search('ahmet@exa'), [str(ahmet.pk)])
+        self.assertEqual(search('yok'), [])
+
+        ahmet.full_name = 'Mehmet Işık'
+        ahmet.save()
+        self.assertEqual(search('mehm'), [str(ahmet.pk)])
+        ahmet.delete()
+        self.assertEqual(search('isik'), [])
+
+    @override_settings(USER_SEARCH_LIMIT=1)
+    def test_user_search_limit_applies_after_active_and_role_filters(self):
+        User.objects.create_user(email='ayse.eski@example.com', password='password123',
+                                 full_name='Ayşe Eski', is_active=False)
+        User.objects.create_user(email='ayse.musteri@example.com', password='password123', full_name='Ayşe Müşteri')
+        driver = User.objects.create_user(email='ayse.sofor@example.com', password='password123',
+                                          full_name='Ayşe Şoför', role='Şoför')
+        response = self.client.get(reverse('dashboard_users-list'), {'q': 'ayse', 'role': 'Şoför'})
+        self.assertEqual([row['id'] for row in response.data], [str(driver.pk)])
@@ -3,7 +3,7 @@ from .views import (
     DashboardLoginView, DashboardStatsView, WaitingReservationsListView, 
     DashboardOrderViewSet, DashboardUserViewSet, DashboardEmergencyAlertViewSet,
     DashboardOrderPhotoViewSet, DashboardServiceViewSet, DashboardVehicleViewSet,
-    BulkNotificationView
+    BulkNotificationView, CampaignStatusView, DashboardMetricsView
 )
 from rest_framework.routers import DefaultRouter
 
@@ -20,5 +20,7 @@ urlpatterns = [
     path('stats/', DashboardStatsView.as_view(), name='dashboard_stats'),
     path('waiting-reservations/', WaitingReservationsListView.as_view(), name='waiting_reservations_list'),
     path('notifications/send/', BulkNotificationView.as_view(), name='bulk_notification_send'),
+    path('notifications/campaigns/<uuid:campaign_id>/', CampaignStatusView.as_view(), name='bulk_notification_campaign'),
+    path('metrics/', DashboardMetricsView.as_view(), name='dashboard_metrics'),
     path('', include(router.urls)),
 ]
@@ -1,16 +1,29 @@
+import logging
+
 from rest_framework import status, views, permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from accounts.models import User
+from accounts.search import search_users
 from accounts.serializers import UserSerializer
 from orders.models import Order
-from django.db.models import Q
+from django.db.models import Case, IntegerField, Q, When
+from django.shortcuts import get_object_or_404
 from django.core.mail import send_mail
 from django.conf import settings
-from notifications.models import Notification
+from backend import executor, metrics
+from backend.pagination import KeysetPagination
+from notifications.fanout import fan_out, managers
+from notifications.campaigns import create_campaign, run_campaign
+from notifications.dedup import first_delivery
+from notifications.models import Campaign
+from notifications.inbox import broadcast
+from notifications.recipients import resolve_recipient, resolve_recipients
+from notifications.email import send_bulk_html_email
 from notifications.utils import send_expo_push_notification, send_html_email
-import threading
+
+logger = logging.getLogger(__name__)
 
 class DashboardLoginView(views.APIView):
     """
@@ -100,11 +113,15 @@ class WaitingReservationsListView(views.APIView):
         if request.user.role != 'Yönetici':
             return Response({"detail": "Bu işlem için yetkiniz bulunmamaktadır."}, status=status.HTTP_403_FORBIDDEN)
         
-        orders = Order.objects.filter(
+        orders = Order.objects.for_serializer().filter(
             driver__isnull=True
         ).exclude(status__in=['completed', 'cancelled']).order_by('-created_at')
         
         from orders.serializers import OrderSerializer
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        if page is not None:
+            return paginator.get_paginated_response(OrderSerializer(page, many=True).data)
         serializer = OrderSerializer(orders, many=True)
         return Response(serializer.data)
 
@@ -130,22 +147,26 @@ class DashboardOrderViewSet(viewsets.ModelViewSet):
     """
     serializer_class = DashboardOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         if self.request.user.role != 'Yönetici':
             return Order.objects.none()
-        return Order.objects.all().order_by('-created_at')
+        return Order.objects.for_serializer().order_by('-created_at')
 
     def perform_create(self, serializer):
         order = serializer.save()
-        # Send notifications to admins in background thread
-        threading.Thread(target=self._notify_admins, args=(order,)).start()
+        # Yöneticilere e-posta/push bildirimleri ortak arka plan havuzunda gönderilir.
+        # Sipariş zaten kaydedildi; havuz doluysa/kapalıysa istek hata vermez (uygulama
+        # içi + push bildirimleri order_post_save sinyalinden gider)
+        try:
+            executor.submit(self._notify_admins, order)
+        except executor.TaskRejected as e:
+            logger.warning(f"Yönetici bildirimi atlandı: {e}")
     
     def _notify_admins(self, order):
         """Send email and push notifications to all admin users."""
         try:
-            admins = User.objects.filter(role='Yönetici', is_active=True)
-            
             # Prepare notification content
             customer_name = order.user.full_name or order.user.email or order.user.phone_number if order.user else 'Bilinmiyor'
             service_name = order.service.name if order.service else 'Bilinmiyor'
@@ -160,8 +181,8 @@ Yeni bir rezervasyon oluşturuldu.
 🆔 Rezervasyon No: #{order.id}
 👤 Müşteri: {customer_name}
 🚗 Hizmet: {service_name}
-📍 Başlangıç: {order.pickup or 'Belirtilmemiş'}
-🏁 Varış: {order.dropoff or 'Belirtilmemiş'}
+📍 Başlangıç: {order.pickup_address or 'Belirtilmemiş'}
+🏁 Varış: {order.dropoff_address or 'Belirtilmemiş'}
 📅 Tarih/Saat: {pickup_time}
 💰 Tutar: ₺{order.price or 0}
 📏 Mesafe: {order.distance_km or 0} km
@@ -170,43 +191,28 @@ Yeni bir rezervasyon oluşturuldu.
 Premium Vale Yönetim Paneli
             """
             
-            # Send email to admins with valid email addresses
-            admin_emails = [admin.email for admin in admins if admin.email]
-            if admin_emails:
-                send_html_email(
-                    subject=subject,
-                    message=message.strip(),
-                    recipient_list=admin_emails
-                )
-                print(f"Admin email notification sent to: {admin_emails}")
-            
-            # Send push notifications to admins with push tokens
-            push_tokens = [admin.expo_push_token for admin in admins if admin.expo_push_token]
-            if push_tokens:
-                try:
-                    send_expo_push_notification(
-                        tokens=push_tokens,
-                        title='🚗 Yeni Rezervasyon',
-                        message=f'{customer_name} - {service_name} - ₺{order.price or 0}',
-                        data={'type': 'new_order', 'order_id': order.id},
-                        sound='notification.wav',
-                        channel_id='premium_alert'
-                    )
-                    print(f"Admin push notification sent to {len(push_tokens)} admins")
-                except Exception as e:
-                    print(f"Push notification error: {e}")
-            
-            # Create in-app notifications for admins
+            # In-app notifications + push for all admins (constant number of queries)
             detail_message = f"{customer_name} tarafından {pickup_time} için {service_name} rezervasyonu oluşturuldu."
-            for admin in admins:
-                try:
-                    Notification.objects.create(
-                        user=admin,
-                        title=f"New Reservation - #{order.id}",
-                        message=detail_message
-                    )
-                except Exception as e:
-                    print(f"Admin in-app notify error for user {admin.id}: {e}")
+            recipients = fan_out(
+                managers(),
+                title=f"New Reservation - #{order.id}",
+                message=detail_message,
+                push=True,
+                push_title='🚗 Yeni Rezervasyon',
+                push_message=f'{customer_name} - {service_name} - ₺{order.price or 0}',
+                data={'type': 'new_order', 'order_id': order.id},
+                sound='notification.wav',
+                channel_id='premium_alert',
+                # order_post_save de aynı olayı yöneticilere bildirir; tekrar eden kanallar düşer
+                event=('new_order', order.id),
+                email=True
+            )
+            print(f"Admin push notification queued for {len(recipients.tokens)} tokens")
+
+            # Send email to admins with valid email addresses
+            if recipients.emails:
+                send_bulk_html_email(subject, message.strip(), recipients.emails)
+                print(f"Admin email notification sent to: {recipients.emails}")
         except Exception as e:
             print(f"Admin notification error: {e}")
 
@@ -240,8 +246,12 @@ Premium Vale Yönetim Paneli
         
         order.save()
         
-        # Notify driver in background
-        threading.Thread(target=self._notify_driver, args=(order, driver)).start()
+        # Şoföre arka planda bildirim gönderilir (havuz doluysa atama yine başarılıdır;
+        # sinyal şoförü bildirir)
+        try:
+            executor.submit(self._notify_driver, order, driver)
+        except executor.TaskRejected as e:
+            logger.warning(f"Şoför bildirimi atlandı: {e}")
         
         return Response({
             "detail": "Atama başarıyla tamamlandı.", 
@@ -257,12 +267,14 @@ Premium Vale Yönetim Paneli
             pickup_time = order.pickup_time.strftime('%d.%m.%Y %H:%M') if order.pickup_time else 'Belirtilmemiş'
             
             # Send push notification
-            if driver.expo_push_token:
+            # order.save() sinyali de şoförü bildirir; kanal başına yalnızca ilk teslimat gider
+            recipient = resolve_recipient(driver.id)
+            if recipient and recipient.tokens and first_delivery('driver_assigned', order.id, driver.id, 'push'):
                 try:
                     send_expo_push_notification(
-                        tokens=[driver.expo_push_token],
+                        tokens=recipient.tokens,
                         title='🚗 Yeni İş Atandı!',
-                        message=f'{customer_name} - {order.pickup or "Konum"} → {order.dropoff or "Konum"} - ₺{order.price or 0}',
+                        message=f'{customer_name} - {order.pickup_address or "Konum"} → {order.dropoff_address or "Konum"} - ₺{order.price or 0}',
                         data={'type': 'job_assigned', 'order_id': order.id}
                     )
                     print(f"Driver push notification sent to: {driver.email}")
@@ -270,7 +282,7 @@ Premium Vale Yönetim Paneli
                     print(f"Driver push notification error: {e}")
             
             # Send email
-            if driver.email:
+            if driver.email and first_delivery('driver_assigned', order.id, driver.id, 'email'):
                 try:
                     subject = f'🚗 Yeni İş Atandı - #{order.id}'
                     message = f"""
@@ -282,8 +294,8 @@ Size yeni bir iş atandı!
 ━━━━━━━━━━━━━━━━━━━━━━━━
 🆔 Rezervasyon No: #{order.id}
 👤 Müşteri: {customer_name}
-📍 Başlangıç: {order.pickup or 'Belirtilmemiş'}
-🏁 Varış: {order.dropoff or 'Belirtilmemiş'}
+📍 Başlangıç: {order.pickup_address or 'Belirtilmemiş'}
+🏁 Varış: {order.dropoff_address or 'Belirtilmemiş'}
 📅 Tarih/Saat: {pickup_time}
 💰 Tutar: ₺{order.price or 0}
 📏 Mesafe: {order.distance_km or 0} km
@@ -335,22 +347,22 @@ class DashboardUserViewSet(viewsets.ModelViewSet):
 
         queryset = queryset.order_by('-date_joined')
         
-        # Arama parametresi
-        query = self.request.query_params.get('q', '')
-        if query:
-            queryset = queryset.filter(
-                Q(email__icontains=query) |
-                Q(phone_number__icontains=query) |
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query) |
-                Q(full_name__icontains=query)
-            )
-        
         # Rol filtresi
         role = self.request.query_params.get('role', '')
         if role:
             queryset = queryset.filter(role=role)
         
+        # Arama parametresi: arama indeksinden alaka sırasıyla id'ler gelir. Aktiflik ve
+        # rol filtreleri aramaya verilir; USER_SEARCH_LIMIT filtrelenmiş sonuçlara uygulanır
+        query = self.request.query_params.get('q', '')
+        if query:
+            ids = search_users(query, queryset=queryset)
+            if not ids:
+                return queryset.none()
+            queryset = queryset.filter(pk__in=ids).order_by(
+                Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)], output_field=IntegerField())
+            )
+        
         return queryset
 
     def perform_destroy(self, instance):
@@ -430,7 +442,9 @@ class DashboardOrderPhotoViewSet(viewsets.ReadOnlyModelViewSet):
             return Order.objects.none()
         
         # Sadece fotoğrafı olan siparişleri getir
-        return Order.objects.filter(handover_photos__isnull=False).distinct().order_by('-created_at')
+        return Order.objects.filter(handover_photos__isnull=False).distinct().select_related(
+            'user', 'driver', 'service'
+        ).prefetch_related('handover_photos').order_by('-created_at')
 
 
 class DashboardServiceViewSet(viewsets.ModelViewSet):
@@ -469,50 +483,6 @@ class DashboardVehicleViewSet(viewsets.ModelViewSet):
             
         return queryset
 
-def send_bulk_notifications_background(user_ids, group, title, message, channels):
-    """
-    Bildirimleri arka planda gönderen yardımcı fonksiyon.
-    HTML Email Template içerir.
-    """
-    users = User.objects.filter(is_active=True)
-    if user_ids:
-        users = users.filter(id__in=user_ids)
-    elif group == 'driver':
-        users = users.filter(role='Şoför')
-    elif group == 'customer':
-        users = users.filter(role='Müşteri')
-    
-    emails = []
-    push_tokens = []
-    
-    for user in users:
-        if 'email' in channels and user.email:
-            emails.append(user.email)
-        
-        if 'push' in channels:
-            # User ile ilişkili tüm ExpoPushToken'ları al
-            tokens = user.expo_push_tokens.values_list('token', flat=True)
-            push_tokens.extend(tokens)
-
-    # Toplu E-posta (HTML Template)
-    if 'email' in channels and emails:
-        send_html_email(
-            subject=title,
-            message=message,
-            recipient_list=emails
-        )
-
-    # Toplu Push Bildirimi
-    if 'push' in channels and push_tokens:
-        try:
-            send_expo_push_notification(
-                tokens=push_tokens,
-                title=title,
-                message=message
-            )
-        except Exception as e:
-            print(f"Bulk push error: {e}")
-
 class BulkNotificationView(views.APIView):
     """
     Yöneticilerin kullanıcılara toplu bildirim göndermesini sağlar.
@@ -525,8 +495,13 @@ class BulkNotificationView(views.APIView):
 
         title = request.data.get('title')
         message = request.data.get('message')
-        channels = request.data.get('channels', [])
-        user_ids = request.data.get('user_ids') # Liste veya null
+        if hasattr(request.data, 'getlist'):
+            # Form verisinde çoklu değerler liste olarak okunmalı
+            channels = request.data.getlist('channels')
+            user_ids = request.data.getlist('user_ids')
+        else:
+            channels = request.data.get('channels', [])
+            user_ids = request.data.get('user_ids') # Liste veya null
         group = request.data.get('group', 'all') # all, driver, customer
 
         if not title or not message:
@@ -535,11 +510,69 @@ class BulkNotificationView(views.APIView):
         if not channels:
             return Response({"detail": "En az bir gönderim kanalı seçilmelidir."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Arka planda işlemi başlat
-        import threading
-        threading.Thread(
-            target=send_bulk_notifications_background, 
-            args=(user_ids, group, title, message, channels)
-        ).start()
+        response = {"detail": "Bildirim gönderim işlemi arka planda başlatıldı."}
+
+        # Uygulama içi bildirim: gruba tek satırlık duyuru, seçili kullanıcılara kişisel bildirim
+        if 'in_app' in channels:
+            if user_ids:
+                fan_out(resolve_recipients(user_ids=user_ids), title=title, message=message)
+            else:
+                audience = group if group in ('driver', 'customer') else 'all'
+                response["broadcast_id"] = broadcast(title, message, audience=audience, created_by=request.user).pk
+            channels = [channel for channel in channels if channel != 'in_app']
+
+        if channels:
+            campaign = create_campaign(request.user, title, message, channels, group=group, user_ids=user_ids)
+
+            # Arka planda işlemi başlat. Havuz doluysa kampanya 'pending' kalır ve
+            # run_campaigns worker'ı tarafından gönderilir.
+            try:
+                executor.submit(run_campaign, campaign.pk)
+            except executor.TaskRejected:
+                pass
+            response["campaign_id"] = campaign.pk
+            response["total_recipients"] = campaign.total_recipients
+
+        return Response(response)
+
+
+class CampaignStatusView(views.APIView):
+    """
+    Toplu bildirim kampanyasının ilerlemesini ve hızını döner.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, campaign_id):
+        if request.user.role != 'Yönetici':
+            return Response({"detail": "Bu işlem için yetkiniz bulunmamaktadır."}, status=status.HTTP_403_FORBIDDEN)
+
+        campaign = get_object_or_404(Campaign, pk=campaign_id)
+        return Response({
+            "campaign_id": campaign.pk,
+            "title": campaign.title,
+            "status": campaign.status,
+            "total_recipients": campaign.total_recipients,
+            "processed": campaign.processed_count,
+            "progress": campaign.progress,
+            "emails_sent": campaign.emails_sent,
+            "pushes_sent": campaign.pushes_sent,
+            "sms_sent": campaign.sms_sent,
+            "throughput": campaign.throughput,
+            "started_at": campaign.started_at,
+            "finished_at": campaign.finished_at,
+            "last_error": campaign.last_error,
+        })
+
+
+class DashboardMetricsView(views.APIView):
+    """
+    Süreç içi metrikleri (arka plan kuyruğu derinliği, iş gecikmeleri vb.) döner.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != 'Yönetici':
+            return Response({"detail": "Bu işlem için yetkiniz bulunmamaktadır."}, status=status.HTTP_403_FORBIDDEN)
 
-        return Response({"detail": "Bildirim gönderim işlemi arka planda başlatıldı."})
+        executor.get_executor()
+        return Response(metrics.snapshot())
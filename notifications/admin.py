@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification
+from .models import BroadcastMessage, BroadcastReceipt, Campaign, Notification, OutboxMessage, PushDispatch, PushTicket
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -8,3 +8,48 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'user__full_name', 'title', 'message')
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
+
+@admin.register(BroadcastMessage)
+class BroadcastMessageAdmin(admin.ModelAdmin):
+    list_display = ('title', 'message', 'audience', 'created_by', 'created_at')
+    list_filter = ('audience', 'created_at')
+    search_fields = ('title', 'message')
+    readonly_fields = ('created_at',)
+    ordering = ('-created_at',)
+
+@admin.register(BroadcastReceipt)
+class BroadcastReceiptAdmin(admin.ModelAdmin):
+    list_display = ('broadcast', 'user', 'read_at')
+    search_fields = ('user__email', 'broadcast__title')
+    ordering = ('-read_at',)
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'channel', 'status', 'attempts', 'available_at', 'created_at', 'sent_at')
+    list_filter = ('channel', 'status', 'created_at')
+    search_fields = ('last_error', 'coalesce_key')
+    readonly_fields = ('created_at', 'sent_at')
+    ordering = ('-created_at',)
+
+@admin.register(PushDispatch)
+class PushDispatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'token_count', 'ok_count', 'dead_count', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('title',)
+    readonly_fields = ('created_at',)
+    ordering = ('-created_at',)
+
+@admin.register(PushTicket)
+class PushTicketAdmin(admin.ModelAdmin):
+    list_display = ('ticket_id', 'token', 'status', 'receipt_status', 'receipt_error', 'created_at', 'checked_at')
+    list_filter = ('status', 'receipt_status', 'created_at')
+    search_fields = ('token', 'ticket_id')
+    ordering = ('-created_at',)
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ('title', 'status', 'group', 'processed_count', 'total_recipients', 'emails_sent', 'pushes_sent', 'sms_sent', 'created_at', 'finished_at')
+    list_filter = ('status', 'group', 'created_at')
+    search_fields = ('title', 'message')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'updated_at', 'last_user_id')
+    ordering = ('-created_at',)
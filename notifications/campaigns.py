@@ -0,0 +1,170 @@
+"""
+Toplu bildirim kampanyaları.
+
+Alıcılar tek seferde belleğe alınmaz; id sırasıyla `CAMPAIGN_CHUNK_SIZE` kişilik
+parçalar halinde okunur (QuerySet.iterator) ve her parça e-posta / push / SMS
+kanallarından gönderilir. SMS'te parçadaki numaralar çok alıcılı `To` partileriyle
+(SMS_BATCH_SIZE) gider; parti başına tek istek atılır. Her parçadan sonra ilerleme (`last_user_id`, sayaçlar)
+kaydedilir. Bir kanal gönderemezse (SMTP hatası, Expo isteği başarısız, SMS partisi
+reddedildi) parça başarısız sayılır: checkpoint ilerlemez ve kampanya 'failed' olur.
+
+Kampanyayı devralan worker yeni bir `lease_token` yazar ve parça içinde her
+kanaldan önce `updated_at`'i yeniler. Süreç çökerse kampanya 'running' durumunda
+kalır; `updated_at` CAMPAIGN_STALE_SECONDS'tan eskiyse `run_campaigns` komutu onu
+devralıp son kaydedilen kullanıcıdan sonrasından devam eder. Checkpoint ve durum
+güncellemeleri belirtece bağlıdır; kampanyası devralınmış eski worker hiçbir şey
+yazmadan durur. Çökme anında gönderilmekte olan parça tekrar gönderilebilir (en az bir kez teslim).
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.utils import send_bulk_sms
+from backend import metrics
+from .models import Campaign
+from .recipients import iter_recipients, recipient_users, tokens_of
+from .email import send_bulk_html_email
+from .utils import send_expo_push_notification
+
+logger = logging.getLogger(__name__)
+
+chunk_latency = metrics.histogram('campaign.chunk_latency')
+recipients_processed = metrics.counter('campaign.recipients')
+
+
+def create_campaign(created_by, title, message, channels, group='all', user_ids=None):
+    user_ids = user_ids or None
+    return Campaign.objects.create(
+        created_by=created_by,
+        title=title,
+        message=message,
+        channels=list(channels),
+        group=group or 'all',
+        user_ids=[str(user_id) for user_id in user_ids] if user_ids else None,
+        total_recipients=_audience(group, user_ids).count(),
+    )
+
+
+def _audience(group, user_ids):
+    if user_ids:
+        return recipient_users(user_ids=user_ids)
+    return recipient_users(group=group)
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'CAMPAIGN_STALE_SECONDS', 300))
+
+
+def resumable_campaigns():
+    """Bekleyen ya da sahibi ölmüş (heartbeat'i eskimiş) kampanyalar."""
+    return Campaign.objects.filter(
+        Q(status='pending') | Q(status='running', updated_at__lt=_stale_before())
+    ).order_by('created_at')
+
+
+class LeaseLost(Exception):
+    """Kampanya bu worker çalışırken başka bir worker tarafından devralındı."""
+
+
+def _claim(campaign_id, include_failed=False):
+    """Kampanyayı devralır; sahiplik belirtecini, devralınamadıysa None döner."""
+    statuses = Q(status='pending') | Q(status='running', updated_at__lt=_stale_before())
+    if include_failed:
+        statuses |= Q(status='failed')
+    token = uuid.uuid4()
+    claimed = Campaign.objects.filter(statuses, pk=campaign_id).update(
+        status='running', lease_token=token, updated_at=timezone.now()
+    )
+    return token if claimed == 1 else None
+
+
+def _owned(campaign):
+    return Campaign.objects.filter(pk=campaign.pk, status='running', lease_token=campaign.lease_token)
+
+
+def _renew(campaign):
+    """Heartbeat: kampanya hâlâ bu worker'daysa `updated_at`'i yeniler, değilse LeaseLost."""
+    if not _owned(campaign).update(updated_at=timezone.now()):
+        raise LeaseLost(f"Kampanya {campaign.pk} başka bir worker tarafından devralındı")
+
+
+def _send_chunk(campaign, chunk):
+    """
+    Bir alıcı parçasını gönderir; (e-posta, push, SMS) gönderim sayılarını döner.
+    Kanal hataları çağırana yansır; checkpoint ilerlemesin diye yutulmaz.
+    """
+    emails_sent = pushes_sent = sms_sent = 0
+    if 'email' in campaign.channels:
+        emails = [recipient.email for recipient in chunk if recipient.email]
+        if emails:
+            _renew(campaign)
+            emails_sent = send_bulk_html_email(campaign.title, campaign.message, emails, fail_silently=False)
+    if 'push' in campaign.channels:
+        tokens = tokens_of(chunk)
+        if tokens:
+            _renew(campaign)
+            tickets = send_expo_push_notification(tokens=tokens, title=campaign.title, message=campaign.message,
+                                                  fail_silently=False)
+            pushes_sent = sum(1 for ticket in tickets if ticket.status == 'ok')
+    if 'sms' in campaign.channels:
+        phones = [recipient.phone_number for recipient in chunk if recipient.phone_number]
+        if phones:
+            _renew(campaign)
+            sms_sent = send_bulk_sms(phones, f"{campaign.title}: {campaign.message}", fail_silently=False)
+    return emails_sent, pushes_sent, sms_sent
+
+
+def run_campaign(campaign_id, chunk_size=None, include_failed=False):
+    """
+    Kampanyayı devralıp kaldığı yerden sonuna kadar gönderir.
+    Başka bir worker çalıştırıyorsa None, aksi halde güncel Campaign döner.
+    """
+    token = _claim(campaign_id, include_failed=include_failed)
+    if token is None:
+        return None
+    chunk_size = chunk_size or getattr(settings, 'CAMPAIGN_CHUNK_SIZE', 500)
+    campaign = Campaign.objects.get(pk=campaign_id)
+    campaign.lease_token = token
+    if not campaign.started_at:
+        campaign.started_at = timezone.now()
+        _owned(campaign).update(started_at=campaign.started_at)
+
+    try:
+        user_ids = campaign.user_ids or None
+        chunks = iter_recipients(
+            group=None if user_ids else campaign.group,
+            user_ids=user_ids,
+            after=campaign.last_user_id,
+            chunk_size=chunk_size,
+        )
+        for chunk in chunks:
+            started = time.monotonic()
+            emails_sent, pushes_sent, sms_sent = _send_chunk(campaign, chunk)
+            # Checkpoint: bu noktaya kadar gönderilenler tekrar gönderilmez
+            checkpointed = _owned(campaign).update(
+                last_user_id=chunk[-1].user_id,
+                processed_count=F('processed_count') + len(chunk),
+                emails_sent=F('emails_sent') + emails_sent,
+                pushes_sent=F('pushes_sent') + pushes_sent,
+                sms_sent=F('sms_sent') + sms_sent,
+                updated_at=timezone.now(),
+            )
+            if not checkpointed:
+                raise LeaseLost(f"Kampanya {campaign.pk} başka bir worker tarafından devralındı")
+            recipients_processed.inc(len(chunk))
+            chunk_latency.observe((time.monotonic() - started) * 1000)
+    except LeaseLost as e:
+        logger.warning(str(e))
+    except Exception as e:
+        logger.exception(f"Kampanya {campaign.pk} yarıda kaldı")
+        _owned(campaign).update(status='failed', last_error=str(e)[:2000])
+    else:
+        _owned(campaign).update(status='completed', finished_at=timezone.now())
+
+    campaign.refresh_from_db()
+    return campaign
@@ -0,0 +1,66 @@
+"""
+Sipariş durum bildirimleri için birleştirme (coalescing) penceresi.
+
+Şoför birkaç saniye içinde accept → on_way → in_progress adımlarını geçtiğinde
+her adım ayrı push, uygulama içi satır ve e-posta üretmesin diye aynı
+(sipariş, alıcı) anahtarıyla NOTIFICATION_COALESCE_SECONDS içinde gelen durum
+olayları tek teslimatta birleşir ve teslimat en son durumu taşır:
+
+- Push/e-posta outbox'a pencere sonu kadar gecikmeli yazılır; pencere içinde
+  gelen yeni olay bekleyen mesajın payload'ını değiştirir (bkz. outbox.enqueue_*).
+- Uygulama içi bildirimde pencere içinde yazılmış okunmamış satır güncellenir.
+
+Acil durum bildirimleri anahtar vermediği için birleştirilmez ve hemen gider.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend import metrics
+
+from .models import Notification
+
+KEY_PREFIX = 'notify-coalesce'
+
+_merged = metrics.counter('notifications.coalesced')
+
+
+def window_seconds():
+    return getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', 10)
+
+
+def order_status_key(order_id, user_id):
+    return f'order-status:{order_id}:{user_id}'
+
+
+def record_merge(count=1):
+    _merged.inc(count)
+
+
+def upsert_notifications(user_ids, coalesce_key, title, message):
+    """
+    Her alıcı için pencere içinde aynı anahtarla yazılmış okunmamış satırı en son
+    başlık/mesajla günceller; olmayanlar için yeni satır açar.
+    """
+    window = window_seconds()
+    if not window:
+        Notification.objects.bulk_create(
+            [Notification(user_id=user_id, title=title, message=message) for user_id in user_ids]
+        )
+        return
+
+    cache_keys = {user_id: f'{KEY_PREFIX}:{coalesce_key}:{user_id}' for user_id in user_ids}
+    existing = cache.get_many(cache_keys.values())
+    created = []
+    for user_id, cache_key in cache_keys.items():
+        pk = existing.get(cache_key)
+        if pk and Notification.objects.filter(pk=pk, is_read=False).update(
+            title=title, message=message, created_at=timezone.now()
+        ):
+            record_merge()
+            continue
+        created.append(Notification(user_id=user_id, title=title, message=message))
+
+    if created:
+        Notification.objects.bulk_create(created)
+        cache.set_many({cache_keys[row.user_id]: row.pk for row in created}, window)
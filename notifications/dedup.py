@@ -0,0 +1,74 @@
+"""
+Bildirim tekilleştirme: aynı olay aynı kullanıcıya aynı kanaldan pencere içinde bir kez gider.
+
+Aynı olay birden fazla koddan tetiklenebilir (örn. panelden şoför atamada hem
+`order_post_save` sinyali hem `_notify_driver` çalışır). Her teslimat önce
+(olay, sipariş, alıcı, kanal) anahtarını bir `DeliveryClaim` satırı olarak
+sahiplenir; anahtar NOTIFICATION_DEDUP_SECONDS boyunca durduğundan tekrar eden
+teslimat sessizce düşer.
+
+Anahtar, bildirimi ve outbox satırlarını yazan transaction içinde eklenir:
+sipariş kaydı geri alınırsa anahtar da geri alınır ve olayın sonraki geçerli
+teslimatı düşmez. Benzersiz index eşzamanlı iki sahiplenmeden yalnızca birini
+kabul eder. Süresi dolan anahtarlar sonraki sahiplenmede silinir.
+
+Kanal anahtarın parçasıdır: iki kod yolu farklı kanallar kullanıyorsa (sinyal
+uygulama içi + push, panel push + e-posta) her kanal yine tam bir kez iletilir.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from backend import metrics
+
+from .models import DeliveryClaim
+
+KEY_PREFIX = 'notify-dedup'
+
+_dropped = metrics.counter('notifications.deduplicated')
+
+
+def window_seconds():
+    return getattr(settings, 'NOTIFICATION_DEDUP_SECONDS', 300)
+
+
+def _key(event_type, order_id, recipient_id, channel):
+    return f'{KEY_PREFIX}:{event_type}:{order_id}:{recipient_id}:{channel}'
+
+
+def claim(event_type, order_id, recipient_ids, channel):
+    """
+    Bu kanaldan bildirimi ilk kez alacak alıcıları (sırayı koruyarak) döner.
+    Pencere 0 ise tekilleştirme kapalıdır ve tüm alıcılar döner.
+    """
+    recipient_ids = list(recipient_ids)
+    window = window_seconds()
+    if not window or not recipient_ids:
+        return recipient_ids
+    now = timezone.now()
+    keys = {recipient_id: _key(event_type, order_id, recipient_id, channel) for recipient_id in recipient_ids}
+    DeliveryClaim.objects.filter(expires_at__lte=now).delete()
+    taken = set(DeliveryClaim.objects.filter(key__in=keys.values()).values_list('key', flat=True))
+    allowed = []
+    for recipient_id in recipient_ids:
+        key = keys[recipient_id]
+        if key in taken:
+            continue
+        try:
+            # Savepoint: çakışan anahtar çağıranın transaction'ını bozmaz
+            with transaction.atomic():
+                DeliveryClaim.objects.create(key=key, expires_at=now + timedelta(seconds=window))
+        except IntegrityError:
+            continue
+        taken.add(key)
+        allowed.append(recipient_id)
+    if len(allowed) < len(recipient_ids):
+        _dropped.inc(len(recipient_ids) - len(allowed))
+    return allowed
+
+
+def first_delivery(event_type, order_id, recipient_id, channel):
+    """Tek alıcı için `claim`: bu teslimat pencere içindeki ilk teslimat mı?"""
+    return bool(claim(event_type, order_id, [recipient_id], channel))
@@ -0,0 +1,304 @@
+"""
+E-posta gönderimi.
+
+- `EmailDispatcher` bir batch boyunca tek SMTP bağlantısını açık tutar ve
+  mesajları `send_messages` ile EMAIL_BATCH_SIZE'lık parçalar halinde gönderir.
+- `render_shell` marka HTML kabuğunu her çağrıda yeniden kurmaz; statik baş ve
+  son kısımlar modül yüklenirken bir kez hazırlanır.
+- `render_email` derlenmiş şablonları süreç içinde önbellekte tutar.
+- `shared_connection` ile açılan bağlantı aynı thread'deki diğer gönderimler
+  (örn. outbox worker'ı) tarafından da kullanılır.
+- `GuardedSMTPBackend` bağlantı açma ve mesaj gönderimini backend.outbound
+  'smtp' korumasından geçirir (hız sınırı + devre kesici).
+"""
+import logging
+import smtplib
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+from django.template.loader import get_template
+from django.utils.html import strip_tags
+
+from backend.outbound import CallRejected, get_guard
+
+logger = logging.getLogger(__name__)
+
+_SHELL_HEAD = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body {
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                background-color: #f8fafc;
+                margin: 0;
+                padding: 0;
+            }
+            .container {
+                max-width: 600px;
+                margin: 0 auto;
+                background-color: #ffffff;
+                border-radius: 16px;
+                overflow: hidden;
+                box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
+                margin-top: 40px;
+                margin-bottom: 40px;
+            }
+            .header {
+                background-color: #0D1B3A; /* Navy 900 */
+                padding: 40px;
+                text-align: center;
+                border-bottom: 4px solid #D4AF37; /* Primary Gold */
+            }
+            .logo-text {
+                color: #ffffff;
+                font-size: 24px;
+                font-weight: 900;
+                text-transform: uppercase;
+                letter-spacing: -0.05em;
+                margin: 0;
+            }
+            .logo-highlight {
+                color: #D4AF37; /* Primary Gold */
+            }
+            .content {
+                padding: 40px;
+                color: #334155;
+            }
+            .title {
+                font-size: 20px;
+                font-weight: 800;
+                color: #0D1B3A; /* Navy 900 */
+                margin-bottom: 24px;
+                text-transform: uppercase;
+                letter-spacing: 0.05em;
+            }
+            .message-box {
+                background-color: #fdfbeb; /* Primary 50 */
+                border-left: 4px solid #D4AF37; /* Primary Gold */
+                padding: 24px;
+                border-radius: 8px;
+                font-size: 16px;
+                line-height: 1.6;
+                color: #0f172a;
+            }
+            .footer {
+                background-color: #f8fafc;
+                padding: 32px;
+                text-align: center;
+                border-top: 1px solid #e2e8f0;
+            }
+            .footer-text {
+                color: #94a3b8;
+                font-size: 12px;
+                font-weight: 600;
+                text-transform: uppercase;
+                letter-spacing: 0.05em;
+            }
+            .social-links {
+                margin-top: 16px;
+            }
+            .social-link {
+                color: #64748b;
+                text-decoration: none;
+                margin: 0 8px;
+                font-size: 12px;
+            }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1 class="logo-text">Premium <span class="logo-highlight">Vale</span></h1>
+            </div>
+            <div class="content">
+                <h2 class="title">"""
+
+_SHELL_MIDDLE = """</h2>
+                <div class="message-box">
+                    """
+
+_SHELL_TAIL = """
+                </div>
+            </div>
+            <div class="footer">
+                <p class="footer-text">© 2024 Premium Vale Hizmetleri</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+
+def render_shell(subject, message):
+    """Marka HTML kabuğu içine başlık ve mesajı yerleştirir (satır sonları <br> olur)."""
+    return ''.join((_SHELL_HEAD, subject, _SHELL_MIDDLE, message.replace('\n', '<br>'), _SHELL_TAIL))
+
+
+@lru_cache(maxsize=32)
+def _template(name):
+    return get_template(name)
+
+
+def render_email(template_name, context):
+    """Önbellekteki derlenmiş şablonla (html, düz metin) döner."""
+    html = _template(template_name).render(context)
+    return html, strip_tags(html)
+
+
+class GuardedSMTPBackend(SMTPBackend):
+    """
+    SMTP sunucusu erişilemezken her gönderim bağlantı zaman aşımını beklemesin diye
+    art arda hatalarda devre açılır ve çağrılar hemen reddedilir. fail_silently
+    olsa da hatalar devre kesiciye işlenir, sonra çağırana Django'daki gibi yansıtılır.
+    """
+
+    def _guarded(self, func, *args):
+        guard = get_guard('smtp')
+        try:
+            guard.acquire()
+        except CallRejected as e:
+            if self.fail_silently:
+                logger.warning(str(e))
+                return None
+            raise
+        fail_silently, self.fail_silently = self.fail_silently, False
+        try:
+            result = func(*args)
+        except smtplib.SMTPRecipientsRefused:
+            # Sunucu yanıt veriyor; reddedilen adres sağlayıcı hatası sayılmaz
+            guard.record_success()
+            if fail_silently:
+                return None
+            raise
+        except Exception:
+            guard.record_failure()
+            if fail_silently:
+                return None
+            raise
+        finally:
+            self.fail_silently = fail_silently
+        guard.record_success()
+        return result
+
+    def open(self):
+        if self.connection:
+            return False
+        return self._guarded(super().open)
+
+    def _send(self, email_message):
+        return bool(self._guarded(super()._send, email_message))
+
+
+def build_message(subject, body, to, html=None, from_email=None, connection=None):
+    msg = EmailMultiAlternatives(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=to,
+        connection=connection,
+    )
+    if html:
+        msg.attach_alternative(html, "text/html")
+    return msg
+
+
+_local = threading.local()
+
+
+def current_connection():
+    """`shared_connection` bloğu içindeysek açık bağlantı, değilse None."""
+    return getattr(_local, 'connection', None)
+
+
+@contextmanager
+def shared_connection(fail_silently=False):
+    """Blok boyunca aynı thread'deki tüm gönderimler tek SMTP bağlantısını kullanır."""
+    if current_connection() is not None:
+        yield current_connection()
+        return
+    connection = get_connection(fail_silently=fail_silently)
+    connection.open()
+    _local.connection = connection
+    try:
+        yield connection
+    finally:
+        _local.connection = None
+        try:
+            connection.close()
+        except Exception as e:
+            logger.warning(f"SMTP bağlantısı kapatılamadı: {e}")
+
+
+class EmailDispatcher:
+    """
+    Mesajları biriktirip tek bağlantı üzerinden parçalar halinde gönderir.
+
+        with EmailDispatcher() as dispatcher:
+            for ...:
+                dispatcher.add(build_message(...))
+    """
+
+    def __init__(self, batch_size=None, fail_silently=False, connection=None):
+        self.batch_size = batch_size or getattr(settings, 'EMAIL_BATCH_SIZE', 100)
+        self.fail_silently = fail_silently
+        self.connection = connection
+        self._owns_connection = connection is None
+        self._pending = []
+        self.sent = 0
+
+    def __enter__(self):
+        if self.connection is None:
+            self.connection = current_connection() or get_connection(fail_silently=self.fail_silently)
+            self._owns_connection = self.connection is not current_connection()
+        if self._owns_connection:
+            self.connection.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            if self._owns_connection:
+                self.connection.close()
+        return False
+
+    def add(self, message):
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        try:
+            sent = self.connection.send_messages(batch) or 0
+        except Exception as e:
+            if not self.fail_silently:
+                raise
+            logger.warning(f"E-posta batch'i gönderilemedi ({len(batch)} mesaj): {e}")
+            sent = 0
+        self.sent += sent
+        return sent
+
+
+def send_bulk_html_email(subject, message, recipient_list, fail_silently=True):
+    """
+    Her alıcıya ayrı (diğer alıcıları görmediği) bir e-posta gönderir. HTML bir kez
+    oluşturulur, mesajlar tek bağlantı üzerinden parçalar halinde gider.
+    Gönderilen mesaj sayısını döner.
+    """
+    recipients = [address for address in recipient_list if address]
+    if not recipients:
+        return 0
+    html = render_shell(subject, message)
+    with EmailDispatcher(fail_silently=fail_silently) as dispatcher:
+        for address in recipients:
+            dispatcher.add(build_message(subject, message, [address], html=html))
+    return dispatcher.sent
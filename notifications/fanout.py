@@ -0,0 +1,78 @@
+"""
+Bir kullanıcı kümesine toplu uygulama içi bildirim (fan-out).
+
+Alıcı sayısından bağımsız olarak sabit sayıda sorgu çalışır:
+alıcılar ve push token'ları tek sorguda çözülür (önbellekten de gelebilir,
+bkz. notifications.recipients), bildirim satırları tek bulk_create ile yazılır
+ve push tek bir outbox mesajı olarak kuyruğa alınır.
+
+`event=(olay_tipi, sipariş_id)` verilirse her kanal notifications.dedup üzerinden
+tekilleştirilir: pencere içinde aynı olayı bu kanaldan zaten almış alıcılar atlanır.
+`coalesce_key` verilirse ardışık durum olayları tek teslimatta birleştirilir
+(bkz. notifications.coalesce).
+"""
+from collections import namedtuple
+
+from .coalesce import upsert_notifications
+from .dedup import claim
+from .models import Notification
+from .outbox import enqueue_push
+from .recipients import resolve_recipients, tokens_of
+
+FanOut = namedtuple('FanOut', ['user_ids', 'emails', 'tokens'])
+
+
+def managers():
+    """Aktif yönetici alıcılar."""
+    return resolve_recipients(role='Yönetici')
+
+
+def fan_out(recipients, title, message, push=False, data=None, sound='default', channel_id='default',
+            push_title=None, push_message=None, event=None, email=False, coalesce_key=''):
+    """
+    `recipients` (Recipient listesi) içindeki her kullanıcıya bir Notification satırı yazar.
+    push=True ise tüm alıcıların Expo token'larına tek bir push kuyruğa alınır
+    (push_title/push_message verilmezse bildirim başlığı ve mesajı kullanılır).
+    email=True, çağıranın dönen `emails` adreslerine e-posta göndereceğini belirtir;
+    event ile birlikte verilirse `emails` yalnızca bu olayın e-postasını ilk kez alacakları içerir.
+    """
+    if not recipients:
+        return FanOut([], [], [])
+
+    user_ids = [recipient.user_id for recipient in recipients]
+    push_recipients = recipients if push else []
+    email_recipients = [recipient for recipient in recipients if recipient.email]
+    if event:
+        user_ids = claim(*event, user_ids, 'in_app')
+        push_recipients = _claimed(event, push_recipients, 'push')
+        if email:
+            email_recipients = _claimed(event, email_recipients, 'email')
+
+    emails = [recipient.email for recipient in email_recipients]
+    if user_ids and coalesce_key:
+        upsert_notifications(user_ids, coalesce_key, title, message)
+    elif user_ids:
+        Notification.objects.bulk_create(
+            [Notification(user_id=user_id, title=title, message=message) for user_id in user_ids],
+            batch_size=500,
+        )
+
+    tokens = []
+    if push_recipients:
+        tokens = tokens_of(push_recipients)
+        enqueue_push(
+            tokens,
+            push_title or title,
+            push_message or message,
+            data=data,
+            sound=sound,
+            channel_id=channel_id,
+            coalesce_key=coalesce_key,
+        )
+
+    return FanOut(user_ids, emails, tokens)
+
+
+def _claimed(event, recipients, channel):
+    allowed = set(claim(*event, [recipient.user_id for recipient in recipients], channel))
+    return [recipient for recipient in recipients if recipient.user_id in allowed]
@@ -0,0 +1,74 @@
+"""
+Kullanıcı gelen kutusu: kişisel bildirimler (Notification) ile kitleye gönderilen
+duyurular (BroadcastMessage) tek bir UNION ALL sorgusunda birleştirilir.
+Duyurunun okunma bilgisi kullanıcının BroadcastReceipt satırından gelir.
+"""
+from django.db.models import CharField, Exists, F, OuterRef, Value
+
+from .models import BroadcastMessage, BroadcastReceipt, Notification, UnreadCounter
+
+# User.role -> BroadcastMessage.audience
+ROLE_AUDIENCES = {
+    'Şoför': 'driver',
+    'Kullanıcı': 'customer',
+}
+
+INBOX_FIELDS = ('id', 'title', 'message', 'created_at', 'read', 'kind')
+
+
+def broadcast(title, message, audience='all', created_by=None):
+    """Kitledeki herkese tek satırlık bir duyuru yazar."""
+    return BroadcastMessage.objects.create(
+        title=title, message=message, audience=audience or 'all', created_by=created_by
+    )
+
+
+def broadcasts_for(user):
+    """Kullanıcının kitlesine, kayıt olduktan sonra gönderilmiş duyurular."""
+    audiences = ['all']
+    if user.role in ROLE_AUDIENCES:
+        audiences.append(ROLE_AUDIENCES[user.role])
+    return BroadcastMessage.objects.filter(audience__in=audiences, created_at__gte=user.date_joined)
+
+
+def personal_items(user, after=None):
+    items = Notification.objects.filter(user=user)
+    if after is not None:
+        items = items.filter(after)
+    return items.annotate(
+        read=F('is_read'),
+        kind=Value('personal', output_field=CharField()),
+    ).values(*INBOX_FIELDS)
+
+
+def broadcast_items(user, after=None):
+    items = broadcasts_for(user)
+    if after is not None:
+        items = items.filter(after)
+    return items.annotate(
+        read=Exists(BroadcastReceipt.objects.filter(broadcast=OuterRef('pk'), user=user)),
+        kind=Value('broadcast', output_field=CharField()),
+    ).values(*INBOX_FIELDS)
+
+
+def inbox(user, after=None):
+    """
+    Kişisel bildirimler + duyurular, en yeniden eskiye (tek sorgu).
+    after: keyset sayfalama koşulu (created_at, id üzerinde Q); her iki parçaya uygulanır.
+    """
+    return personal_items(user, after).union(broadcast_items(user, after), all=True).order_by('-created_at', '-id')
+
+
+def unread_count(user):
+    """Rozet sayısı: sayaçtan okunan kişisel bildirimler + okunmamış duyurular."""
+    return UnreadCounter.get_count(user.pk) + broadcasts_for(user).exclude(receipts__user=user).count()
+
+
+def mark_broadcasts_read(user, broadcast_ids=None):
+    """Kullanıcının okunmamış duyurularını okundu işaretler; işaretlenen sayıyı döner."""
+    unread = broadcasts_for(user).exclude(receipts__user=user)
+    if broadcast_ids is not None:
+        unread = unread.filter(id__in=broadcast_ids)
+    receipts = [BroadcastReceipt(broadcast_id=pk, user=user) for pk in unread.values_list('id', flat=True)]
+    BroadcastReceipt.objects.bulk_create(receipts, ignore_conflicts=True)
+    return len(receipts)
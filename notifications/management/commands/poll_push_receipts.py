@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from notifications.push import poll_receipts
+
+
+class Command(BaseCommand):
+    help = "Expo push ticket'larının teslim makbuzlarını (receipt) toplu olarak sorgular."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=900, help='Ticket en az bu kadar saniye eski olmalı')
+        parser.add_argument('--limit', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        updated = poll_receipts(min_age_seconds=options['min_age'], limit=options['limit'])
+        errors = sum(1 for ticket in updated if ticket.receipt_status not in ('ok',))
+        self.stdout.write(f"{len(updated)} receipt işlendi, {errors} hatalı/süresi dolmuş.")
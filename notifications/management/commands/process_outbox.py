@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    help = "Outbox'taki bekleyen e-posta, push ve SMS mesajlarını gönderir."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Tek tur çalış ve çık')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0, help='Boş turdan sonra bekleme süresi (sn)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['once']:
+            processed, succeeded = process_outbox(batch_size=batch_size)
+            self.stdout.write(f"{processed} mesaj işlendi, {succeeded} başarılı.")
+            return
+
+        self.stdout.write("Outbox worker başlatıldı.")
+        try:
+            while True:
+                close_old_connections()
+                processed, succeeded = process_outbox(batch_size=batch_size)
+                if processed:
+                    self.stdout.write(f"{processed} mesaj işlendi, {succeeded} başarılı.")
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Outbox worker durduruldu.")
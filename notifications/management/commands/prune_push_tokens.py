@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from notifications.tokens import prune_dead_tokens
+
+
+class Command(BaseCommand):
+    help = "Art arda teslim edilemeyen (DeviceNotRegistered / geçersiz) push token'larını toplu siler."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int, default=None,
+                            help='Varsayılan: PUSH_TOKEN_MAX_FAILURES')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Silmeden sadece say')
+
+    def handle(self, *args, **options):
+        result = prune_dead_tokens(
+            threshold=options['threshold'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'silinecek' if options['dry_run'] else 'silindi'
+        for model_name, count in result.items():
+            self.stdout.write(f"{model_name}: {count} token {verb}")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from notifications.retention import purge_notifications
+
+
+class Command(BaseCommand):
+    help = "Saklama süresini aşmış okunmuş bildirimleri küçük batch'ler halinde siler (isteğe bağlı arşivleyerek)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Varsayılan: NOTIFICATION_RETENTION_DAYS')
+        parser.add_argument('--batch-size', type=int, default=None, help='Varsayılan: NOTIFICATION_PURGE_BATCH_SIZE')
+        parser.add_argument('--archive', help='Silinen satırların ekleneceği .jsonl.gz dosyası')
+        parser.add_argument('--pause', type=float, default=0.0, help='Batch\'ler arası bekleme (sn)')
+        parser.add_argument('--dry-run', action='store_true', help='Silmeden sadece say')
+
+    def _progress(self, deleted, elapsed):
+        rate = deleted / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"  {deleted} satır silindi ({rate:.0f} satır/sn)")
+
+    def handle(self, *args, **options):
+        deleted, elapsed = purge_notifications(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            archive_path=options['archive'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+            progress=None if options['dry_run'] else self._progress,
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{deleted} bildirim silinecek.")
+            return
+        rate = deleted / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"Toplam {deleted} bildirim {elapsed:.2f} sn'de silindi ({rate:.0f} satır/sn).")
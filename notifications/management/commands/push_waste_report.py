@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from notifications.models import PushDispatch
+
+
+class Command(BaseCommand):
+    help = "Push gönderimlerinin ne kadarının ölü token'lara harcandığını raporlar."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument('--limit', type=int, default=20, help='Listelenecek en savurgan gönderim sayısı')
+
+    def handle(self, *args, **options):
+        dispatches = PushDispatch.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=options['days'])
+        )
+        totals = dispatches.aggregate(tokens=Sum('token_count'), dead=Sum('dead_count'))
+        tokens = totals['tokens'] or 0
+        dead = totals['dead'] or 0
+        ratio = dead / tokens * 100 if tokens else 0
+        self.stdout.write(
+            f"Son {options['days']} gün: {dispatches.count()} gönderim, {tokens} mesaj, "
+            f"{dead} ölü token (%{ratio:.1f})"
+        )
+        for dispatch in dispatches.filter(dead_count__gt=0).order_by('-dead_count')[:options['limit']]:
+            self.stdout.write(
+                f"  {dispatch.created_at:%Y-%m-%d %H:%M}  {dispatch.title[:40]:<40} "
+                f"{dispatch.dead_count}/{dispatch.token_count} (%{dispatch.wasted_ratio * 100:.1f})"
+            )
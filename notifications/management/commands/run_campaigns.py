@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notifications.campaigns import resumable_campaigns, run_campaign
+
+
+class Command(BaseCommand):
+    help = "Bekleyen veya yarıda kalmış toplu bildirim kampanyalarını kaldığı yerden gönderir."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Tek tur çalış ve çık')
+        parser.add_argument('--campaign', help='Sadece bu kampanyayı çalıştır (başarısız olsa bile)')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=5.0, help='Boş turdan sonra bekleme süresi (sn)')
+
+    def _run(self, campaign_id, chunk_size, include_failed=False):
+        campaign = run_campaign(campaign_id, chunk_size=chunk_size, include_failed=include_failed)
+        if campaign is not None:
+            self.stdout.write(
+                f"{campaign.pk}: {campaign.status}, {campaign.processed_count}/{campaign.total_recipients} "
+                f"alıcı, {campaign.throughput} alıcı/sn"
+            )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if options['campaign']:
+            self._run(options['campaign'], chunk_size, include_failed=True)
+            return
+
+        try:
+            while True:
+                close_old_connections()
+                campaign_ids = list(resumable_campaigns().values_list('pk', flat=True))
+                for campaign_id in campaign_ids:
+                    self._run(campaign_id, chunk_size)
+                if options['once']:
+                    return
+                if not campaign_ids:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Kampanya worker durduruldu.")
@@ -1,6 +1,19 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
 import uuid
 from django.conf import settings
+from django.utils import timezone
+
+
+class NotificationQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        unread = Counter(obj.user_id for obj in objs if not obj.is_read)
+        for delta in set(unread.values()):
+            UnreadCounter.add([user_id for user_id, count in unread.items() if count == delta], delta)
+        return objs
+
 
 # Create your models here.
 class Notification(models.Model):
@@ -11,7 +24,266 @@ class Notification(models.Model):
     message = models.CharField(max_length=255, blank=True,null=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_read_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_created_idx'),
+            # Saklama politikası okunmuş eski satırları (created_at, id) sırasıyla tarar
+            models.Index(fields=['is_read', 'created_at', 'id'], name='notification_read_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # Satır ve sayaç artışı birlikte yazılır; sayaç yazılamazsa sayılmamış satır kalmaz
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and not self.is_read:
+                UnreadCounter.add([self.user_id], 1)
     
     def __str__(self):
         return f"{self.user.email} - {self.title} - {self.message} - {self.is_read} - {self.created_at}"
-    
\ No newline at end of file
+
+
+class UnreadCounter(models.Model):
+    """
+    Kullanıcının okunmamış kişisel bildirim sayısı. Rozet (badge) sorgusu
+    bildirim tablosunu taramadan buradan okunur.
+    count NULL ise sayaç henüz hesaplanmamıştır; ilk okumada bildirim tablosundan
+    bir kez sayılıp kaydedilir (NULL + n = NULL olduğundan artırımlar bunu bozmaz).
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='unread_counter')
+    count = models.IntegerField(null=True, blank=True)
+
+    @classmethod
+    def add(cls, user_ids, delta):
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not user_ids or not delta:
+            return
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        cls.objects.filter(user_id__in=user_ids).update(count=models.F('count') + delta)
+
+    @classmethod
+    def get_count(cls, user_id):
+        count = cls.objects.filter(user_id=user_id).values_list('count', flat=True).first()
+        if count is None:
+            count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+            cls.objects.bulk_create([cls(user_id=user_id)], ignore_conflicts=True)
+            cls.objects.filter(user_id=user_id, count__isnull=True).update(count=count)
+        return max(count, 0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.count}"
+
+
+class BroadcastMessage(models.Model):
+    """
+    Bir kitleye (tüm kullanıcılar, şoförler, müşteriler) gönderilen uygulama içi
+    duyuru. Alıcı sayısından bağımsız olarak tek satır yazılır; kullanıcı başına
+    sadece okunduğunda bir BroadcastReceipt satırı oluşur.
+    """
+    AUDIENCE_CHOICES = (
+        ('all', 'Tüm Kullanıcılar'),
+        ('driver', 'Şoförler'),
+        ('customer', 'Müşteriler'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    title = models.CharField(max_length=255, blank=True, null=True)
+    message = models.CharField(max_length=255, blank=True, null=True)
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default='all')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='broadcasts')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['audience', '-created_at'], name='broadcast_audience_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_audience_display()} - {self.title}"
+
+
+class BroadcastReceipt(models.Model):
+    """Bir kullanıcının bir duyuruyu okuduğu bilgisi."""
+    broadcast = models.ForeignKey(BroadcastMessage, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='broadcast_receipts')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'broadcast'], name='broadcast_receipt_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.broadcast_id}"
+
+
+class OutboxMessage(models.Model):
+    """
+    Transactional outbox: e-posta ve push gibi dış servis çağrıları, tetikleyen
+    kayıtla aynı transaction içinde buraya yazılır ve commit sonrası
+    `process_outbox` komutu tarafından gönderilir.
+    """
+    CHANNEL_CHOICES = (
+        ('email', 'E-posta'),
+        ('push', 'Push Bildirimi'),
+        ('sms', 'SMS'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Bekliyor'),
+        ('sent', 'Gönderildi'),
+        ('failed', 'Başarısız'),
+    )
+
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    # Aynı anahtarlı bekleyen mesajla birleştirilebilir (notifications.coalesce);
+    # SMS'te yeni mesaj aynı anahtarlı bekleyen mesajın yerine geçer
+    coalesce_key = models.CharField(max_length=200, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+            models.Index(fields=['coalesce_key', 'status'], name='outbox_coalesce_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} - {self.status} - {self.attempts}"
+
+
+class DeliveryClaim(models.Model):
+    """
+    Bildirim tekilleştirme anahtarı (bkz. notifications.dedup). Teslimatı yazan
+    transaction içinde eklenir; transaction geri alınırsa anahtar da geri alınır.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='delivery_claim_expires_idx'),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class PushDispatch(models.Model):
+    """
+    Tek bir push gönderimi (fan-out) özeti. Ölü token'lara (kaldırılmış uygulama,
+    geçersiz token) harcanan mesaj sayısı gönderim anında ticket'lardan,
+    sonrasında da receipt'lerden toplanır; bkz. `push_waste_report` komutu.
+    """
+    title = models.CharField(max_length=255, blank=True, default='')
+    token_count = models.PositiveIntegerField(default=0)
+    ok_count = models.PositiveIntegerField(default=0)
+    dead_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='pushdispatch_created_idx'),
+        ]
+
+    @property
+    def wasted_ratio(self):
+        return self.dead_count / self.token_count if self.token_count else 0.0
+
+    def __str__(self):
+        return f"{self.title} - {self.dead_count}/{self.token_count} ölü token"
+
+
+class PushTicket(models.Model):
+    """
+    Expo'nun gönderim sırasında döndürdüğü ticket. Teslim makbuzu (receipt)
+    `poll_push_receipts` komutu ile toplu olarak sonradan sorgulanır.
+    """
+    dispatch = models.ForeignKey(PushDispatch, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='tickets')
+    token = models.CharField(max_length=512)
+    ticket_id = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20)
+    error = models.CharField(max_length=100, blank=True, default='')
+    receipt_status = models.CharField(max_length=20, blank=True, default='')
+    receipt_error = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    checked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['checked_at', 'created_at'], name='pushticket_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token[:15]}... - {self.status} - {self.receipt_status or 'bekliyor'}"
+
+
+class Campaign(models.Model):
+    """
+    Panelden başlatılan toplu bildirim kampanyası. Alıcılar id sırasıyla parça
+    parça işlenir; her parçadan sonra `last_user_id` kaydedilir, böylece yarıda
+    kalan kampanya kaldığı yerden devam eder (bkz. notifications.campaigns).
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Bekliyor'),
+        ('running', 'Gönderiliyor'),
+        ('completed', 'Tamamlandı'),
+        ('failed', 'Başarısız'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='campaigns')
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    channels = models.JSONField(default=list)
+    group = models.CharField(max_length=20, blank=True, default='all')
+    user_ids = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_recipients = models.PositiveIntegerField(default=0)
+    processed_count = models.PositiveIntegerField(default=0)
+    emails_sent = models.PositiveIntegerField(default=0)
+    pushes_sent = models.PositiveIntegerField(default=0)
+    sms_sent = models.PositiveIntegerField(default=0)
+    last_user_id = models.UUIDField(null=True, blank=True)
+    # Kampanyayı çalıştıran worker'ın sahiplik belirteci; her devralmada yenilenir
+    lease_token = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='campaign_status_updated_idx'),
+        ]
+
+    @property
+    def progress(self):
+        if self.status == 'completed':
+            return 100.0
+        return round(self.processed_count * 100 / self.total_recipients, 1) if self.total_recipients else 0.0
+
+    @property
+    def throughput(self):
+        """Saniyede işlenen alıcı sayısı."""
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds()
+        return round(self.processed_count / elapsed, 1) if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.title} - {self.status} - {self.processed_count}/{self.total_recipients}"
@@ -0,0 +1,234 @@
+"""
+Transactional outbox.
+
+`enqueue_email` / `enqueue_push` sadece bir OutboxMessage satırı yazar; çağıran
+transaction commit edilmeden satır görünmez. Gönderim `process_outbox`
+(manage.py process_outbox) tarafından yapılır. Başarısız gönderimler üstel
+bekleme (backoff) ile tekrar denenir.
+
+`coalesce_key` verilen mesajlar birleştirme penceresi kadar gecikmeli yazılır;
+pencere içinde aynı anahtarla gelen yeni mesaj, henüz alınmamış bekleyen mesajın
+payload'ını değiştirir (bkz. notifications.coalesce).
+
+SMS (OTP) mesajlarında anahtar birleştirme değil yerine geçme içindir: aynı
+anahtarla yeni kod kuyruğa alınınca bekleyen eski SMS iptal edilir. `expires_at`
+geçmiş bir SMS gönderilmez, tekrar denenmeden başarısız işaretlenir.
+"""
+import logging
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import coalesce
+from .email import build_message, current_connection, shared_connection
+from .models import OutboxMessage
+from .push import PushDeliveryError
+from .utils import send_expo_push_notification
+
+logger = logging.getLogger(__name__)
+
+# Bir mesaj işlenirken diğer worker'ların onu almaması için verilen süre.
+# Worker bu süre içinde çökerse mesaj tekrar alınabilir hale gelir.
+LEASE_SECONDS = 300
+
+
+class PermanentDeliveryError(Exception):
+    """Tekrar denemenin anlamı yok; mesaj doğrudan 'failed' olur."""
+
+
+class SMSDeliveryError(Exception):
+    pass
+
+
+def _enqueue(channel, payload, coalesce_key=''):
+    window = coalesce.window_seconds() if coalesce_key else 0
+    if not window:
+        return OutboxMessage.objects.create(channel=channel, payload=payload)
+
+    now = timezone.now()
+    # Sadece birleştirme gecikmesindeki mesajlar: worker'ın kilitlediği (lease) mesajın
+    # available_at'i pencereden ileridedir, hiç denenmemiş olması da şarttır.
+    pending = OutboxMessage.objects.filter(
+        channel=channel,
+        coalesce_key=coalesce_key,
+        status='pending',
+        attempts=0,
+        available_at__gt=now,
+        available_at__lte=now + timedelta(seconds=window),
+    ).order_by('-id').first()
+    # Compare-and-set: arada bir worker mesajı aldıysa available_at değişmiştir, yeni mesaj açılır
+    if pending and OutboxMessage.objects.filter(
+        pk=pending.pk, status='pending', available_at=pending.available_at
+    ).update(payload=payload):
+        pending.payload = payload
+        coalesce.record_merge()
+        return pending
+
+    return OutboxMessage.objects.create(
+        channel=channel,
+        payload=payload,
+        coalesce_key=coalesce_key,
+        available_at=now + timedelta(seconds=window),
+    )
+
+
+def enqueue_email(subject, body, to, html=None, from_email=None, coalesce_key=''):
+    recipients = [address for address in (to or []) if address]
+    if not recipients:
+        return None
+    return _enqueue('email', {
+        'subject': subject,
+        'body': body,
+        'html': html,
+        'to': recipients,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+    }, coalesce_key)
+
+
+def enqueue_push(tokens, title, message, data=None, sound='default', channel_id='default', coalesce_key=''):
+    if isinstance(tokens, str):
+        tokens = [tokens]
+    tokens = [token for token in (tokens or []) if token]
+    if not tokens:
+        return None
+    return _enqueue('push', {
+        'tokens': tokens,
+        'title': title,
+        'message': message,
+        'data': data or {},
+        'sound': sound,
+        'channel_id': channel_id,
+    }, coalesce_key)
+
+
+def enqueue_sms(phone_number, message, replace_key='', expires_at=None):
+    if not phone_number:
+        return None
+    if replace_key:
+        OutboxMessage.objects.filter(channel='sms', coalesce_key=replace_key, status='pending').update(
+            status='failed', last_error='Yerine yeni mesaj kuyruğa alındı.'
+        )
+    return OutboxMessage.objects.create(
+        channel='sms',
+        payload={
+            'phone_number': phone_number,
+            'message': message,
+            'expires_at': expires_at.isoformat() if expires_at else None,
+        },
+        coalesce_key=replace_key,
+    )
+
+
+def _deliver_email(payload):
+    # process_outbox bir batch için tek SMTP bağlantısı açar (shared_connection)
+    build_message(
+        payload['subject'],
+        payload['body'],
+        payload['to'],
+        html=payload.get('html'),
+        from_email=payload.get('from_email'),
+        connection=current_connection(),
+    ).send()
+
+
+def _deliver_push(payload):
+    try:
+        send_expo_push_notification(
+            tokens=payload['tokens'],
+            title=payload['title'],
+            message=payload['message'],
+            data=payload.get('data'),
+            sound=payload.get('sound', 'default'),
+            channel_id=payload.get('channel_id', 'default'),
+            fail_silently=False,
+        )
+    except PushDeliveryError as e:
+        # Kısmi hatada sadece gönderilemeyen token'lar tekrar denenir
+        payload['tokens'] = e.failed_tokens
+        raise
+
+
+def _deliver_sms(payload):
+    from accounts.utils import send_sms
+
+    expires_at = parse_datetime(payload['expires_at']) if payload.get('expires_at') else None
+    if expires_at and timezone.now() > expires_at:
+        raise PermanentDeliveryError('SMS geçerlilik süresi doldu, gönderilmedi.')
+    if not send_sms(payload['phone_number'], payload['message']):
+        raise SMSDeliveryError('SMS sağlayıcısı mesajı kabul etmedi.')
+
+
+HANDLERS = {
+    'email': _deliver_email,
+    'push': _deliver_push,
+    'sms': _deliver_sms,
+}
+
+
+def retry_delay(attempts):
+    """attempts. denemeden sonra beklenecek süre (saniye): base * 2^(n-1), üst sınırlı."""
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 30)
+    cap = getattr(settings, 'OUTBOX_RETRY_MAX_SECONDS', 3600)
+    return min(cap, base * (2 ** max(0, attempts - 1)))
+
+
+def _claim(message, now):
+    """Mesajı bu worker için kilitler (compare-and-set). Başka worker aldıysa False döner."""
+    return OutboxMessage.objects.filter(
+        pk=message.pk, status='pending', available_at=message.available_at
+    ).update(available_at=now + timedelta(seconds=LEASE_SECONDS)) == 1
+
+
+def deliver(message):
+    handler = HANDLERS[message.channel]
+    try:
+        handler(message.payload)
+    except Exception as e:
+        message.attempts += 1
+        message.last_error = str(e)[:2000]
+        max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+        if message.attempts >= max_attempts or isinstance(e, PermanentDeliveryError):
+            message.status = 'failed'
+            logger.error(f"Outbox mesajı {message.pk} ({message.channel}) kalıcı olarak başarısız: {e}")
+        else:
+            message.available_at = timezone.now() + timedelta(seconds=retry_delay(message.attempts))
+            logger.warning(f"Outbox mesajı {message.pk} ({message.channel}) tekrar denenecek: {e}")
+        # Handler payload'ı daraltmış olabilir (örn. sadece başarısız push token'ları)
+        message.save(update_fields=['attempts', 'last_error', 'status', 'available_at', 'payload'])
+        return False
+
+    message.status = 'sent'
+    message.sent_at = timezone.now()
+    message.attempts += 1
+    message.save(update_fields=['status', 'sent_at', 'attempts'])
+    return True
+
+
+def process_outbox(batch_size=100):
+    """
+    Zamanı gelmiş bekleyen mesajları gönderir.
+    (işlenen, başarılı) sayılarını döner.
+    """
+    now = timezone.now()
+    candidates = list(
+        OutboxMessage.objects.filter(status='pending', available_at__lte=now)
+        .order_by('available_at', 'id')[:batch_size]
+    )
+    processed = succeeded = 0
+    with ExitStack() as stack:
+        if any(message.channel == 'email' for message in candidates):
+            try:
+                stack.enter_context(shared_connection())
+            except Exception as e:
+                # Bağlantı açılamazsa her mesaj kendi bağlantısını dener ve hata alırsa tekrar kuyruğa girer
+                logger.warning(f"Outbox için SMTP bağlantısı açılamadı: {e}")
+        for message in candidates:
+            if not _claim(message, now):
+                continue
+            processed += 1
+            if deliver(message):
+                succeeded += 1
+    return processed, succeeded
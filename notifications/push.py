@@ -0,0 +1,255 @@
+"""
+Expo Push API istemcisi.
+
+- Tüm istekler keep-alive bağlantı havuzu olan tek bir `requests.Session` üzerinden gider.
+- 100'lük parçalar (Expo sınırı) sınırlı bir thread havuzu ile eşzamanlı gönderilir.
+- Büyük istek gövdeleri gzip ile sıkıştırılır.
+- İstekler backend.outbound 'expo' korumasından geçer (hız sınırı + devre kesici);
+  Expo erişilemezken çağrılar zaman aşımını beklemeden reddedilir.
+- Her token için bir ticket döner; ticket id'leri daha sonra `poll_receipts` ile
+  teslim makbuzlarını (receipt) toplu sorgulamak için saklanır.
+"""
+import gzip
+import json
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+from backend.outbound import get_guard
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = 'https://exp.host/--/api/v2/push'
+SEND_CHUNK_SIZE = 100       # Expo: istek başına en fazla 100 mesaj
+RECEIPTS_CHUNK_SIZE = 1000  # Expo: istek başına en fazla 1000 ticket id
+
+Ticket = namedtuple('Ticket', ['token', 'status', 'id', 'error', 'message'])
+
+
+def is_expo_token(token):
+    return bool(token) and (token.startswith('ExponentPushToken') or token.startswith('ExpoPushToken'))
+
+
+class PushDeliveryError(Exception):
+    """Bazı parçalar gönderilemedi; `failed_tokens` tekrar denenecek token'lardır."""
+
+    def __init__(self, message, failed_tokens, tickets):
+        super().__init__(message)
+        self.failed_tokens = failed_tokens
+        self.tickets = tickets
+
+
+class ExpoPushClient:
+    def __init__(self, base_url=None, max_workers=None, timeout=None, gzip_threshold=None):
+        self.base_url = (base_url or getattr(settings, 'EXPO_PUSH_BASE_URL', DEFAULT_BASE_URL)).rstrip('/')
+        self.max_workers = max_workers or getattr(settings, 'EXPO_PUSH_MAX_WORKERS', 4)
+        self.timeout = timeout or getattr(settings, 'EXPO_PUSH_TIMEOUT', 10)
+        if gzip_threshold is None:
+            gzip_threshold = getattr(settings, 'EXPO_PUSH_GZIP_THRESHOLD', 1024)
+        self.gzip_threshold = gzip_threshold
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Content-Type': 'application/json',
+        })
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='expo-push')
+
+    def _post(self, path, body):
+        data = json.dumps(body).encode('utf-8')
+        headers = {}
+        if self.gzip_threshold and len(data) > self.gzip_threshold:
+            data = gzip.compress(data)
+            headers['Content-Encoding'] = 'gzip'
+        guard = get_guard('expo')
+        guard.acquire()
+        try:
+            response = self.session.post(f'{self.base_url}/{path}', data=data, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            guard.record_failure()
+            raise
+        # 4xx isteğin kendisiyle ilgilidir; sadece sunucu hataları ve 429 sağlayıcı sorunu sayılır
+        if response.status_code >= 500 or response.status_code == 429:
+            guard.record_failure()
+        else:
+            guard.record_success()
+        response.raise_for_status()
+        return response.json()
+
+    def _send_chunk(self, chunk):
+        try:
+            result = self._post('send', chunk)
+        except Exception as e:
+            logger.warning(f"Expo push parçası gönderilemedi ({len(chunk)} mesaj): {e}")
+            return [Ticket(m['to'], 'error', None, 'RequestFailed', str(e)) for m in chunk], True
+
+        items = result.get('data') or []
+        tickets = []
+        for message, item in zip(chunk, items):
+            details = item.get('details') or {}
+            tickets.append(Ticket(
+                message['to'],
+                item.get('status', 'error'),
+                item.get('id'),
+                details.get('error'),
+                item.get('message'),
+            ))
+        # Yanıtta eksik ticket varsa (beklenmedik), kalanları hata say
+        for message in chunk[len(items):]:
+            tickets.append(Ticket(message['to'], 'error', None, 'MissingTicket', None))
+        return tickets, False
+
+    def send(self, messages):
+        """
+        Mesajları parçalar halinde eşzamanlı gönderir.
+        Mesajlarla aynı sırada Ticket listesi ve taşıma hatası alan token'ları döner.
+        """
+        chunks = [messages[i:i + SEND_CHUNK_SIZE] for i in range(0, len(messages), SEND_CHUNK_SIZE)]
+        if len(chunks) == 1:
+            results = [self._send_chunk(chunks[0])]
+        else:
+            results = list(self._pool.map(self._send_chunk, chunks))
+
+        tickets = []
+        failed_tokens = []
+        for chunk, (chunk_tickets, transport_failed) in zip(chunks, results):
+            tickets.extend(chunk_tickets)
+            if transport_failed:
+                failed_tokens.extend(m['to'] for m in chunk)
+        return tickets, failed_tokens
+
+    def get_receipts(self, ticket_ids):
+        """Ticket id -> receipt sözlüğü döner. Henüz hazır olmayan id'ler sonuçta yer almaz."""
+        receipts = {}
+        chunks = [ticket_ids[i:i + RECEIPTS_CHUNK_SIZE] for i in range(0, len(ticket_ids), RECEIPTS_CHUNK_SIZE)]
+        for result in self._pool.map(lambda ids: self._post('getReceipts', {'ids': ids}), chunks):
+            receipts.update(result.get('data') or {})
+        return receipts
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_push_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ExpoPushClient()
+    return _client
+
+
+def build_messages(tokens, title, message, data=None, sound='default', channel_id='default'):
+    return [
+        {
+            'to': token,
+            'title': title,
+            'body': message,
+            'data': data or {},
+            'sound': sound,
+            'channelId': channel_id,
+            'badge': 1,
+            'priority': 'high',
+        }
+        for token in tokens if is_expo_token(token)
+    ]
+
+
+def record_tickets(tickets, title='', invalid_tokens=()):
+    """
+    Gönderimi bir PushDispatch olarak kaydeder, başarılı ticket'ları receipt
+    sorgusu için saklar ve ölü token'ları işaretler.
+    invalid_tokens: Expo formatına uymadığı için hiç gönderilmeyen token'lar.
+    """
+    from .models import PushDispatch, PushTicket
+    from .tokens import INVALID_TOKEN_ERROR, is_dead_token_error, record_token_results
+
+    dead_tokens = {token: INVALID_TOKEN_ERROR for token in invalid_tokens if token}
+    dead_tokens.update({t.token: t.error for t in tickets if t.status == 'error' and is_dead_token_error(t.error)})
+    ok_tickets = [t for t in tickets if t.status == 'ok' and t.id]
+
+    dispatch = PushDispatch.objects.create(
+        title=(title or '')[:255],
+        token_count=len(tickets) + len(invalid_tokens),
+        ok_count=len(ok_tickets),
+        dead_count=len(dead_tokens),
+    )
+    PushTicket.objects.bulk_create(
+        [
+            PushTicket(dispatch=dispatch, token=t.token, ticket_id=t.id, status=t.status, error=t.error or '')
+            for t in ok_tickets
+        ],
+        batch_size=500,
+    )
+    if dead_tokens:
+        record_token_results(dead_tokens=dead_tokens)
+    return dispatch
+
+
+def poll_receipts(min_age_seconds=900, max_age_seconds=86400, limit=10000):
+    """
+    Yeterince eski ve henüz kontrol edilmemiş ticket'ların receipt'lerini toplu sorgular.
+    Expo receipt'leri ~24 saat saklar; bu süreyi aşıp hâlâ cevapsız olanlar 'expired' işaretlenir.
+    Ölü token receipt'leri token sayaçlarına ve ilgili PushDispatch'e işlenir.
+    Güncellenen PushTicket listesini döner.
+    """
+    from collections import Counter
+    from datetime import timedelta
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import PushDispatch, PushTicket
+    from .tokens import is_dead_token_error, record_token_results
+
+    now = timezone.now()
+    tickets = list(
+        PushTicket.objects.filter(
+            status='ok', checked_at__isnull=True, created_at__lte=now - timedelta(seconds=min_age_seconds)
+        ).order_by('created_at')[:limit]
+    )
+    if not tickets:
+        return []
+
+    receipts = get_push_client().get_receipts([t.ticket_id for t in tickets])
+    updated = []
+    delivered_tokens = []
+    dead_tokens = {}
+    dead_per_dispatch = Counter()
+    for ticket in tickets:
+        receipt = receipts.get(ticket.ticket_id)
+        if receipt is None:
+            if ticket.created_at > now - timedelta(seconds=max_age_seconds):
+                continue
+            ticket.receipt_status = 'expired'
+        else:
+            ticket.receipt_status = receipt.get('status', 'error')
+            error = (receipt.get('details') or {}).get('error')
+            ticket.receipt_error = (error or receipt.get('message') or '')[:255]
+            if ticket.receipt_status == 'ok':
+                delivered_tokens.append(ticket.token)
+            elif is_dead_token_error(error):
+                dead_tokens[ticket.token] = error
+                if ticket.dispatch_id:
+                    dead_per_dispatch[ticket.dispatch_id] += 1
+        ticket.checked_at = now
+        updated.append(ticket)
+
+    PushTicket.objects.bulk_update(updated, ['receipt_status', 'receipt_error', 'checked_at'], batch_size=500)
+    for dispatch_id, count in dead_per_dispatch.items():
+        PushDispatch.objects.filter(pk=dispatch_id).update(dead_count=F('dead_count') + count)
+    # Aynı token hem teslim edilip hem ölü görünüyorsa en son durum (ölü) geçerli sayılır
+    record_token_results(
+        ok_tokens=[token for token in delivered_tokens if token not in dead_tokens],
+        dead_tokens=dead_tokens,
+    )
+    return updated
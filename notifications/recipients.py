@@ -0,0 +1,139 @@
+"""
+Bildirim alıcılarının çözümlenmesi.
+
+Bir rol, grup veya kullanıcı id listesi tek sorguda (kullanıcı + push token
+LEFT JOIN) `Recipient(user_id, email, tokens, phone_number)` listesine çevrilir. Sonuçlar
+RECIPIENT_CACHE_SECONDS süreyle Django cache'inde tutulur. User veya
+ExpoPushToken değiştiğinde (bkz. notifications.signals) cache nesli (generation)
+artırılır ve tüm eski kayıtlar geçersiz olur.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+Recipient = namedtuple('Recipient', ['user_id', 'email', 'tokens', 'phone_number'], defaults=(None,))
+
+# Panelden gelen grup adı -> User.role
+GROUP_ROLES = {
+    'driver': 'Şoför',
+    'customer': 'Kullanıcı',
+    'manager': 'Yönetici',
+}
+
+GENERATION_KEY = 'recipients:generation'
+
+# Recipient'a giren User alanları; update_fields bunlardan birini içermiyorsa önbellek korunur
+RECIPIENT_FIELDS = {'role', 'email', 'phone_number', 'is_active'}
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def invalidate_recipients():
+    """Tüm önbelleğe alınmış alıcı listelerini geçersiz kılar."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def _scope_key(role, user_ids):
+    if user_ids is None:
+        return f'role:{role or "*"}'
+    ids = ','.join(sorted(str(user_id) for user_id in user_ids))
+    return f'role:{role or "*"}:ids:{hashlib.sha1(ids.encode()).hexdigest()}'
+
+
+def recipient_users(role=None, group=None, user_ids=None):
+    """Alıcı kümesindeki aktif kullanıcıların queryset'i."""
+    if group and not role:
+        role = GROUP_ROLES.get(group)
+    users = get_user_model().objects.filter(is_active=True)
+    if role:
+        users = users.filter(role=role)
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    return users
+
+
+def _rows(role, user_ids, after=None):
+    """(user_id, email, telefon, token) satırları; token'ı olmayan kullanıcılar için token None."""
+    users = recipient_users(role=role, user_ids=user_ids)
+    if after is not None:
+        users = users.filter(id__gt=after)
+    return users.values_list('id', 'email', 'phone_number', 'expo_push_tokens__token').order_by('id')
+
+
+def _query(role, user_ids):
+    recipients = {}
+    for user_id, email, phone_number, token in _rows(role, user_ids):
+        recipient = recipients.get(user_id)
+        if recipient is None:
+            recipient = recipients[user_id] = Recipient(user_id, email, [], phone_number)
+        if token:
+            recipient.tokens.append(token)
+    return list(recipients.values())
+
+
+def iter_recipients(role=None, group=None, user_ids=None, after=None, chunk_size=500):
+    """
+    Alıcıları id sırasıyla, bellekte tutmadan `chunk_size` kişilik listeler halinde
+    üretir (önbelleksiz; toplu gönderimler için). `after` verilirse bu id'den
+    sonraki kullanıcılardan başlanır. Bir kullanıcının token'ları parçalara bölünmez.
+    """
+    if group and not role:
+        role = GROUP_ROLES.get(group)
+    chunk = []
+    for user_id, email, phone_number, token in _rows(role, user_ids, after).iterator(chunk_size=chunk_size):
+        if not chunk or chunk[-1].user_id != user_id:
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+            chunk.append(Recipient(user_id, email, [], phone_number))
+        if token:
+            chunk[-1].tokens.append(token)
+    if chunk:
+        yield chunk
+
+
+def resolve_recipients(role=None, group=None, user_ids=None):
+    """
+    Aktif alıcıları döner. `user_ids` verilirse sadece bu kullanıcılar,
+    `group` ('driver', 'customer', 'manager') veya `role` verilirse o roldekiler,
+    hiçbiri verilmezse tüm aktif kullanıcılar.
+    """
+    if group and not role:
+        role = GROUP_ROLES.get(group)
+    if user_ids is not None:
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not user_ids:
+            return []
+
+    timeout = getattr(settings, 'RECIPIENT_CACHE_SECONDS', 30)
+    if not timeout:
+        return _query(role, user_ids)
+
+    key = f'recipients:{_generation()}:{_scope_key(role, user_ids)}'
+    recipients = cache.get(key)
+    if recipients is None:
+        recipients = _query(role, user_ids)
+        cache.set(key, recipients, timeout)
+    return recipients
+
+
+def resolve_recipient(user_id):
+    """Tek kullanıcı için Recipient (aktif değilse None)."""
+    recipients = resolve_recipients(user_ids=[user_id])
+    return recipients[0] if recipients else None
+
+
+def tokens_of(recipients):
+    return [token for recipient in recipients for token in recipient.tokens]
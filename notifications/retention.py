@@ -0,0 +1,80 @@
+"""
+Bildirim tablosu için saklama (retention) politikası.
+
+NOTIFICATION_RETENTION_DAYS günden eski ve okunmuş bildirimler (created_at, id)
+sırasıyla küçük batch'ler halinde silinir; her batch (is_read, created_at, id)
+indeksinde kaldığı yerden devam eder, tabloyu taramaz. Her batch ayrı bir kısa transaction olduğundan
+tablo uzun süre kilitlenmez. İstenirse silinen satırlar önce gzip'li JSON Lines
+dosyasına arşivlenir. Okunmamış bildirimlere dokunulmaz (rozet sayacı değişmez).
+"""
+import gzip
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'title', 'message', 'is_read', 'created_at')
+
+
+def purge_notifications(days=None, batch_size=None, archive_path=None, pause=0.0, dry_run=False, progress=None):
+    """
+    Süresi dolmuş okunmuş bildirimleri siler.
+    (silinen satır, geçen süre sn) döner. dry_run ise silinecek satır sayısını döner.
+    progress: her batch sonrası (toplam silinen, geçen süre) ile çağrılır.
+    """
+    days = days if days is not None else getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_PURGE_BATCH_SIZE', 1000)
+    cutoff = timezone.now() - timedelta(days=days)
+    # SQLite `is_read=True`'yu eşitlik değil `WHERE "is_read"` olarak yazar ve indeksin
+    # ilk sütununda arama yapamaz; `IN (1)` eşitlik sayılır, batch'ler indeksten sıralı okunur
+    expired = Notification.objects.filter(is_read__in=[True], created_at__lt=cutoff)
+
+    started = time.monotonic()
+    if dry_run:
+        return expired.count(), time.monotonic() - started
+
+    archive = gzip.open(archive_path, 'at', encoding='utf-8') if archive_path else None
+    deleted = 0
+    last = None
+    try:
+        while True:
+            batch = expired.order_by('created_at', 'id')
+            if last is not None:
+                # created_at__gte indeks aralığını daraltır, Q eşit zamanlı satırları id ile ayırır
+                batch = batch.filter(created_at__gte=last[0]).filter(Q(created_at__gt=last[0]) | Q(id__gt=last[1]))
+            if archive:
+                rows = list(batch.values(*ARCHIVE_FIELDS)[:batch_size])
+            else:
+                rows = list(batch.values('created_at', 'id')[:batch_size])
+            ids = [row['id'] for row in rows]
+            if not ids:
+                break
+
+            if archive:
+                # Önce arşivle: silme başarısız olursa satır kaybolmaz, en fazla arşivde tekrarlanır
+                for row in rows:
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+                archive.flush()
+            with transaction.atomic():
+                count, _ = Notification.objects.filter(id__in=ids).delete()
+
+            deleted += count
+            last = (rows[-1]['created_at'], rows[-1]['id'])
+            if progress:
+                progress(deleted, time.monotonic() - started)
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+    finally:
+        if archive:
+            archive.close()
+
+    return deleted, time.monotonic() - started
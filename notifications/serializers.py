@@ -6,3 +6,12 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'user', 'title', 'message', 'is_read', 'created_at']
         read_only_fields = ['user', 'created_at']
+
+class InboxItemSerializer(serializers.Serializer):
+    """Gelen kutusu satırı: kişisel bildirim veya duyuru (bkz. notifications.inbox)."""
+    id = serializers.UUIDField()
+    title = serializers.CharField(allow_null=True)
+    message = serializers.CharField(allow_null=True)
+    is_read = serializers.BooleanField(source='read')
+    type = serializers.CharField(source='kind')
+    created_at = serializers.DateTimeField()
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import ExpoPushToken
+from .models import UnreadCounter
+from .recipients import RECIPIENT_FIELDS, invalidate_recipients
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+@receiver(post_save, sender=ExpoPushToken)
+@receiver(post_delete, sender=ExpoPushToken)
+def invalidate_recipient_cache(sender, update_fields=None, **kwargs):
+    """
+    Kullanıcı veya push token değiştiğinde alıcı önbelleğini geçersiz kıl.
+    Alıcı alanlarına dokunmayan kullanıcı kayıtları (örn. last_login) önbelleği korur.
+    """
+    if sender is not ExpoPushToken and update_fields is not None and not RECIPIENT_FIELDS & set(update_fields):
+        return
+    invalidate_recipients()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_unread_counter(sender, instance, created, raw=False, **kwargs):
+    """Yeni kullanıcının sayacı 0'dan başlar; eski kullanıcılar ilk okumada hesaplanır."""
+    if created and not raw:
+        UnreadCounter.objects.get_or_create(user_id=instance.pk, defaults={'count': 0})
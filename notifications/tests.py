@@ -1,8 +1,37 @@
+import copy
+import gzip
+import json
+import smtplib
+import uuid
+import requests
+from io import StringIO
+from decimal import Decimal
+from unittest import mock
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
-from .models import Notification
+from accounts.models import ExpoPushToken
+from backend.outbound import OutboundGuard, get_guard
+from orders.models import Order
+from .dedup import first_delivery
+from .fanout import fan_out, managers
+from .inbox import broadcast
+from .campaigns import create_campaign, resumable_campaigns, run_campaign
+from .models import Campaign, DeliveryClaim, Notification, UnreadCounter, OutboxMessage, PushDispatch, PushTicket
+from .outbox import HANDLERS, enqueue_email, enqueue_push, process_outbox
+from .push import ExpoPushClient, Ticket, build_messages, poll_receipts
+from .recipients import resolve_recipient, resolve_recipients
+from .email import render_email, send_bulk_html_email
+from .retention import purge_notifications
+from .tokens import prune_dead_tokens
+from .utils import send_expo_push_notification
 import uuid
 
 User = get_user_model()
@@ -40,3 +69,649 @@ class NotificationsAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.notification.refresh_from_db()
         self.assertTrue(self.notification.is_read)
+
+
+class BroadcastInboxTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='inbox@example.com', password='password123')
+        self.driver = User.objects.create_user(email='inbox-driver@example.com', password='password123', role='Şoför')
+        Notification.objects.create(user=self.customer, title='Kişisel', message='Sadece size')
+        self.all_broadcast = broadcast('Herkese', 'Duyuru', audience='all')
+        self.driver_broadcast = broadcast('Şoförlere', 'Duyuru', audience='driver')
+        self.client.force_authenticate(user=self.customer)
+
+    def test_inbox_merges_personal_and_broadcast_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('notification_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted((item['title'], item['type']) for item in response.data),
+            [('Herkese', 'broadcast'), ('Kişisel', 'personal')],
+        )
+        inbox_queries = [q for q in ctx.captured_queries if 'notifications_' in q['sql']]
+        self.assertEqual(len(inbox_queries), 1)
+
+    def test_broadcast_read_receipts(self):
+        url = reverse('broadcast_read', kwargs={'id': self.all_broadcast.id})
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_200_OK)
+        items = {item['title']: item for item in self.client.get(reverse('notification_list')).data}
+        self.assertTrue(items['Herkese']['is_read'])
+        self.assertFalse(items['Kişisel']['is_read'])
+
+        # Başka kitleye ait duyuru okunamaz
+        url = reverse('broadcast_read', kwargs={'id': self.driver_broadcast.id})
+        self.assertEqual(self.client.post(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.driver)
+        self.client.post(reverse('mark_all_read'))
+        self.assertEqual(self.driver.broadcast_receipts.count(), 2)
+
+    def test_broadcast_can_be_marked_read_through_notification_detail(self):
+        url = reverse('notification_detail', kwargs={'id': self.all_broadcast.id})
+        response = self.client.patch(url, {'is_read': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['type'], response.data['is_read']), ('broadcast', True))
+        self.assertEqual(self.client.get(reverse('notification_unread_count')).data['unread_count'], 1)
+        self.assertTrue(self.client.get(url).data['is_read'])
+
+        self.client.patch(url, {'is_read': False})
+        self.assertFalse(self.client.get(url).data['is_read'])
+
+        url = reverse('notification_detail', kwargs={'id': self.driver_broadcast.id})
+        self.assertEqual(self.client.patch(url, {'is_read': True}).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class InboxPaginationAndUnreadCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='badge@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_cursor_walks_personal_and_broadcast_items(self):
+        Notification.objects.bulk_create(
+            [Notification(user=self.user, title=f'Bildirim {i}', message='Mesaj') for i in range(4)]
+        )
+        broadcast('Duyuru', 'Herkese', audience='all')
+
+        seen = []
+        response = self.client.get(reverse('notification_list'), {'page_size': 2})
+        while True:
+            seen.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_unread_count_follows_creates_updates_and_mark_all(self):
+        url = reverse('notification_unread_count')
+        first = Notification.objects.create(user=self.user, title='Bir', message='Mesaj')
+        Notification.objects.bulk_create([Notification(user=self.user, title='İki', message='Mesaj')])
+        fan_out(resolve_recipients(user_ids=[self.user.id]), 'Üç', 'Mesaj')
+        broadcast('Duyuru', 'Herkese')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.data['unread_count'], 4)
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "notifications_notification"' in q['sql']])
+
+        detail = reverse('notification_detail', kwargs={'id': first.id})
+        self.client.patch(detail, {'is_read': True})
+        self.assertEqual(self.client.get(url).data['unread_count'], 3)
+
+        self.client.post(reverse('mark_all_read'))
+        self.assertEqual(self.client.get(url).data['unread_count'], 0)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).count, 0)
+
+    def test_notification_arriving_during_mark_all_read_stays_unread(self):
+        Notification.objects.create(user=self.user, title='Eski', message='Mesaj')
+        add = UnreadCounter.add
+
+        def arrive_then_add(user_ids, delta):
+            # update(is_read=True) ile sayaç yazımı arasında yeni bildirim geldi
+            if delta < 0:
+                Notification.objects.create(user=self.user, title='Yeni', message='Mesaj')
+            add(user_ids, delta)
+
+        with mock.patch('notifications.views.UnreadCounter.add', side_effect=arrive_then_add):
+            self.client.post(reverse('mark_all_read'))
+        self.assertEqual(self.client.get(reverse('notification_unread_count')).data['unread_count'], 1)
+
+    def test_concurrent_read_and_delete_of_one_notification_count_once(self):
+        read_twice = Notification.objects.create(user=self.user, title='Bir', message='Mesaj')
+        deleted_twice = Notification.objects.create(user=self.user, title='İki', message='Mesaj')
+        Notification.objects.create(user=self.user, title='Üç', message='Mesaj')
+        self.assertEqual(UnreadCounter.get_count(self.user.pk), 3)
+
+        # Her istek satırı henüz okunmamışken yüklemiş gibi davranır
+        for stale in (read_twice, deleted_twice):
+            url = reverse('notification_detail', kwargs={'id': stale.id})
+            with mock.patch('notifications.views.NotificationDetailView.get_object',
+                            side_effect=lambda stale=stale: copy.copy(stale)):
+                for _ in range(2):
+                    if stale is read_twice:
+                        self.client.patch(url, {'is_read': True})
+                    else:
+                        self.client.delete(url)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).count, 1)
+        self.assertTrue(Notification.objects.get(pk=read_twice.pk).is_read)
+
+    def test_missing_counter_is_backfilled_once(self):
+        Notification.objects.create(user=self.user, title='Bir', message='Mesaj')
+        UnreadCounter.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('notification_unread_count')).data['unread_count'], 1)
+        self.assertEqual(UnreadCounter.objects.get(user=self.user).count, 1)
+
+
+class RetentionTests(TestCase):
+    def test_only_old_read_notifications_are_purged_in_batches(self):
+        user = User.objects.create_user(email='retention@example.com', password='password123')
+        Notification.objects.bulk_create(
+            [Notification(user=user, title=f'Eski {i}', is_read=i < 5) for i in range(7)]
+        )
+        Notification.objects.update(created_at=timezone.now() - timezone.timedelta(days=100))
+        Notification.objects.create(user=user, title='Yeni', is_read=True)
+
+        batches = []
+        deleted, _ = purge_notifications(days=90, batch_size=2, progress=lambda n, t: batches.append(n))
+        self.assertEqual(deleted, 5)
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual(
+            sorted(Notification.objects.values_list('title', flat=True)), ['Eski 5', 'Eski 6', 'Yeni']
+        )
+
+    def test_purge_batches_page_through_the_retention_index(self):
+        user = User.objects.create_user(email='retention-plan@example.com', password='password123')
+        Notification.objects.bulk_create([Notification(user=user, is_read=True) for _ in range(3)])
+        Notification.objects.update(created_at=timezone.now() - timezone.timedelta(days=100))
+        with CaptureQueriesContext(connection) as ctx:
+            purge_notifications(days=90, batch_size=2)
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 2)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {selects[-1]}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('notification_read_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class EmailDispatcherTests(TestCase):
+    @override_settings(EMAIL_BATCH_SIZE=2)
+    def test_bulk_mail_reuses_one_connection_and_sends_in_chunks(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        addresses = [f'user{i}@example.com' for i in range(5)]
+        with mock.patch.object(EmailBackend, 'open', autospec=True) as open_, \
+                mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=lambda self, batch: len(batch)) as send:
+            sent = send_bulk_html_email('Duyuru', 'Merhaba', addresses)
+        self.assertEqual(sent, 5)
+        self.assertEqual(open_.call_count, 1)
+        self.assertEqual([len(call.args[1]) for call in send.call_args_list], [2, 2, 1])
+        # Her alıcı sadece kendi adresini görür
+        self.assertEqual([call.args[1][0].to for call in send.call_args_list][0], ['user0@example.com'])
+
+    def test_outbox_batch_shares_one_connection(self):
+        for i in range(3):
+            enqueue_email('Konu', 'Gövde', [f'to{i}@example.com'], html='<p>Gövde</p>')
+        with mock.patch('notifications.email.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(process_outbox(), (3, 3))
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_render_email_returns_html_and_text(self):
+        html, text = render_email('emails/order_notification_email.html', {'title': 'BAŞLIK', 'order_id': 'ORD-1'})
+        self.assertIn('BAŞLIK', html)
+        self.assertNotIn('<', text)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='outbox@example.com',
+            password='password123'
+        )
+
+    def _create_order(self):
+        return Order.objects.create(
+            user=self.user,
+            pickup_address='Pickup',
+            dropoff_address='Dropoff',
+            pickup_time=timezone.now(),
+            price=Decimal('100.00'),
+            distance_km=1.0,
+            pickup_lat=41.0,
+            pickup_lng=29.0,
+            dropoff_lat=41.1,
+            dropoff_lng=29.1
+        )
+
+    def test_order_email_is_queued_not_sent_inline(self):
+        self._create_order()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.filter(channel='email', status='pending').count(), 1)
+
+        processed, succeeded = process_outbox()
+        self.assertEqual((processed, succeeded), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['outbox@example.com'])
+        self.assertEqual(OutboxMessage.objects.get().status, 'sent')
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        message = enqueue_push(['ExponentPushToken[abc]'], 'Başlık', 'Mesaj')
+        with mock.patch.dict(HANDLERS, {'push': mock.Mock(side_effect=ConnectionError('down'))}):
+            process_outbox()
+            message.refresh_from_db()
+            self.assertEqual(message.status, 'pending')
+            self.assertEqual(message.attempts, 1)
+            self.assertGreater(message.available_at, timezone.now())
+
+            # Zamanı gelmeden tekrar alınmaz
+            self.assertEqual(process_outbox(), (0, 0))
+
+            OutboxMessage.objects.filter(pk=message.pk).update(available_at=timezone.now())
+            process_outbox()
+            message.refresh_from_db()
+            self.assertEqual(message.status, 'failed')
+            self.assertEqual(message.last_error, 'down')
+
+
+class FanOutTests(TestCase):
+    def _create_manager(self, index):
+        manager = User.objects.create_user(
+            email=f'manager{index}@example.com',
+            password='password123',
+            role='Yönetici'
+        )
+        ExpoPushToken.objects.create(user=manager, token=f'ExponentPushToken[m{index}]')
+        return manager
+
+    def _fan_out_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = fan_out(managers(), 'Başlık', 'Mesaj', push=True)
+        return len(ctx.captured_queries), result
+
+    def test_query_count_is_independent_of_recipient_count(self):
+        self._create_manager(0)
+        single_count, _ = self._fan_out_queries()
+
+        for i in range(1, 6):
+            self._create_manager(i)
+        many_count, result = self._fan_out_queries()
+
+        self.assertEqual(single_count, many_count)
+        self.assertEqual(len(result.user_ids), 6)
+        self.assertEqual(len(result.tokens), 6)
+        self.assertEqual(Notification.objects.filter(title='Başlık').count(), 7)
+        push = OutboxMessage.objects.filter(channel='push').latest('id')
+        self.assertEqual(len(push.payload['tokens']), 6)
+
+    def test_inactive_managers_are_skipped(self):
+        manager = self._create_manager(0)
+        manager.is_active = False
+        manager.save()
+        result = fan_out(managers(), 'Başlık', 'Mesaj')
+        self.assertEqual(result.user_ids, [])
+        self.assertFalse(Notification.objects.exists())
+
+
+class DeduplicationTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(email='manager@example.com', password='password123', role='Yönetici')
+        ExpoPushToken.objects.create(user=self.manager, token='ExponentPushToken[m]')
+
+    def test_repeat_event_is_dropped_per_channel(self):
+        first = fan_out(managers(), 'Başlık', 'Mesaj', push=True, event=('new_order', 1), email=True)
+        second = fan_out(managers(), 'Başlık 2', 'Mesaj', push=True, event=('new_order', 1), email=True)
+        self.assertEqual(first.emails, ['manager@example.com'])
+        self.assertEqual((second.user_ids, second.emails, second.tokens), ([], [], []))
+        self.assertEqual(Notification.objects.filter(user=self.manager).count(), 1)
+        self.assertEqual(OutboxMessage.objects.filter(channel='push').count(), 1)
+
+        # Farklı sipariş ayrı olaydır
+        other = fan_out(managers(), 'Başlık', 'Mesaj', event=('new_order', 2))
+        self.assertEqual(other.user_ids, [self.manager.id])
+        self.assertTrue(first_delivery('new_order', 2, self.manager.id, 'push'))
+        self.assertFalse(first_delivery('new_order', 2, self.manager.id, 'push'))
+
+    def test_rolled_back_order_releases_its_claims(self):
+        customer = User.objects.create_user(email='rollback@example.com', password='password123')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            order = Order.objects.create(
+                user=customer, pickup_address='A', dropoff_address='B', pickup_time=timezone.now(),
+                price=Decimal('100.00'), distance_km=1.0,
+                pickup_lat=41.0, pickup_lng=29.0, dropoff_lat=41.1, dropoff_lng=29.1,
+            )
+            # Bildirim ve outbox satırları siparişle aynı transaction'da yazıldı
+            self.assertTrue(Notification.objects.filter(user=self.manager).exists())
+            self.assertFalse(first_delivery('new_order', order.id, self.manager.id, 'push'))
+            raise RuntimeError('kayıt geri alındı')
+        self.assertFalse(Notification.objects.filter(user=self.manager).exists())
+        # Aynı sipariş numarasıyla tekrar denenen kayıt bildirimini alır
+        self.assertTrue(first_delivery('new_order', order.id, self.manager.id, 'push'))
+
+    def test_expired_claim_can_be_claimed_again(self):
+        self.assertTrue(first_delivery('new_order', 4, self.manager.id, 'push'))
+        DeliveryClaim.objects.update(expires_at=timezone.now())
+        self.assertTrue(first_delivery('new_order', 4, self.manager.id, 'push'))
+        self.assertEqual(DeliveryClaim.objects.count(), 1)
+
+    @override_settings(NOTIFICATION_DEDUP_SECONDS=0)
+    def test_zero_window_disables_dedup(self):
+        fan_out(managers(), 'Başlık', 'Mesaj', event=('new_order', 3))
+        fan_out(managers(), 'Başlık', 'Mesaj', event=('new_order', 3))
+        self.assertEqual(Notification.objects.filter(user=self.manager).count(), 2)
+
+
+class StatusCoalescingTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='customer@example.com', password='password123')
+        ExpoPushToken.objects.create(user=self.customer, token='ExponentPushToken[c]')
+        self.order = Order.objects.create(
+            user=self.customer,
+            pickup_address='A',
+            dropoff_address='B',
+            pickup_time=timezone.now(),
+            price=Decimal('100.00'),
+            distance_km=1.0,
+            pickup_lat=41.0,
+            pickup_lng=29.0,
+            dropoff_lat=41.1,
+            dropoff_lng=29.1,
+        )
+
+    def _advance(self, *statuses):
+        for status_value in statuses:
+            self.order.status = status_value
+            self.order.save()
+
+    def test_rapid_status_changes_become_one_delivery(self):
+        self._advance('on_way', 'in_progress', 'completed')
+
+        pushes = OutboxMessage.objects.filter(channel='push', payload__tokens=['ExponentPushToken[c]'])
+        self.assertEqual(pushes.count(), 1)
+        push = pushes.get()
+        self.assertEqual(push.payload['data']['status'], 'completed')
+        self.assertGreater(push.available_at, timezone.now())
+
+        rows = Notification.objects.filter(user=self.customer)
+        self.assertEqual(list(rows.values_list('title', flat=True)), ['Yolculuk Tamamlandı'])
+        self.assertEqual(UnreadCounter.get_count(self.customer.pk), 1)
+
+        # Pencere dolmadan worker göndermez; dolunca tek push gider
+        with mock.patch('notifications.outbox.send_expo_push_notification') as mock_send:
+            process_outbox()
+            mock_send.assert_not_called()
+            OutboxMessage.objects.filter(pk=push.pk).update(available_at=timezone.now())
+            process_outbox()
+            mock_send.assert_called_once()
+
+    def test_read_notification_is_not_rewritten(self):
+        self._advance('on_way')
+        Notification.objects.filter(user=self.customer).update(is_read=True)
+        self._advance('in_progress')
+        self.assertEqual(Notification.objects.filter(user=self.customer).count(), 2)
+
+    @override_settings(NOTIFICATION_COALESCE_SECONDS=0)
+    def test_zero_window_sends_each_step_immediately(self):
+        self._advance('on_way', 'in_progress')
+        pushes = OutboxMessage.objects.filter(channel='push', payload__tokens=['ExponentPushToken[c]'])
+        self.assertEqual(pushes.count(), 2)
+        self.assertFalse(pushes.filter(available_at__gt=timezone.now()).exists())
+
+
+class RecipientResolutionTests(TestCase):
+    def setUp(self):
+        self.driver = User.objects.create_user(email='driver@example.com', password='password123', role='Şoför')
+        ExpoPushToken.objects.create(user=self.driver, token='ExponentPushToken[d1]')
+        ExpoPushToken.objects.create(user=self.driver, token='ExponentPushToken[d2]')
+        self.customer = User.objects.create_user(email='customer@example.com', password='password123')
+
+    def test_single_query_then_cached_until_tokens_change(self):
+        with CaptureQueriesContext(connection) as ctx:
+            recipients = resolve_recipients(group='driver')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(len(recipients), 1)
+        self.assertEqual(sorted(recipients[0].tokens), ['ExponentPushToken[d1]', 'ExponentPushToken[d2]'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            resolve_recipients(group='driver')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        ExpoPushToken.objects.filter(token='ExponentPushToken[d1]').delete()
+        self.assertEqual(resolve_recipient(self.driver.id).tokens, ['ExponentPushToken[d2]'])
+        self.assertEqual(resolve_recipients(group='driver')[0].tokens, ['ExponentPushToken[d2]'])
+
+    def test_customer_group_and_user_ids(self):
+        self.assertEqual([r.user_id for r in resolve_recipients(group='customer')], [self.customer.id])
+        self.assertEqual(resolve_recipient(self.customer.id).tokens, [])
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertIsNone(resolve_recipient(self.customer.id))
+
+    def test_saves_that_do_not_touch_recipient_fields_keep_the_cache(self):
+        resolve_recipients(group='driver')
+        self.driver.save(update_fields=['last_login'])
+        with CaptureQueriesContext(connection) as ctx:
+            resolve_recipients(group='driver')
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        self.driver.is_active = False
+        self.driver.save(update_fields=['is_active'])
+        self.assertEqual(resolve_recipients(group='driver'), [])
+
+
+class CampaignTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            driver = User.objects.create_user(email=f'campaign{i}@example.com', password='password123', role='Şoför')
+            ExpoPushToken.objects.create(user=driver, token=f'ExponentPushToken[c{i}]')
+        self.sent_tokens = []
+        patcher = mock.patch('notifications.campaigns.send_expo_push_notification', side_effect=self._fake_push)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fake_push(self, tokens, title, message, **kwargs):
+        self.sent_tokens.extend(tokens)
+        return [Ticket(token, 'ok', f'id-{token}', None, None) for token in tokens]
+
+    def test_campaign_is_sent_in_chunks(self):
+        campaign = create_campaign(None, 'Duyuru', 'Merhaba', ['email', 'push'], group='driver')
+        self.assertEqual(campaign.total_recipients, 5)
+
+        campaign = run_campaign(campaign.pk, chunk_size=2)
+        self.assertEqual(campaign.status, 'completed')
+        self.assertEqual((campaign.processed_count, campaign.emails_sent, campaign.pushes_sent), (5, 5, 5))
+        self.assertEqual(campaign.progress, 100.0)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertTrue(all(len(message.to) == 1 for message in mail.outbox))
+        self.assertEqual(len(self.sent_tokens), 5)
+
+    def test_failed_campaign_resumes_from_checkpoint(self):
+        campaign = create_campaign(None, 'Duyuru', 'Merhaba', ['push'], group='driver')
+        calls = []
+
+        def crash_on_second_chunk(tokens, title, message, **kwargs):
+            calls.append(tokens)
+            if len(calls) == 2:
+                raise RuntimeError('bağlantı koptu')
+            return self._fake_push(tokens, title, message)
+
+        with mock.patch('notifications.campaigns.send_expo_push_notification', side_effect=crash_on_second_chunk):
+            campaign = run_campaign(campaign.pk, chunk_size=2)
+        self.assertEqual(campaign.status, 'failed')
+        self.assertEqual(campaign.processed_count, 2)
+        self.assertIsNone(run_campaign(campaign.pk, chunk_size=2))
+
+        campaign = run_campaign(campaign.pk, chunk_size=2, include_failed=True)
+        self.assertEqual(campaign.status, 'completed')
+        self.assertEqual(campaign.processed_count, 5)
+        # İlk parça tekrar gönderilmedi
+        self.assertEqual(len(self.sent_tokens), 5)
+        self.assertEqual(len(set(self.sent_tokens)), 5)
+
+    @override_settings(SMS_BATCH_SIZE=2)
+    def test_sms_channel_sends_multi_recipient_batches(self):
+        phones = ['0555 000 00 00', '+905550000000', '5550000001', '(555) 000-0002', '']
+        # Aynı numara farklı biçimlerde iki kullanıcıda (eski, tekilleştirilmemiş veri)
+        for user, phone in zip(User.objects.filter(role='Şoför').order_by('id'), phones):
+            User.objects.filter(pk=user.pk).update(phone_number=phone)
+        campaign = create_campaign(None, 'Duyuru', 'Merhaba', ['sms'], group='driver')
+
+        with mock.patch('accounts.utils._submit', return_value=True) as mock_submit:
+            campaign = run_campaign(campaign.pk)
+        # Numaralar bir kez normalize edilir; aynı numara tek sefer, 2'lik partiler
+        self.assertEqual(
+            [call.args[0] for call in mock_submit.call_args_list],
+            [['905550000000', '905550000001'], ['905550000002']],
+        )
+        self.assertEqual(campaign.sms_sent, 3)
+        self.assertEqual(self.sent_tokens, [])
+
+    def test_channel_failure_does_not_advance_checkpoint(self):
+        campaign = create_campaign(None, 'Duyuru', 'Merhaba', ['email'], group='driver')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=smtplib.SMTPServerDisconnected('bağlantı koptu')):
+            campaign = run_campaign(campaign.pk, chunk_size=2)
+        self.assertEqual(campaign.status, 'failed')
+        self.assertEqual((campaign.processed_count, campaign.emails_sent), (0, 0))
+        self.assertIsNone(campaign.last_user_id)
+        self.assertIn('bağlantı koptu', campaign.last_error)
+
+    @override_settings(SMS_BATCH_SIZE=2)
+    def test_rejected_sms_batch_fails_the_chunk(self):
+        campaign = create_campaign(None, 'Duyuru', 'Merhaba', ['sms'], group='driver')
+        for i, user in enumerate(User.objects.filter(role='Şoför')):
+            User.objects.filter(pk=user.pk).update(phone_number=f'555000000{i}')
+        with mock.patch('accounts.utils._submit', side_effect=[True, False]) as mock_submit, \
+                mock.patch('accounts.utils.get_guard', wraps=get_guard) as mock_guard:
+            campaign = run_campaign(campaign.pk, chunk_size=5)
+        self.assertEqual(mock_submit.call_count, 2)
+        self.assertEqual({call.args[0] for call in mock_guard.call_args_list}, {'sms_bulk'})
+        self.assertEqual(campaign.status, 'failed')
+        self.assertEqual((campaign.processed_count, campaign.sms_sent), (0, 0))
+        self.assertIsNone(campaign.last_user_id)
+
+    def test_worker_stops_when_campaign_is_taken_over(self):
+        campaign = create_campaign(None, 'Duyuru', 'Merhaba', ['push'], group='driver')
+        new_owner = uuid.uuid4()
+
+        def taken_over(tokens, title, message, **kwargs):
+            # Gönderim sürerken başka bir worker kampanyayı devraldı
+            Campaign.objects.filter(pk=campaign.pk).update(lease_token=new_owner)
+            return self._fake_push(tokens, title, message)
+
+        with mock.patch('notifications.campaigns.send_expo_push_notification', side_effect=taken_over):
+            result = run_campaign(campaign.pk, chunk_size=2)
+        self.assertEqual(len(self.sent_tokens), 2)
+        self.assertEqual((result.status, result.lease_token, result.processed_count), ('running', new_owner, 0))
+
+    def test_stale_running_campaign_is_resumable(self):
+        campaign = create_campaign(None, 'Duyuru', 'Merhaba', ['push'], group='driver')
+        Campaign.objects.filter(pk=campaign.pk).update(status='running', updated_at=timezone.now())
+        self.assertNotIn(campaign, resumable_campaigns())
+        Campaign.objects.filter(pk=campaign.pk).update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertIn(campaign, resumable_campaigns())
+
+
+class ExpoPushClientTests(TestCase):
+    def _fake_post(self, url, data=None, headers=None, timeout=None):
+        if headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        body = json.loads(data)
+        self.requests.append((url, headers, body))
+        response = mock.Mock(status_code=200)
+        response.raise_for_status.return_value = None
+        if url.endswith('/getReceipts'):
+            response.json.return_value = {'data': {
+                ticket_id: ({'status': 'ok'} if ticket_id != 'ticket-1' else
+                            {'status': 'error', 'details': {'error': 'DeviceNotRegistered'}})
+                for ticket_id in body['ids']
+            }}
+        else:
+            response.json.return_value = {'data': [
+                {'status': 'ok', 'id': f"ticket-{message['to'][18:-1]}"} for message in body
+            ]}
+        return response
+
+    def setUp(self):
+        self.requests = []
+        self.client_ = ExpoPushClient(base_url='http://expo.test/push', max_workers=4, timeout=5, gzip_threshold=1024)
+        patcher = mock.patch.object(self.client_.session, 'post', side_effect=self._fake_post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for target in ('notifications.push.get_push_client', 'notifications.utils.get_push_client'):
+            client_patcher = mock.patch(target, return_value=self.client_)
+            client_patcher.start()
+            self.addCleanup(client_patcher.stop)
+
+    def test_send_chunks_concurrently_and_returns_tickets_in_order(self):
+        tokens = [f'ExponentPushToken[{i}]' for i in range(250)]
+        messages = build_messages(tokens, 'Başlık', 'Mesaj')
+        tickets, failed = self.client_.send(messages)
+
+        self.assertEqual(failed, [])
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual([t.token for t in tickets], tokens)
+        self.assertTrue(all(t.status == 'ok' for t in tickets))
+        # 100 mesajlık gövde eşik üstünde olduğu için gzip'lenmiş olmalı
+        self.assertEqual(self.requests[0][1].get('Content-Encoding'), 'gzip')
+
+    def test_open_circuit_fails_fast_without_calling_expo(self):
+        guard = OutboundGuard('test-expo', rate=1000, burst=1000, failure_threshold=2, reset_timeout=60)
+        patcher = mock.patch('notifications.push.get_guard', return_value=guard)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client_.session.post.side_effect = requests.ConnectionError('expo kapalı')
+
+        messages = build_messages(['ExponentPushToken[0]'], 'Başlık', 'Mesaj')
+        for _ in range(2):
+            self.client_.send(messages)
+        self.assertEqual(self.client_.session.post.call_count, 2)
+
+        tickets, failed = self.client_.send(messages)
+        self.assertEqual(self.client_.session.post.call_count, 2)
+        self.assertEqual(failed, ['ExponentPushToken[0]'])
+        self.assertEqual(tickets[0].error, 'RequestFailed')
+
+    def test_receipts_are_polled_in_batches(self):
+        tokens = [f'ExponentPushToken[{i}]' for i in range(3)]
+        tickets = send_expo_push_notification(tokens, 'Başlık', 'Mesaj')
+        self.assertEqual(PushTicket.objects.count(), 3)
+
+        updated = poll_receipts(min_age_seconds=0)
+        self.assertEqual(len(updated), 3)
+        self.assertEqual(len([r for r in self.requests if r[0].endswith('/getReceipts')]), 1)
+        failed = PushTicket.objects.get(ticket_id='ticket-1')
+        self.assertEqual(failed.receipt_status, 'error')
+        self.assertEqual(failed.receipt_error, 'DeviceNotRegistered')
+        self.assertEqual(len(tickets), 3)
+
+    @override_settings(PUSH_TOKEN_MAX_FAILURES=2)
+    def test_dead_tokens_are_counted_and_pruned(self):
+        user = User.objects.create_user(email='device@example.com', password='password123')
+        tokens = [f'ExponentPushToken[{i}]' for i in range(3)]
+        for token in tokens:
+            ExpoPushToken.objects.create(user=user, token=token)
+        # Daha önce bir kez ölü görünmüş token'lar
+        ExpoPushToken.objects.filter(token__in=[tokens[0], tokens[1]]).update(failure_count=1)
+        ExpoPushToken.objects.create(user=user, token='bozuk-token')
+
+        send_expo_push_notification(tokens + ['bozuk-token'], 'Kampanya', 'Mesaj')
+        dispatch = PushDispatch.objects.get()
+        self.assertEqual((dispatch.token_count, dispatch.ok_count, dispatch.dead_count), (4, 3, 1))
+        self.assertEqual(ExpoPushToken.objects.get(token='bozuk-token').last_error, 'InvalidToken')
+
+        poll_receipts(min_age_seconds=0)
+        dispatch.refresh_from_db()
+        self.assertEqual(dispatch.dead_count, 2)
+        # ticket-1 ikinci kez DeviceNotRegistered aldı ve silindi; başarılı teslimat sayacı sıfırlar
+        self.assertFalse(ExpoPushToken.objects.filter(token=tokens[1]).exists())
+        self.assertEqual(ExpoPushToken.objects.get(token=tokens[0]).failure_count, 0)
+        self.assertEqual(ExpoPushToken.objects.get(token='bozuk-token').failure_count, 1)
+
+        self.assertEqual(prune_dead_tokens(threshold=1, dry_run=True)['ExpoPushToken'], 1)
+        self.assertEqual(prune_dead_tokens(threshold=1)['ExpoPushToken'], 1)
+        self.assertEqual(ExpoPushToken.objects.count(), 2)
+
+        out = StringIO()
+        call_command('push_waste_report', stdout=out)
+        self.assertIn('2 ölü token (%50.0)', out.getvalue())
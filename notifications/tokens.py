@@ -0,0 +1,93 @@
+"""
+Ölü push token takibi.
+
+Expo bir token için `DeviceNotRegistered` (uygulama kaldırılmış) ya da geçersiz
+token hatası döndürdüğünde, token'ın ExpoPushToken / PushToken satırlarındaki
+`failure_count` artırılır. Başarılı bir teslimatta sayaç sıfırlanır. Art arda
+PUSH_TOKEN_MAX_FAILURES kez başarısız olan token'lar toplu olarak silinir;
+cihaz uygulamayı tekrar açtığında token'ını yeniden kaydeder.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import ExpoPushToken, PushToken
+
+logger = logging.getLogger(__name__)
+
+# Token'ın artık kullanılamayacağını gösteren Expo hata kodları
+DEAD_TOKEN_ERRORS = frozenset({'DeviceNotRegistered', 'InvalidToken'})
+# Expo formatına uymayan token'lar gönderilmeden bu hata ile işaretlenir
+INVALID_TOKEN_ERROR = 'InvalidToken'
+
+TOKEN_MODELS = (ExpoPushToken, PushToken)
+
+
+def is_dead_token_error(error):
+    return error in DEAD_TOKEN_ERRORS
+
+
+def max_failures():
+    return getattr(settings, 'PUSH_TOKEN_MAX_FAILURES', 2)
+
+
+def record_token_results(ok_tokens=(), dead_tokens=None):
+    """
+    ok_tokens: teslim edilen token'lar (sayaçları sıfırlanır)
+    dead_tokens: token -> hata kodu sözlüğü (sayaçları artırılır)
+    Eşiği aşan token'lar hemen silinir; silinen satır sayısını döner.
+    """
+    ok_tokens = [token for token in ok_tokens if token]
+    dead_tokens = dead_tokens or {}
+
+    by_error = defaultdict(list)
+    for token, error in dead_tokens.items():
+        by_error[error].append(token)
+
+    now = timezone.now()
+    for model in TOKEN_MODELS:
+        if ok_tokens:
+            model.objects.filter(token__in=ok_tokens, failure_count__gt=0).update(failure_count=0)
+        for error, tokens in by_error.items():
+            model.objects.filter(token__in=tokens).update(
+                failure_count=F('failure_count') + 1,
+                last_failure_at=now,
+                last_error=error[:100],
+            )
+
+    if not dead_tokens:
+        return 0
+    threshold = max_failures()
+    deleted = 0
+    for model in TOKEN_MODELS:
+        count, _ = model.objects.filter(token__in=list(dead_tokens), failure_count__gte=threshold).delete()
+        deleted += count
+    if deleted:
+        logger.info(f"{deleted} ölü push token silindi (eşik: {threshold})")
+    return deleted
+
+
+def prune_dead_tokens(threshold=None, batch_size=500, dry_run=False):
+    """
+    Eşiği aşan tüm token'ları id sırasıyla batch'ler halinde siler.
+    Model adı -> silinen (dry_run ise silinecek) satır sayısı sözlüğü döner.
+    """
+    threshold = threshold or max_failures()
+    result = {}
+    for model in TOKEN_MODELS:
+        queryset = model.objects.filter(failure_count__gte=threshold)
+        if dry_run:
+            result[model.__name__] = queryset.count()
+            continue
+        deleted = 0
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            count, _ = model.objects.filter(pk__in=ids).delete()
+            deleted += count
+        result[model.__name__] = deleted
+    return result
@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import NotificationListView, NotificationDetailView, MarkAllReadView, UpdatePushTokenView
+from .views import NotificationListView, NotificationDetailView, MarkAllReadView, UpdatePushTokenView, BroadcastReadView, UnreadCountView
 
 urlpatterns = [
     path('notifications/', NotificationListView.as_view(), name='notification_list'),
     path('notifications/<uuid:id>/', NotificationDetailView.as_view(), name='notification_detail'),
+    path('notifications/unread-count/', UnreadCountView.as_view(), name='notification_unread_count'),
     path('notifications/mark-all-read/', MarkAllReadView.as_view(), name='mark_all_read'),
+    path('notifications/broadcasts/<uuid:id>/read/', BroadcastReadView.as_view(), name='broadcast_read'),
     path('notifications/update-push-token/', UpdatePushTokenView.as_view(), name='update_push_token'),
 ]
@@ -1,19 +1,39 @@
-from rest_framework import generics, permissions, status
+from django.db import transaction
+from django.http import Http404
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Notification
-from .serializers import NotificationSerializer
+from backend.pagination import KeysetPagination
+from .inbox import broadcast_items, broadcasts_for, inbox, mark_broadcasts_read, unread_count
+from .models import BroadcastReceipt, Notification, UnreadCounter
+from .serializers import InboxItemSerializer, NotificationSerializer
 from accounts.models import ExpoPushToken
 
 class NotificationListView(generics.ListAPIView):
-    serializer_class = NotificationSerializer
+    serializer_class = InboxItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        # Kullanıcıya ait bildirimleri, en yeniden eskiye sıralı getir
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        # Kişisel bildirimler ve kullanıcının kitlesine gönderilen duyurular, en yeniden eskiye
+        return inbox(self.request.user)
+
+    def get_keyset_queryset(self, after):
+        return inbox(self.request.user, after=after)
+
+class UnreadCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        # Bildirim tablosu taranmaz; sayaç tablosundan okunur
+        return Response({"unread_count": unread_count(request.user)}, status=status.HTTP_200_OK)
 
 class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Kişisel bildirim detayı. Gelen kutusu duyuruları da listelediğinden eski
+    istemciler duyuru id'siyle de okur/okundu işaretler; id kullanıcının
+    kitlesindeki bir duyuruya aitse okunma bilgisi BroadcastReceipt üzerinden tutulur.
+    """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'id'
@@ -22,18 +42,82 @@ class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Sadece kullanıcının kendi bildirimlerine erişmesine izin ver
         return Notification.objects.filter(user=self.request.user)
 
+    def _broadcast_item(self):
+        return broadcast_items(self.request.user).filter(id=self.kwargs['id']).first()
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            item = self._broadcast_item()
+            if item is None:
+                raise
+            return Response(InboxItemSerializer(item).data)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except Http404:
+            item = self._broadcast_item()
+            if item is None:
+                raise
+        if 'is_read' in request.data:
+            is_read = serializers.BooleanField().to_internal_value(request.data['is_read'])
+            if is_read:
+                mark_broadcasts_read(request.user, broadcast_ids=[item['id']])
+            else:
+                BroadcastReceipt.objects.filter(broadcast_id=item['id'], user=request.user).delete()
+        return Response(InboxItemSerializer(self._broadcast_item()).data)
+
     def perform_update(self, serializer):
-        # Güncelleme sırasında is_read gibi alanlar güncellenebilir
-        serializer.save()
+        # Güncelleme sırasında is_read gibi alanlar güncellenebilir. is_read koşullu
+        # update ile değişir ve sayaç yalnızca gerçekten değişen satır için güncellenir:
+        # aynı bildirime eşzamanlı iki PATCH sayacı iki kez azaltmaz
+        notification = serializer.instance
+        fields = dict(serializer.validated_data)
+        is_read = fields.pop('is_read', None)
+        with transaction.atomic():
+            if fields:
+                for name, value in fields.items():
+                    setattr(notification, name, value)
+                notification.save(update_fields=list(fields))
+            if is_read is not None:
+                changed = Notification.objects.filter(pk=notification.pk, is_read=not is_read).update(is_read=is_read)
+                if changed:
+                    UnreadCounter.add([notification.user_id], -1 if is_read else 1)
+                notification.is_read = is_read
+
+    def perform_destroy(self, instance):
+        # Sayaç, silinen satırın silindiği andaki durumuna göre azaltılır
+        with transaction.atomic():
+            _, deleted = Notification.objects.filter(pk=instance.pk, is_read=False).delete()
+            if deleted.get(Notification._meta.label):
+                UnreadCounter.add([instance.user_id], -1)
+            else:
+                Notification.objects.filter(pk=instance.pk).delete()
 
 class MarkAllReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        # Kullanıcının tüm okunmamış bildirimlerini okundu olarak işaretle
-        updated_count = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        # Kullanıcının tüm okunmamış bildirimlerini okundu olarak işaretle. Sayaç sıfırlanmaz,
+        # işaretlenen satır sayısı kadar azaltılır: arada eklenen yeni bildirimin +1'i kaybolmaz
+        with transaction.atomic():
+            updated_count = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+            UnreadCounter.add([request.user.pk], -updated_count)
+        updated_count += mark_broadcasts_read(request.user)
         return Response({"message": f"{updated_count} notifications marked as read."}, status=status.HTTP_200_OK)
 
+class BroadcastReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, id):
+        # Duyuru kullanıcının kitlesinde değilse 404
+        if not broadcasts_for(request.user).filter(id=id).exists():
+            return Response({"error": "Broadcast not found"}, status=status.HTTP_404_NOT_FOUND)
+        mark_broadcasts_read(request.user, broadcast_ids=[id])
+        return Response({"message": "Broadcast marked as read."}, status=status.HTTP_200_OK)
+
 class UpdatePushTokenView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -1,63 +1,32 @@
-import requests
-import json
+from notifications.push import build_messages, get_push_client, is_expo_token, record_tickets
 
 def send_to_tokens(tokens, title, body, data=None):
     """
     Sends notifications using Expo Push API.
+    Uses the shared pooled Expo client (notifications.push).
     """
     if not tokens:
         return {"success": 0, "failure": 0}
 
     # Filter for valid Expo push tokens
-    expo_tokens = [t for t in tokens if t.startswith('ExponentPushToken') or t.startswith('ExpoPushToken')]
+    expo_tokens = [t for t in tokens if is_expo_token(t)]
+    invalid_tokens = [t for t in tokens if t and not is_expo_token(t)]
     
     if not expo_tokens:
+        if invalid_tokens:
+            record_tickets([], title=title, invalid_tokens=invalid_tokens)
         return {"success": 0, "failure": len(tokens), "error": "no_valid_expo_tokens"}
 
-    url = "https://exp.host/--/api/v2/push/send"
-    headers = {
-        "host": "exp.host",
-        "accept": "application/json",
-        "accept-encoding": "gzip, deflate",
-        "content-type": "application/json"
-    }
-
-    # Expo supports batch sending (up to 100 at a time)
-    # For simplicity, we'll send in one batch if small, or you can loop.
-    # Here we construct the payload for each token or a broadcast style.
-    # Expo API allows an array of messages.
-    
-    messages = []
-    for token in expo_tokens:
-        messages.append({
-            "to": token,
-            "sound": "default",
-            "title": title,
-            "body": body,
-            "data": data or {}
-        })
+    messages = build_messages(expo_tokens, title, body, data=data)
 
     try:
-        # We can send up to 100 messages per request.
-        # Simple chunking for safety
-        chunk_size = 100
-        success_count = 0
-        failure_count = 0
-        
-        for i in range(0, len(messages), chunk_size):
-            chunk = messages[i:i + chunk_size]
-            response = requests.post(url, headers=headers, json=chunk)
-            response.raise_for_status()
-            res_data = response.json()
-            
-            if 'data' in res_data:
-                for item in res_data['data']:
-                    if item['status'] == 'ok':
-                        success_count += 1
-                    else:
-                        failure_count += 1
-            
-        return {"success": success_count, "failure": failure_count}
-
+        tickets, failed_tokens = get_push_client().send(messages)
+        record_tickets(tickets, title=title, invalid_tokens=invalid_tokens)
     except Exception as e:
         return {"success": 0, "failure": len(expo_tokens), "error": str(e)}
+
+    success_count = sum(1 for t in tickets if t.status == 'ok')
+    result = {"success": success_count, "failure": len(tickets) - success_count}
+    if failed_tokens:
+        result["error"] = f"{len(failed_tokens)} tokens could not be sent"
+    return result
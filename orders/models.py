@@ -1,7 +1,45 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Prefetch
 from django.conf import settings
 import uuid
 from services.models import Service, Vehicle
+from .sequences import next_order_id, next_order_ids
+
+
+class OrderSequence(models.Model):
+    """
+    Sipariş numarası sayacı. `last_value` dağıtılmış en son numarayı tutar.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+
+class OrderQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # Toplu kayıtta id'si olmayan siparişlere tek seferde numara bloğu ayır
+        objs = list(objs)
+        missing = [obj for obj in objs if not obj.id]
+        for obj, order_id in zip(missing, next_order_ids(len(missing))):
+            obj.id = order_id
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def for_serializer(self):
+        """
+        OrderSerializer'ın okuduğu tüm ilişkileri tek seferde yükler.
+        Liste boyutundan bağımsız olarak sabit sayıda sorgu çalışır.
+        """
+        return self.select_related('user', 'driver', 'service', 'vehicle').prefetch_related(
+            Prefetch('stops', queryset=OrderStop.objects.order_by('order_index')),
+            Prefetch('handover_photos', queryset=VehicleHandoverPhoto.objects.order_by('created_at')),
+        ).annotate(
+            has_open_emergency=Exists(
+                EmergencyAlert.objects.filter(order=OuterRef('pk'), is_resolved=False)
+            )
+        )
+
 
 # Create your models here.
 class Order(models.Model):
@@ -51,24 +89,58 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        # Keyset sayfalama (created_at, id) için composite index'ler
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['driver', '-created_at', '-id'], name='order_driver_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ]
+
+    # Sinyallerin önceki değerle karşılaştırdığı alanlar
+    TRACKED_FIELDS = ('status', 'driver_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_loaded_values()
+        return instance
+
+    def _snapshot_loaded_values(self):
+        """Veritabanından gelen (veya son kaydedilen) takip edilen alan değerlerini saklar."""
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            field: getattr(self, field) for field in self.TRACKED_FIELDS if field not in deferred
+        }
+
+    def get_loaded_values(self):
+        """
+        Takip edilen alanların yüklendiği andaki değerleri.
+        Nesne veritabanından yüklenmemişse veya alan ertelenmişse (only/defer) None döner.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or any(field not in loaded for field in self.TRACKED_FIELDS):
+            return None
+        return loaded
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot_loaded_values()
+
     def save(self, *args, **kwargs):
         if not self.id:
-            last_order = Order.objects.order_by('-created_at').first()
-            if last_order and last_order.id.startswith('ORD-'):
-                try:
-                    last_id_num = int(last_order.id.split('-')[1])
-                    new_id_num = last_id_num + 1
-                except ValueError:
-                    new_id_num = 1000
-            else:
-                new_id_num = 1000
-            self.id = f"ORD-{new_id_num}"
+            self.id = next_order_id()
         
         # Eğer araç seçildiyse ve plaka girilmediyse veya farklıysa, plakayı güncelle
         if self.vehicle:
             self.license_plate = self.vehicle.plate
-            
-        super().save(*args, **kwargs)
+
+        # Sinyallerin outbox'a yazdığı bildirimler siparişle aynı transaction'da commit edilir
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        self._snapshot_loaded_values()
 
     def __str__(self):
         return f"{self.id} - {self.user.email}"
@@ -95,6 +167,11 @@ class EmergencyAlert(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_resolved = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        # Sinyalin outbox'a yazdığı acil durum maili alarmla aynı transaction'da commit edilir
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Emergency: {self.order.id} - {self.user.email}"
 
@@ -0,0 +1,136 @@
+"""
+Sipariş numaraları (ORD-n) için sayaç tablosu tabanlı ayırıcı.
+
+Her yeni sipariş için "son sipariş + 1" taraması yapmak yerine `OrderSequence`
+tablosundaki sayaç atomik olarak artırılır. Her süreç sayaçtan bir blok
+(ORDER_ID_BLOCK_SIZE adet numara) ayırır ve blok bitene kadar veritabanına
+gitmeden numara dağıtır.
+"""
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+ORDER_ID_PREFIX = 'ORD-'
+ORDER_ID_START = 1000
+ORDER_SEQUENCE_NAME = 'order'
+
+
+def format_order_id(number):
+    return f"{ORDER_ID_PREFIX}{number}"
+
+
+def _max_existing_order_number():
+    """Sayaç satırı ilk kez oluşturulurken mevcut en büyük ORD-n değerini bulur."""
+    from .models import Order
+
+    max_number = None
+    ids = Order.objects.filter(id__startswith=ORDER_ID_PREFIX).values_list('id', flat=True)
+    for order_id in ids.iterator(chunk_size=2000):
+        try:
+            number = int(order_id[len(ORDER_ID_PREFIX):])
+        except ValueError:
+            continue
+        if max_number is None or number > max_number:
+            max_number = number
+    return max_number
+
+
+class SequenceAllocator:
+    """
+    Süreç içi blok önbellekli sayaç.
+
+    Blok, onu ayıran transaction commit edildikten sonra önbelleğe alınır.
+    Böylece dıştaki bir transaction geri alınırsa (sayaç da geri döner) aynı
+    numaralar bu süreçte tekrar dağıtılmaz.
+    """
+
+    def __init__(self, name, start, block_size=None):
+        self.name = name
+        self.start = start
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._ranges = deque()
+
+    @property
+    def block_size(self):
+        if self._block_size is not None:
+            return self._block_size
+        return max(1, getattr(settings, 'ORDER_ID_BLOCK_SIZE', 1))
+
+    def next_value(self):
+        with self._lock:
+            if self._ranges:
+                return self._take_cached()
+        first, last = self._reserve(self.block_size)
+        if last > first:
+            transaction.on_commit(lambda: self._stash(first + 1, last))
+        return first
+
+    def next_values(self, count):
+        """Toplu kayıtlar için ardışık `count` adet numara ayırır."""
+        if count <= 0:
+            return []
+        first, last = self._reserve(count)
+        return list(range(first, last + 1))
+
+    def reset(self):
+        """Süreç içi önbelleği temizler (testler ve benchmark için)."""
+        with self._lock:
+            self._ranges.clear()
+
+    def _take_cached(self):
+        first, last = self._ranges[0]
+        if first == last:
+            self._ranges.popleft()
+        else:
+            self._ranges[0] = (first + 1, last)
+        return first
+
+    def _stash(self, first, last):
+        with self._lock:
+            self._ranges.append((first, last))
+
+    def _reserve(self, count):
+        from .models import OrderSequence
+
+        for _ in range(3):
+            # Önce UPDATE: satır kilidi (SQLite'ta yazma kilidi) alınır,
+            # ardından okunan değer bu transaction'a aittir.
+            with transaction.atomic():
+                updated = OrderSequence.objects.filter(name=self.name).update(
+                    last_value=F('last_value') + count
+                )
+                if updated:
+                    last = OrderSequence.objects.filter(name=self.name).values_list(
+                        'last_value', flat=True
+                    ).get()
+                    return last - count + 1, last
+            self._create_row()
+        raise RuntimeError(f"'{self.name}' sayacı oluşturulamadı.")
+
+    def _create_row(self):
+        from .models import OrderSequence
+
+        seed = _max_existing_order_number()
+        if seed is None:
+            seed = self.start - 1
+        try:
+            with transaction.atomic():
+                OrderSequence.objects.create(name=self.name, last_value=seed)
+        except IntegrityError:
+            # Başka bir süreç aynı anda oluşturdu
+            pass
+
+
+order_id_allocator = SequenceAllocator(ORDER_SEQUENCE_NAME, ORDER_ID_START)
+
+
+def next_order_id():
+    return format_order_id(order_id_allocator.next_value())
+
+
+def next_order_ids(count):
+    return [format_order_id(n) for n in order_id_allocator.next_values(count)]
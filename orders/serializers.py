@@ -115,6 +115,9 @@ class OrderSerializer(serializers.ModelSerializer):
         return obj.pickup_time.strftime('%H:%M') if obj.pickup_time else ""
 
     def get_has_active_emergency(self, obj):
+        # Order.objects.for_serializer() ile gelen anotasyonu kullan
+        if hasattr(obj, 'has_open_emergency'):
+            return obj.has_open_emergency
         return obj.emergency_alerts.filter(is_resolved=False).exists()
 
     def get_show_price(self, obj):
@@ -1,37 +1,56 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.conf import settings
 from .models import EmergencyAlert, Order
 from django.contrib.auth import get_user_model
-from notifications.utils import send_expo_push_notification
-from accounts.models import ExpoPushToken
-from notifications.models import Notification
+from notifications.fanout import fan_out, managers
+from notifications.coalesce import order_status_key
+from notifications.email import render_email
+from notifications.outbox import enqueue_email
+from notifications.recipients import resolve_recipients
 User = get_user_model()
 
+
+def notify_user(user_id, title, message, data, event=None, coalesce_key=''):
+    """
+    Tek kullanıcıya uygulama içi bildirim + push (alıcı ve token'lar önbellekten çözülür).
+    event=(olay_tipi, sipariş_id) verilirse aynı olayın tekrar teslimatı düşürülür (bkz. notifications.dedup).
+    coalesce_key verilirse pencere içindeki durum olayları tek bildirimde birleşir (bkz. notifications.coalesce).
+    """
+    return fan_out(
+        resolve_recipients(user_ids=[user_id]), title, message, push=True, data=data,
+        event=event, coalesce_key=coalesce_key,
+    )
+
 @receiver(pre_save, sender=Order)
 def order_pre_save(sender, instance, **kwargs):
     """
-    Sipariş kaydedilmeden önce eski durumunu kontrol et
+    Sipariş kaydedilmeden önce eski durumunu kontrol et.
+    Önceki değerler, nesne veritabanından yüklenirken alınan anlık görüntüden okunur;
+    sadece veritabanından yüklenmemiş nesneler için sorgu atılır.
     """
-    if instance.pk:
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            instance._old_status = old_instance.status
-            instance._old_driver_id = old_instance.driver_id
-        except Order.DoesNotExist:
-            instance._old_status = None
-            instance._old_driver_id = None
-    else:
-        instance._old_status = None
-        instance._old_driver_id = None
+    instance._old_status = None
+    instance._old_driver_id = None
+    if not instance.pk or instance._state.adding:
+        return
+
+    loaded = instance.get_loaded_values()
+    if loaded is not None:
+        instance._old_status = loaded['status']
+        instance._old_driver_id = loaded['driver_id']
+        return
+
+    old_values = Order.objects.filter(pk=instance.pk).values('status', 'driver_id').first()
+    if old_values:
+        instance._old_status = old_values['status']
+        instance._old_driver_id = old_values['driver_id']
 
 @receiver(post_save, sender=Order)
 def order_post_save(sender, instance, created, **kwargs):
     """
-    Sipariş oluşturulduğunda veya durumu değiştiğinde mail gönder ve bildirim gönder
+    Sipariş oluşturulduğunda veya durumu değiştiğinde mail ve bildirim gönder.
+    E-posta ve push gönderimleri outbox'a yazılır; Order.save() transaction'ı
+    commit edildikten sonra `process_outbox` worker'ı tarafından iletilir.
     """
     should_send_email = False
     email_subject = ""
@@ -47,39 +66,37 @@ def order_post_save(sender, instance, created, **kwargs):
         email_color = "#22c55e" # Green
         
         # --- PUSH NOTIFICATION: Yeni Sipariş (Atanan Şoföre) ---
-        if instance.driver:
+        if instance.driver_id:
             try:
-                tokens = list(ExpoPushToken.objects.filter(user=instance.driver).values_list('token', flat=True))
-                
-                notification_title = "Yeni İş Atandı"
-                notification_message = f"Size yeni bir transfer atandı! ({instance.pickup_address} -> {instance.dropoff_address})"
-                
-                Notification.objects.create(
-                    user=instance.driver,
-                    title=notification_title,
-                    message=notification_message
+                notify_user(
+                    instance.driver_id,
+                    "Yeni İş Atandı",
+                    f"Size yeni bir transfer atandı! ({instance.pickup_address} -> {instance.dropoff_address})",
+                    data={'orderId': instance.id, 'type': 'new_job'},
+                    event=('driver_assigned', instance.id)
                 )
-
-                if tokens:
-                    send_expo_push_notification(
-                        tokens=tokens,
-                        title=notification_title,
-                        message=notification_message,
-                        data={'orderId': instance.id, 'type': 'new_job'}
-                    )
             except Exception as e:
                 print(f"Push Notification Error (New Job): {e}")
 
         # --- YÖNETİCİ BİLDİRİMLERİ (Push + Email) ---
         try:
-            managers = User.objects.filter(role='Yönetici')
-            if managers.exists():
-                manager_notification_title = "Yeni Sipariş Oluşturuldu"
-                manager_notification_message = f"#{instance.id} numaralı yeni bir sipariş oluşturuldu. {instance.user.full_name or instance.user.email}"
-                
-                # Toplu Email için hazırlık
-                manager_emails = list(managers.values_list('email', flat=True))
-                
+            manager_notification_title = "Yeni Sipariş Oluşturuldu"
+            manager_notification_message = f"#{instance.id} numaralı yeni bir sipariş oluşturuldu. {instance.user.full_name or instance.user.email}"
+
+            # 1. Veritabanı bildirimleri (tek bulk_create) + 2. Push (tüm yöneticilere tek mesaj)
+            recipients = fan_out(
+                managers(),
+                title=manager_notification_title,
+                message=manager_notification_message,
+                push=True,
+                data={'orderId': instance.id, 'type': 'new_order_admin'},
+                sound='notification.wav',
+                channel_id='premium_alert',
+                event=('new_order', instance.id),
+                email=True
+            )
+
+            if recipients.emails:
                 # Email İçeriği
                 manager_context = {
                     'order_id': str(instance.id),
@@ -90,72 +107,36 @@ def order_post_save(sender, instance, created, **kwargs):
                     'pickup_address': instance.pickup_address,
                     'dropoff_address': instance.dropoff_address,
                 }
-                manager_html_content = render_to_string('emails/manager_order_notification.html', manager_context)
-                manager_text_content = strip_tags(manager_html_content)
+                manager_html_content, manager_text_content = render_email('emails/manager_order_notification.html', manager_context)
 
-                for manager in managers:
-                    # 1. Veritabanı bildirimi
-                    Notification.objects.create(
-                        user=manager,
-                        title=manager_notification_title,
-                        message=manager_notification_message
-                    )
-                    
-                    # 2. Push bildirimi
-                    manager_tokens = list(ExpoPushToken.objects.filter(user=manager).values_list('token', flat=True))
-                    if manager_tokens:
-                        send_expo_push_notification(
-                            tokens=manager_tokens,
-                            title=manager_notification_title,
-                            message=manager_notification_message,
-                            data={'orderId': instance.id, 'type': 'new_order_admin'},
-                            sound='notification.wav',
-                            channel_id='premium_alert'
-                        )
-                
-                # 3. Toplu Email gönderimi (Döngü dışında tek seferde veya tek tek, topluca daha iyi)
-                try:
-                    manager_msg = EmailMultiAlternatives(
-                        subject=f"YENİ SİPARİŞ: #{instance.id}",
-                        body=manager_text_content,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        to=manager_emails
-                    )
-                    manager_msg.attach_alternative(manager_html_content, "text/html")
-                    manager_msg.send()
-                    print(f"Yöneticilere sipariş bildirimi mailleri gönderildi: {', '.join(manager_emails)}")
-                except Exception as email_err:
-                    print(f"Yöneticilere mail gönderilemedi: {email_err}")
+                # 3. Toplu Email (outbox üzerinden commit sonrası gönderilir)
+                enqueue_email(
+                    subject=f"YENİ SİPARİŞ: #{instance.id}",
+                    body=manager_text_content,
+                    html=manager_html_content,
+                    to=recipients.emails
+                )
 
         except Exception as e:
             print(f"Manager Notification Error: {e}")
 
     # Sürücü Değişikliği / Ataması Kontrolü (Update durumunda)
     if not created and hasattr(instance, '_old_driver_id') and instance.driver_id != instance._old_driver_id:
-        if instance.driver:
+        if instance.driver_id:
             try:
-                tokens = list(ExpoPushToken.objects.filter(user=instance.driver).values_list('token', flat=True))
-                
-                notification_title = "Yeni İş Atandı"
-                notification_message = f"Size yeni bir transfer atandı! ({instance.pickup_address} -> {instance.dropoff_address})"
-                
-                Notification.objects.create(
-                    user=instance.driver,
-                    title=notification_title,
-                    message=notification_message
+                notify_user(
+                    instance.driver_id,
+                    "Yeni İş Atandı",
+                    f"Size yeni bir transfer atandı! ({instance.pickup_address} -> {instance.dropoff_address})",
+                    data={'orderId': instance.id, 'type': 'new_job'},
+                    event=('driver_assigned', instance.id)
                 )
-
-                if tokens:
-                    send_expo_push_notification(
-                        tokens=tokens,
-                        title=notification_title,
-                        message=notification_message,
-                        data={'orderId': instance.id, 'type': 'new_job'}
-                    )
             except Exception as e:
                 print(f"Push Notification Error (Driver Assigned): {e}")
 
     if not created and hasattr(instance, '_old_status') and instance._old_status != instance.status:
+        # Hızlı ardışık durum değişiklikleri müşteriye en son durumla tek teslimat olarak gider
+        status_key = order_status_key(instance.id, instance.user_id)
         if instance.status == 'cancelled':
             should_send_email = True
             email_subject = f"Yolculuk İptal Edildi: #{instance.id}"
@@ -165,24 +146,13 @@ def order_post_save(sender, instance, created, **kwargs):
             
             # --- PUSH NOTIFICATION: İptal ---
             try:
-                notification_title = "Yolculuk İptal Edildi"
-                notification_message = "Yolculuğunuz iptal edilmiştir."
-                
-                # Veritabanına kayıt
-                Notification.objects.create(
-                    user=instance.user,
-                    title=notification_title,
-                    message=notification_message
+                notify_user(
+                    instance.user_id,
+                    "Yolculuk İptal Edildi",
+                    "Yolculuğunuz iptal edilmiştir.",
+                    data={'orderId': instance.id, 'type': 'order_update', 'status': 'cancelled'},
+                    coalesce_key=status_key
                 )
-
-                tokens = list(ExpoPushToken.objects.filter(user=instance.user).values_list('token', flat=True))
-                if tokens:
-                    send_expo_push_notification(
-                        tokens=tokens,
-                        title=notification_title,
-                        message=notification_message,
-                        data={'orderId': instance.id, 'type': 'order_update', 'status': 'cancelled'}
-                    )
             except Exception as e:
                 print(f"Push Notification Error (Cancelled): {e}")
 
@@ -195,81 +165,39 @@ def order_post_save(sender, instance, created, **kwargs):
             
             # --- PUSH NOTIFICATION: Tamamlandı ---
             try:
-                notification_title = "Yolculuk Tamamlandı"
-                notification_message = "Bizi tercih ettiğiniz için teşekkür ederiz."
-
-                # Veritabanına kayıt
-                Notification.objects.create(
-                    user=instance.user,
-                    title=notification_title,
-                    message=notification_message
+                notify_user(
+                    instance.user_id,
+                    "Yolculuk Tamamlandı",
+                    "Bizi tercih ettiğiniz için teşekkür ederiz.",
+                    data={'orderId': instance.id, 'type': 'order_update', 'status': 'completed'},
+                    coalesce_key=status_key
                 )
-
-                tokens = list(ExpoPushToken.objects.filter(user=instance.user).values_list('token', flat=True))
-                if tokens:
-                    send_expo_push_notification(
-                        tokens=tokens,
-                        title=notification_title,
-                        message=notification_message,
-                        data={'orderId': instance.id, 'type': 'order_update', 'status': 'completed'}
-                    )
             except Exception as e:
                 print(f"Push Notification Error (Completed): {e}")
         
         # --- PUSH NOTIFICATION: Sürücü Kabul Etti / Yola Çıktı ---
         elif instance.status == 'on_way':
             try:
-                tokens = list(ExpoPushToken.objects.filter(user=instance.user).values_list('token', flat=True))
-                
-                driver_name = ""
-                if instance.driver:
-                    driver_name = f"{instance.driver.first_name} {instance.driver.last_name}".strip() or instance.driver.full_name
-                
-                notification_title = "Sürücünüz Yola Çıktı"
-                if driver_name:
-                    notification_message = f"Sürücünüz sizi almak üzere yola çıktı."
-                else:
-                    notification_message = "Sürücünüz sizi almak üzere yola çıktı."
-
-                # Veritabanına kayıt
-                Notification.objects.create(
-                    user=instance.user,
-                    title=notification_title,
-                    message=notification_message
+                notify_user(
+                    instance.user_id,
+                    "Sürücünüz Yola Çıktı",
+                    "Sürücünüz sizi almak üzere yola çıktı.",
+                    data={'orderId': instance.id, 'type': 'order_update', 'status': 'on_way'},
+                    coalesce_key=status_key
                 )
-
-                if tokens:
-                    send_expo_push_notification(
-                        tokens=tokens,
-                        title=notification_title,
-                        message=notification_message,
-                        data={'orderId': instance.id, 'type': 'order_update', 'status': 'on_way'}
-                    )
             except Exception as e:
                 print(f"Push Notification Error (On Way): {e}")
 
         # --- PUSH NOTIFICATION: Sürüş Başladı ---
         elif instance.status == 'in_progress':
             try:
-                tokens = list(ExpoPushToken.objects.filter(user=instance.user).values_list('token', flat=True))
-                
-                notification_title = "Yolculuk Başladı"
-                notification_message = "Keyifli yolculuklar dileriz."
-
-                # Veritabanına kayıt
-                Notification.objects.create(
-                    user=instance.user,
-                    title=notification_title,
-                    message=notification_message
+                notify_user(
+                    instance.user_id,
+                    "Yolculuk Başladı",
+                    "Keyifli yolculuklar dileriz.",
+                    data={'orderId': instance.id, 'type': 'order_update', 'status': 'in_progress'},
+                    coalesce_key=status_key
                 )
-
-                if tokens:
-                     send_expo_push_notification(
-                        tokens=tokens,
-                        title=notification_title,
-                        message=notification_message,
-                        data={'orderId': instance.id, 'type': 'order_update', 'status': 'in_progress'}
-                    )
             except Exception as e:
                 print(f"Push Notification Error (In Progress): {e}")
 
@@ -287,21 +215,15 @@ def order_post_save(sender, instance, created, **kwargs):
             'dropoff_address': instance.dropoff_address,
         }
         
-        html_content = render_to_string('emails/order_notification_email.html', context)
-        text_content = strip_tags(html_content)
+        html_content, text_content = render_email('emails/order_notification_email.html', context)
         
-        try:
-            msg = EmailMultiAlternatives(
-                subject=email_subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[instance.user.email]
-            )
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
-            print(f"Sipariş bildirim maili gönderildi ({instance.status}): {instance.user.email}")
-        except Exception as e:
-            print(f"Sipariş maili gönderilemedi: {e}")
+        enqueue_email(
+            subject=email_subject,
+            body=text_content,
+            html=html_content,
+            to=[instance.user.email],
+            coalesce_key='' if created else order_status_key(instance.id, instance.user_id)
+        )
 
 @receiver(post_save, sender=EmergencyAlert)
 def send_emergency_email_notification(sender, instance, created, **kwargs):
@@ -327,21 +249,14 @@ def send_emergency_email_notification(sender, instance, created, **kwargs):
             'created_at': instance.created_at.strftime('%d.%m.%Y %H:%M:%S')
         }
         
-        html_content = render_to_string('emails/emergency_alert_email.html', context)
-        text_content = strip_tags(html_content)
+        html_content, text_content = render_email('emails/emergency_alert_email.html', context)
         
-        try:
-            # Gönderen: Sistem (settings.DEFAULT_FROM_EMAIL)
-            # Alıcı: Biz (settings.EMAIL_HOST_USER) - Kendimize mail atıyoruz
-            msg = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[settings.EMAIL_HOST_USER]
-            )
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
-            
-            print(f"Acil durum HTML maili gönderildi: {user.email}")
-        except Exception as e:
-            print(f"Acil durum maili gönderilemedi: {e}")
+        # Gönderen: Sistem (settings.DEFAULT_FROM_EMAIL)
+        # Alıcı: Biz (settings.EMAIL_HOST_USER) - Kendimize mail atıyoruz
+        # SMTP istek içinde beklenmez; mail alarmla aynı transaction'da outbox'a yazılır
+        enqueue_email(
+            subject=subject,
+            body=text_content,
+            html=html_content,
+            to=[settings.EMAIL_HOST_USER],
+        )
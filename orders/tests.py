@@ -1,7 +1,15 @@
-from django.test import TestCase
+from django.db import connection
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.test import APITestCase
 from orders.serializers import OrderSerializer
-from orders.models import Order
+from orders.models import Order, OrderSequence, OrderStop, EmergencyAlert
+from orders.sequences import order_id_allocator
+from notifications.models import OutboxMessage
 from services.models import Service
 from decimal import Decimal
 from django.utils import timezone
@@ -51,3 +59,222 @@ class OrderSerializerTest(TestCase):
         self.assertEqual(order.stops.count(), 2)
         self.assertEqual(order.stops.first().address, 'Stop 1')
         self.assertEqual(order.stops.last().address, 'Stop 2')
+
+
+class OrderIdAllocatorTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='seq@example.com',
+            password='password123',
+            phone_number='5551112233'
+        )
+        order_id_allocator.reset()
+
+    def _order(self, **extra):
+        return Order(
+            user=self.user,
+            pickup_address='Pickup',
+            dropoff_address='Dropoff',
+            pickup_time=timezone.now(),
+            price=Decimal('100.00'),
+            distance_km=1.0,
+            pickup_lat=41.0,
+            pickup_lng=29.0,
+            dropoff_lat=41.1,
+            dropoff_lng=29.1,
+            **extra
+        )
+
+    def test_ids_are_unique_and_keep_format(self):
+        ids = []
+        for _ in range(5):
+            order = self._order()
+            order.save()
+            ids.append(order.id)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertTrue(all(order_id.startswith('ORD-') for order_id in ids))
+        self.assertGreaterEqual(int(ids[0].split('-')[1]), 1000)
+
+    def test_sequence_is_seeded_from_existing_orders(self):
+        self._order(id='ORD-2000').save()
+        OrderSequence.objects.all().delete()
+        order_id_allocator.reset()
+
+        order = self._order()
+        order.save()
+        self.assertEqual(order.id, 'ORD-2001')
+
+    def test_bulk_create_assigns_consecutive_ids(self):
+        orders = Order.objects.bulk_create([self._order() for _ in range(3)])
+        numbers = [int(order.id.split('-')[1]) for order in orders]
+        self.assertEqual(numbers, list(range(numbers[0], numbers[0] + 3)))
+        self.assertEqual(Order.objects.count(), 3)
+
+
+class OrderListQueryCountTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='list@example.com',
+            password='password123',
+            phone_number='5552223344'
+        )
+        self.driver = User.objects.create_user(
+            email='driver@example.com',
+            password='password123',
+            role='Şoför'
+        )
+        self.service = Service.objects.create(name='Test Service', slug='list-service')
+        self.client.force_authenticate(user=self.user)
+
+    def _create_order(self):
+        order = Order.objects.create(
+            user=self.user,
+            driver=self.driver,
+            service=self.service,
+            pickup_address='Pickup',
+            dropoff_address='Dropoff',
+            pickup_time=timezone.now(),
+            price=Decimal('100.00'),
+            distance_km=1.0,
+            pickup_lat=41.0,
+            pickup_lng=29.0,
+            dropoff_lat=41.1,
+            dropoff_lng=29.1
+        )
+        OrderStop.objects.create(order=order, address='Stop', lat=41.05, lng=29.05)
+        EmergencyAlert.objects.create(order=order, user=self.user, lat=41.0, lng=29.0)
+        return order
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('order_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_is_constant(self):
+        self._create_order()
+        single_count, _ = self._count_list_queries()
+
+        for _ in range(4):
+            self._create_order()
+        many_count, response = self._count_list_queries()
+
+        self.assertEqual(single_count, many_count)
+        self.assertEqual(len(response.data), 5)
+        self.assertTrue(all(item['has_active_emergency'] for item in response.data))
+        self.assertEqual(response.data[0]['stops'][0]['address'], 'Stop')
+
+
+class OrderKeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='pages@example.com',
+            password='password123',
+            phone_number='5553334455'
+        )
+        self.client.force_authenticate(user=self.user)
+        for _ in range(5):
+            Order.objects.create(
+                user=self.user,
+                pickup_address='Pickup',
+                dropoff_address='Dropoff',
+                pickup_time=timezone.now(),
+                price=Decimal('100.00'),
+                distance_km=1.0,
+                pickup_lat=41.0,
+                pickup_lng=29.0,
+                dropoff_lat=41.1,
+                dropoff_lng=29.1
+            )
+        # Aynı created_at değerine sahip satırlar id ile sıralanmalı
+        Order.objects.update(created_at=timezone.now())
+
+    def test_legacy_clients_get_bare_array(self):
+        response = self.client.get(reverse('order_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+
+    def test_cursor_walks_all_pages_without_duplicates(self):
+        seen = []
+        url = reverse('order_list') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(seen, reverse=True), seen)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('order_list') + '?cursor=bozuk')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderFieldTrackerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='tracker@example.com',
+            password='password123'
+        )
+        self.driver = User.objects.create_user(
+            email='tracker-driver@example.com',
+            password='password123',
+            role='Şoför'
+        )
+        self.order = Order.objects.create(
+            user=self.user,
+            pickup_address='Pickup',
+            dropoff_address='Dropoff',
+            pickup_time=timezone.now(),
+            price=Decimal('100.00'),
+            distance_km=1.0,
+            pickup_lat=41.0,
+            pickup_lng=29.0,
+            dropoff_lat=41.1,
+            dropoff_lng=29.1
+        )
+
+    def test_transition_does_not_reload_order(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.driver = self.driver
+        order.status = 'on_way'
+        with CaptureQueriesContext(connection) as ctx:
+            order.save()
+        order_selects = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "orders_order"' in q['sql']
+        ]
+        self.assertEqual(order_selects, [])
+        self.assertEqual(order._old_status, 'scheduled')
+        self.assertIsNone(order._old_driver_id)
+
+        order.status = 'in_progress'
+        order.save()
+        self.assertEqual(order._old_status, 'on_way')
+        self.assertEqual(order._old_driver_id, self.driver.id)
+
+    def test_deferred_instance_falls_back_to_query(self):
+        order = Order.objects.only('id', 'price').get(pk=self.order.pk)
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(order._old_status, 'scheduled')
+
+
+class EmergencyAlertNotificationTests(TestCase):
+    @override_settings(EMAIL_HOST_USER='ops@example.com')
+    def test_alert_email_is_queued_with_the_alert_not_sent_inline(self):
+        user = User.objects.create_user(email='alert@example.com', password='password123')
+        order = Order.objects.create(
+            user=user, pickup_address='A', dropoff_address='B', pickup_time=timezone.now(),
+            price=Decimal('100.00'), distance_km=1.0,
+            pickup_lat=41.0, pickup_lng=29.0, dropoff_lat=41.1, dropoff_lng=29.1,
+        )
+        OutboxMessage.objects.all().delete()
+        with mock.patch('django.core.mail.EmailMessage.send') as mock_send:
+            EmergencyAlert.objects.create(order=order, user=user, lat=41.0, lng=29.0)
+        mock_send.assert_not_called()
+        message = OutboxMessage.objects.get(channel='email')
+        self.assertIn('ACİL DURUM', message.payload['subject'])
+        self.assertEqual(message.payload['to'], ['ops@example.com'])
@@ -2,10 +2,10 @@ from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db import transaction
+from backend.pagination import KeysetPagination
 from .models import Order, VehicleHandoverPhoto
 from .serializers import OrderSerializer, EmergencyAlertSerializer, VehicleHandoverPhotoSerializer
-from notifications.models import Notification
-from accounts.models import User
+from notifications.fanout import fan_out, managers
 
 class EmergencyAlertCreateView(generics.CreateAPIView):
     serializer_class = EmergencyAlertSerializer
@@ -14,22 +14,17 @@ class EmergencyAlertCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         alert = serializer.save(user=self.request.user)
         # Notify admins
-        admins = User.objects.filter(role='Yönetici', is_active=True)
         message = f"{alert.user.full_name or alert.user.email} tarafından acil durum bildirimi gönderildi!"
-        for admin in admins:
-            Notification.objects.create(
-                user=admin,
-                title="🚨 ACİL DURUM BİLDİRİMİ",
-                message=message
-            )
+        fan_out(managers(), title="🚨 ACİL DURUM BİLDİRİMİ", message=message)
 
 class OrderListView(generics.ListCreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         # Müşteri sadece kendi siparişlerini görür
-        queryset = Order.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Order.objects.for_serializer().filter(user=self.request.user).order_by('-created_at')
         
         status_group = self.request.query_params.get('group')
         if status_group == 'active':
@@ -58,8 +53,8 @@ class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Müşteri kendi siparişini, Sürücü atandığı veya havuzdaki siparişi görebilir
         user = self.request.user
         if user.role == 'Şoför': # Driver rolü kontrolü
-             return Order.objects.all() # Sürücüler detay görebilsin (daha kısıtlı bir filtre eklenebilir)
-        return Order.objects.filter(user=user)
+             return Order.objects.for_serializer() # Sürücüler detay görebilsin (daha kısıtlı bir filtre eklenebilir)
+        return Order.objects.for_serializer().filter(user=user)
 
 class OrderCancelView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -81,14 +76,8 @@ class OrderCancelView(APIView):
             order.save()
 
             # Notify admins
-            admins = User.objects.filter(role='Yönetici', is_active=True)
             message = f"#{order.id} nolu rezervasyon müşteri tarafından iptal edildi."
-            for admin in admins:
-                Notification.objects.create(
-                    user=admin,
-                    title="❌ Rezervasyon İptal Edildi",
-                    message=message
-                )
+            fan_out(managers(), title="❌ Rezervasyon İptal Edildi", message=message)
 
             return Response(OrderSerializer(order).data)
             
@@ -105,11 +94,13 @@ class DriverJobPoolView(generics.ListAPIView):
     """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('created_at', 'id')
 
     def get_queryset(self):
         # Eski Mantık: status=['scheduled', 'searching'] ve driver=None
         # Yeni Mantık: Sadece bana atanmış işler (Havuz kapalı)
-        return Order.objects.filter(
+        return Order.objects.for_serializer().filter(
             status__in=['scheduled', 'searching', 'assigned', 'accepted', 'on_way', 'in_progress'], 
             driver=self.request.user
         ).order_by('created_at')
@@ -120,12 +111,13 @@ class DriverMyJobsView(generics.ListAPIView):
     """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         # Sadece bu sürücüye atanmış tüm işler (Tamamlananlar dahil)
         # Ek güvenlik: Eğer driver=None ise (sahipsiz) veya başkasına atanmışsa getirmemeli.
         # Filtre: (scheduled OR searching OR assigned OR accepted OR on_way OR in_progress OR completed OR cancelled) AND driver=request.user
-        return Order.objects.filter(
+        return Order.objects.for_serializer().filter(
             status__in=['scheduled', 'searching', 'assigned', 'accepted', 'on_way', 'in_progress', 'completed', 'cancelled'], 
             driver=self.request.user
         ).order_by('-created_at')